@@ -0,0 +1,295 @@
+// Optional compiled lookup kernel for the flat node layout of ternary_search_tree.py
+// (CompactTernarySearchTree and FrozenTernarySearchTree). The node arrays are read in place
+// through the buffer protocol, so it works on array.array storage as well as on zero-copy
+// memoryviews of a memory-mapped file. ternary_search_tree.py falls back to its pure-Python
+// lookups when this module isn't built.
+//
+// Build (from the repository root):
+//   gcc -O2 -shared -fPIC $(python3-config --includes) _tst_kernel.c -o _tst_kernel$(python3-config --extension-suffix)
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+
+#define END_OF_WORD 1
+
+// The five node arrays of a tree; slots is the number of entries, sentinel included
+typedef struct {
+    Py_buffer chars, flags, ls, eq, gt;
+    const uint32_t *char_codes;
+    const uint8_t *flag_bits;
+    const int32_t *ls_links, *eq_links, *gt_links;
+    Py_ssize_t slots;
+} FlatTree;
+
+static void release_tree(FlatTree *tree)
+{
+    PyBuffer_Release(&tree->chars);
+    PyBuffer_Release(&tree->flags);
+    PyBuffer_Release(&tree->ls);
+    PyBuffer_Release(&tree->eq);
+    PyBuffer_Release(&tree->gt);
+}
+
+// Checks that the buffers parsed into tree have one 4-byte (1-byte for flags) entry per slot
+static int check_tree(FlatTree *tree)
+{
+    tree->slots = tree->flags.len;
+    if (tree->chars.len != 4 * tree->slots || tree->ls.len != 4 * tree->slots ||
+        tree->eq.len != 4 * tree->slots || tree->gt.len != 4 * tree->slots) {
+        PyErr_SetString(PyExc_ValueError, "node arrays must have one entry per slot");
+        release_tree(tree);
+        return 0;
+    }
+    tree->char_codes = tree->chars.buf;
+    tree->flag_bits = tree->flags.buf;
+    tree->ls_links = tree->ls.buf;
+    tree->eq_links = tree->eq.buf;
+    tree->gt_links = tree->gt.buf;
+    return 1;
+}
+
+static int out_of_range(FlatTree *tree, int32_t node)
+{
+    if (node < 0 || node >= tree->slots) {
+        PyErr_SetString(PyExc_ValueError, "corrupt tree: node index out of range");
+        return 1;
+    }
+    return 0;
+}
+
+// Index of the node where word ends when the descent starts at node with word[index], 0 if
+// there is none, -1 on error. Same walk as _FlatTernarySearchTree.search_helper.
+static int32_t find_node(FlatTree *tree, int32_t node, PyObject *word, Py_ssize_t index)
+{
+    int kind = PyUnicode_KIND(word);
+    const void *data = PyUnicode_DATA(word);
+    Py_ssize_t last = PyUnicode_GET_LENGTH(word) - 1;
+    Py_UCS4 code;
+
+    if (index > last)
+        return 0;
+    code = PyUnicode_READ(kind, data, index);
+
+    while (node) {
+        if (out_of_range(tree, node))
+            return -1;
+        uint32_t node_code = tree->char_codes[node];
+        if (code < node_code) {
+            node = tree->ls_links[node];
+        } else if (code > node_code) {
+            node = tree->gt_links[node];
+        } else if (index == last) {
+            return node;
+        } else {
+            index += 1;
+            code = PyUnicode_READ(kind, data, index);
+            node = tree->eq_links[node];
+        }
+    }
+
+    return 0;
+}
+
+// find(chars, flags, ls, eq, gt, node, word, index): index of the node where word ends, or 0
+static PyObject *kernel_find(PyObject *self, PyObject *args)
+{
+    FlatTree tree;
+    int node;
+    PyObject *word;
+    Py_ssize_t index;
+
+    if (!PyArg_ParseTuple(args, "y*y*y*y*y*iUn", &tree.chars, &tree.flags, &tree.ls, &tree.eq, &tree.gt,
+                          &node, &word, &index))
+        return NULL;
+    if (!check_tree(&tree))
+        return NULL;
+
+    int32_t found = find_node(&tree, node, word, index);
+    release_tree(&tree);
+    return found < 0 ? NULL : PyLong_FromLong(found);
+}
+
+// search_many(chars, flags, ls, eq, gt, root, words, exact): list with one bool per word,
+// False for anything that isn't a non-empty string
+static PyObject *kernel_search_many(PyObject *self, PyObject *args)
+{
+    FlatTree tree;
+    int root, exact;
+    PyObject *words, *results = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*y*y*y*y*iOp", &tree.chars, &tree.flags, &tree.ls, &tree.eq, &tree.gt,
+                          &root, &words, &exact))
+        return NULL;
+    if (!check_tree(&tree))
+        return NULL;
+
+    words = PySequence_Fast(words, "words must be iterable");
+    if (words == NULL)
+        goto done;
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(words);
+    results = PyList_New(count);
+    if (results == NULL)
+        goto done;
+
+    for (Py_ssize_t position = 0; position < count; position++) {
+        PyObject *word = PySequence_Fast_GET_ITEM(words, position);
+        int32_t found = 0;
+        if (PyUnicode_Check(word) && PyUnicode_GET_LENGTH(word) > 0) {
+            found = find_node(&tree, root, word, 0);
+            if (found < 0) {
+                Py_CLEAR(results);
+                goto done;
+            }
+        }
+        PyObject *result = found && (!exact || tree.flag_bits[found] & END_OF_WORD) ? Py_True : Py_False;
+        Py_INCREF(result);
+        PyList_SET_ITEM(results, position, result);
+    }
+
+done:
+    Py_XDECREF(words);
+    release_tree(&tree);
+    return results;
+}
+
+// Reallocates buffer to count items of size bytes. Unlike PyMem_Resize, which assigns NULL to its
+// pointer argument on failure, this returns NULL and leaves buffer allocated, so the caller can
+// still free it.
+static void *grow_buffer(void *buffer, Py_ssize_t count, size_t size)
+{
+    if ((size_t)count > PY_SSIZE_T_MAX / size)
+        return NULL;
+    return PyMem_Realloc(buffer, count * size);
+}
+
+// Pending step of the in-order walk in kernel_complete: a subtree to expand, or (expanded) a
+// node whose character is appended at depth
+typedef struct {
+    int32_t node;
+    int32_t expanded;
+    Py_ssize_t depth;
+} Step;
+
+// complete(chars, flags, ls, eq, gt, node, prefix, limit): list of the words below node in
+// sorted order, each prefixed with prefix, at most limit of them (all for a negative limit).
+// Same walk as _FlatTernarySearchTree._iter_words, but the words are built from a buffer of
+// code points instead of by string concatenation.
+static PyObject *kernel_complete(PyObject *self, PyObject *args)
+{
+    FlatTree tree;
+    int node;
+    PyObject *prefix, *results = NULL;
+    Py_ssize_t limit;
+    Py_UCS4 *path = NULL, *grown_path;
+    Step *stack = NULL, *grown_stack;
+
+    if (!PyArg_ParseTuple(args, "y*y*y*y*y*iUn", &tree.chars, &tree.flags, &tree.ls, &tree.eq, &tree.gt,
+                          &node, &prefix, &limit))
+        return NULL;
+    if (!check_tree(&tree))
+        return NULL;
+
+    results = PyList_New(0);
+    if (results == NULL || !node || limit == 0)
+        goto done;
+
+    // path holds the prefix followed by the characters of the current descent, stack the
+    // pending steps; both grow on demand. A valid tree is never deeper than its number of slots
+    // and never has more than two steps per node on the stack, so past that the links loop.
+    // A grown buffer is only assigned once grow_buffer succeeded, so done: frees the original
+    // one when it fails.
+    Py_ssize_t start = PyUnicode_GET_LENGTH(prefix);
+    Py_ssize_t path_size = start + 64, stack_size = 64, top = 0;
+    path = PyUnicode_AsUCS4Copy(prefix);
+    if (path != NULL) {
+        grown_path = grow_buffer(path, path_size, sizeof(Py_UCS4));
+        if (grown_path == NULL)
+            goto no_memory;
+        path = grown_path;
+    }
+    if (path == NULL || (stack = PyMem_New(Step, stack_size)) == NULL) {
+        if (!PyErr_Occurred())
+            PyErr_NoMemory();
+        Py_CLEAR(results);
+        goto done;
+    }
+
+    stack[top++] = (Step){node, 0, start};
+    while (top) {
+        Step step = stack[--top];
+        if (out_of_range(&tree, step.node))
+            goto fail;
+        if (step.depth >= path_size) {
+            if (step.depth - start >= tree.slots)
+                goto cycle;
+            path_size *= 2;
+            grown_path = grow_buffer(path, path_size, sizeof(Py_UCS4));
+            if (grown_path == NULL)
+                goto no_memory;
+            path = grown_path;
+        }
+        if (top + 3 > stack_size) {
+            if (stack_size > 2 * tree.slots)
+                goto cycle;
+            stack_size *= 2;
+            grown_stack = grow_buffer(stack, stack_size, sizeof(Step));
+            if (grown_stack == NULL)
+                goto no_memory;
+            stack = grown_stack;
+        }
+
+        if (step.expanded) {
+            path[step.depth] = tree.char_codes[step.node];
+            if (tree.flag_bits[step.node] & END_OF_WORD) {
+                PyObject *word = PyUnicode_FromKindAndData(PyUnicode_4BYTE_KIND, path, step.depth + 1);
+                if (word == NULL || PyList_Append(results, word) < 0) {
+                    Py_XDECREF(word);
+                    goto fail;
+                }
+                Py_DECREF(word);
+                if (PyList_GET_SIZE(results) == limit)
+                    break;
+            }
+            if (tree.eq_links[step.node])
+                stack[top++] = (Step){tree.eq_links[step.node], 0, step.depth + 1};
+        } else {
+            if (tree.gt_links[step.node])
+                stack[top++] = (Step){tree.gt_links[step.node], 0, step.depth};
+            stack[top++] = (Step){step.node, 1, step.depth};
+            if (tree.ls_links[step.node])
+                stack[top++] = (Step){tree.ls_links[step.node], 0, step.depth};
+        }
+    }
+    goto done;
+
+cycle:
+    PyErr_SetString(PyExc_ValueError, "corrupt tree: cycle in the node links");
+    goto fail;
+no_memory:
+    PyErr_NoMemory();
+fail:
+    Py_CLEAR(results);
+done:
+    PyMem_Free(path);
+    PyMem_Free(stack);
+    release_tree(&tree);
+    return results;
+}
+
+static PyMethodDef kernel_methods[] = {
+    {"find", kernel_find, METH_VARARGS, "Index of the node where word[index:] ends below node, or 0."},
+    {"search_many", kernel_search_many, METH_VARARGS, "One bool per word: is it in the tree (as a word if exact)."},
+    {"complete", kernel_complete, METH_VARARGS, "Sorted words below node, prefixed with prefix, at most limit."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef kernel_module = {
+    PyModuleDef_HEAD_INIT, "_tst_kernel", "Compiled lookups on the flat ternary search tree layout.", -1,
+    kernel_methods
+};
+
+PyMODINIT_FUNC PyInit__tst_kernel(void)
+{
+    return PyModule_Create(&kernel_module);
+}
@@ -3,12 +3,21 @@ import random
 import string
 import sys
 import os
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
 import gc
 import tracemalloc
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
+from itertools import islice
 import matplotlib.pyplot as plt
 import numpy as np
 import json
+import re
 import matplotlib
 
 matplotlib.use("Agg")   # non-GUI backend for HPC
@@ -17,13 +26,88 @@ import matplotlib.pyplot as plt
 # Add the parent directory to the path to import our module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ternary_search_tree import TernarySearchTree
+from benchmark_workload import Workload, replay, sustained
+from ternary_search_tree import (TernarySearchTree, CompactTernarySearchTree, VersionedTernarySearchTree,
+                                 ShardedTernarySearchTree, HybridTernarySearchTree, RadixTernarySearchTree,
+                                 EncodedTernarySearchTree, SubstringIndex)
+
+
+# Reference implementation with the original recursive insert/search paths, kept as a baseline
+# for the iterative versions in TernarySearchTree.
+class RecursiveTernarySearchTree(TernarySearchTree):
+
+    def insert_character(self, node, word, index):
+        char = word[index]
+
+        if node is None:
+            node = self.Node(char)
+
+        if char < node.char:
+            node._ls = self.insert_character(node._ls, word, index)
+        elif char > node.char:
+            node._gt = self.insert_character(node._gt, word, index)
+        else:
+            if index + 1 == len(word):
+                if not node.end_of_word:
+                    self.word_count += 1
+                node.end_of_word = True
+            else:
+                node._eq = self.insert_character(node._eq, word, index + 1)
+
+        return node
+
+    def search_helper(self, node, word, index):
+        if node is None:
+            return None
+
+        char = word[index]
+
+        if char < node.char:
+            return self.search_helper(node._ls, word, index)
+        elif char > node.char:
+            return self.search_helper(node._gt, word, index)
+        else:
+            if index + 1 == len(word):
+                return node
+            return self.search_helper(node._eq, word, index + 1)
+
+
+# Process worker for benchmark_concurrent_reads: memory-maps the published tree and runs lookups,
+# switching to the new file whenever the writer has published a new version. Returns the elapsed time.
+def concurrent_read_worker(path, words, num_lookups):
+    def file_version():
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    frozen = TernarySearchTree.load(path)
+    version = file_version()
+    start_time = time.perf_counter()
+    for i in range(num_lookups):
+        if i % 1000 == 0 and file_version() != version:
+            frozen.close()
+            frozen = TernarySearchTree.load(path)
+            version = file_version()
+        frozen.search(words[i % len(words)], exact=True)
+    elapsed = time.perf_counter() - start_time
+    frozen.close()
+    return elapsed
+
+
+# Version of the benchmark_harness.json layout, bumped whenever its fields change
+HARNESS_SCHEMA_VERSION = 1
+
+# Scenarios of the harness: each times one operation per word, see TSTBenchmark.prepare_scenario
+HARNESS_SCENARIOS = ('insert', 'search', 'search_miss', 'prefix', 'delete')
+
+DEFAULT_SIZES = (1000, 5000, 10000, 20000, 40000)
+
 
 # Comprehensive benchmarking suite for Ternary Search Tree.
 class TSTBenchmark:
     
-    def __init__(self):
+    def __init__(self, sizes=DEFAULT_SIZES):
         self.results = defaultdict(dict)
+        self.sizes = list(sizes)  # word counts for the scaling benchmarks
         
     # Load words from a specified file path.
     def load_words_from_file(self, file_path, num_words=None):
@@ -54,56 +138,69 @@ class TSTBenchmark:
             words.append(f"{base}{suffix}")
         return words
     
+    # Insert words into a fresh tree of the given class, returns (time, peak memory in MB).
+    def measure_insert(self, tree_class, words):
+        tst = tree_class()
+
+        tracemalloc.start()
+        gc.collect()
+        
+        start_time = time.perf_counter()
+        for word in words:
+            tst.insert(word)
+        end_time = time.perf_counter()
+        
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        return end_time - start_time, peak / 1024 / 1024  # Convert to MB
+
     # Benchmark insert operation performance scaling.
     def benchmark_insert_performance(self, words, benchmark_name="insert"):
         print(f"Benchmarking {benchmark_name.capitalize()} performance...")
 
-        word_counts_to_test = [1000, 5000, 10000, 20000, 40000]
+        word_counts_to_test = self.sizes
         
         insert_times = []
         memory_usage = []
+        compact_times = []
+        compact_memory = []
         word_counts = []
         
         for count in word_counts_to_test:
             if count > len(words):
                 break
             subset_words = words[:count]
-            tst = TernarySearchTree()
 
-            tracemalloc.start()
-            gc.collect()
-            
-            start_time = time.perf_counter()
-            for word in subset_words:
-                tst.insert(word)
-            end_time = time.perf_counter()
-            
-            total_time = end_time - start_time
-            
-            current, peak = tracemalloc.get_traced_memory()
-            tracemalloc.stop()
-            
-            peak_memory = peak / 1024 / 1024  # Convert to MB
+            total_time, peak_memory = self.measure_insert(TernarySearchTree, subset_words)
+            compact_time, compact_peak = self.measure_insert(CompactTernarySearchTree, subset_words)
             
             insert_times.append(total_time)
             memory_usage.append(peak_memory)
+            compact_times.append(compact_time)
+            compact_memory.append(compact_peak)
             word_counts.append(count)
             
             print(f"  Testing with {count} words. Time: {total_time:.4f}s, Memory: {peak_memory:.2f}MB")
+            print(f"    Compact storage. Time: {compact_time:.4f}s, Memory: {compact_peak:.2f}MB "
+                  f"({(1 - compact_peak / peak_memory) * 100:.1f}% less)")
         
         self.results[benchmark_name] = {
             'counts': word_counts,
             'times': insert_times,
-            'memory': memory_usage
+            'memory': memory_usage,
+            'compact_times': compact_times,
+            'compact_memory': compact_memory
         }
         
     # Benchmark search operation performance scaling.
     def benchmark_search_performance(self, words, benchmark_name="search"):
         print(f"Benchmarking {benchmark_name.capitalize()} performance...")
 
-        word_counts_to_test = [1000, 5000, 10000, 20000, 40000]
+        word_counts_to_test = self.sizes
         
         search_times = []
+        batch_times = []
         word_counts = []
 
         for count in word_counts_to_test:
@@ -121,15 +218,21 @@ class TSTBenchmark:
             end_time = time.perf_counter()
 
             total_time = end_time - start_time
+
+            start_time = time.perf_counter()
+            tst.search_many(subset_words, exact=False)
+            batch_time = time.perf_counter() - start_time
             
             search_times.append(total_time)
+            batch_times.append(batch_time)
             word_counts.append(count)
             
-            print(f"  Testing with {count} searches. Time: {total_time:.4f}s")
+            print(f"  Testing with {count} searches. Time: {total_time:.4f}s, search_many: {batch_time:.4f}s")
             
         self.results[benchmark_name] = {
             'counts': word_counts,
             'times': search_times,
+            'batch_times': batch_times,
         }
     
     # Test best-case scenarios for TST operations.
@@ -187,14 +290,848 @@ class TSTBenchmark:
                 tst.search(word)
             search_time = time.perf_counter() - start_time
             
+            # Same words in a path-compressed tree: node count, memory and lookup time
+            _, memory = self.measure_insert(TernarySearchTree, words)
+            _, radix_memory = self.measure_insert(RadixTernarySearchTree, words)
+            radix = RadixTernarySearchTree()
+            for word in words:
+                radix.insert(word)
+
+            start_time = time.perf_counter()
+            for word in words:
+                radix.search(word)
+            radix_search_time = time.perf_counter() - start_time
+            
             # Store results
             self.results['worst_case'][scenario_name] = {
                 'insert_time': insert_time,
-                'search_time': search_time
+                'search_time': search_time,
+                'nodes': tst.to_compact().node_count(),
+                'memory': memory,
+                'radix_nodes': radix.node_count(),
+                'radix_memory': radix_memory,
+                'radix_search_time': radix_search_time
             }
             
             print(f"    Insert: {insert_time:.4f}s, Search: {search_time:.4f}s")
+            data = self.results['worst_case'][scenario_name]
+            print(f"    Plain: {data['nodes']} nodes, {memory:.2f}MB; "
+                  f"radix: {data['radix_nodes']} nodes, {radix_memory:.2f}MB, Search: {radix_search_time:.4f}s")
     
+    # Nodes visited and character comparisons of a search for each word, counted by the tree's
+    # own _trace (1 comparison for an _ls step, 2 otherwise, as in the profiling stats). Returns
+    # (mean visits, max visits, mean comparisons, max comparisons). For a HybridTernarySearchTree
+    # the descent starts in the sub-tree its root table points to.
+    def measure_search_cost(self, tst, words):
+        visits, comparisons = [], []
+        table_depth = getattr(tst, 'table_depth', 0)
+        for word in words:
+            if table_depth:
+                subtree = tst.table.get(word[:table_depth]) if len(word) > table_depth else None
+                trace = subtree._trace(word[table_depth:]) if subtree else (None, 0, 0, 0)
+            else:
+                trace = tst._trace(word)
+            visits.append(trace[1])
+            comparisons.append(trace[2])
+        return (sum(visits) / len(visits), max(visits),
+                sum(comparisons) / len(comparisons), max(comparisons))
+
+    # Compare a balanced bulk-built tree against one built by inserting the words in file order.
+    def benchmark_bulk_load(self, words):
+        print("Benchmarking bulk load vs incremental insert...")
+
+        incremental = TernarySearchTree()
+        start_time = time.perf_counter()
+        for word in words:
+            incremental.insert(word)
+        incremental_build = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        bulk = TernarySearchTree.build(words)
+        bulk_build = time.perf_counter() - start_time
+
+        for name, tst, build_time in (('incremental', incremental, incremental_build), ('bulk', bulk, bulk_build)):
+            mean_depth, max_depth, _, _ = self.measure_search_cost(tst, words)
+
+            start_time = time.perf_counter()
+            for word in words:
+                tst.search(word, exact=True)
+            search_time = time.perf_counter() - start_time
+
+            self.results['bulk_load'][name] = {
+                'build_time': build_time,
+                'search_time': search_time,
+                'mean_depth': mean_depth,
+                'max_depth': max_depth
+            }
+
+            print(f"  {name.capitalize():<12} - Build: {build_time:.4f}s, Search: {search_time:.4f}s, "
+                  f"Depth: mean {mean_depth:.1f}, max {max_depth}")
+
+    # Compare lazy prefix completion against filtering the (precomputed) all_strings() list.
+    def benchmark_prefix_completion(self, words, num_queries=100, limit=10):
+        print("Benchmarking prefix completion...")
+
+        tst = TernarySearchTree.build(words)
+        prefixes = [word[:3] for word in random.sample(words, min(num_queries, len(words)))]
+
+        start_time = time.perf_counter()
+        for prefix in prefixes:
+            list(tst.keys_with_prefix(prefix, limit=limit))
+        completion_time = time.perf_counter() - start_time
+
+        all_words = tst.all_strings()
+        start_time = time.perf_counter()
+        for prefix in prefixes:
+            [word for word in all_words if word.startswith(prefix)][:limit]
+        scan_time = time.perf_counter() - start_time
+
+        self.results['prefix_completion'] = {
+            'queries': len(prefixes),
+            'limit': limit,
+            'completion_time': completion_time,
+            'scan_time': scan_time
+        }
+
+        print(f"  keys_with_prefix: {completion_time:.4f}s, all_strings scan: {scan_time:.4f}s "
+              f"for {len(prefixes)} queries (top {limit})")
+
+    # Zipf-distributed synthetic weights: the word with (random) rank r gets weight 1e6 / r**s.
+    def generate_zipf_weights(self, words, s=1.0):
+        ranks = list(range(1, len(words) + 1))
+        random.shuffle(ranks)
+        return {word: int(1e6 / rank ** s) for word, rank in zip(words, ranks)}
+
+    # Compare top-k autocomplete latency against collecting all completions and sorting them by weight.
+    def benchmark_top_k(self, words, k=10, num_queries=200):
+        print(f"Benchmarking top-{k} autocomplete with Zipf weights...")
+
+        weights = self.generate_zipf_weights(words)
+        shuffled_words = list(weights)
+        random.shuffle(shuffled_words)  # avoid the degenerate tree of sorted input
+        tst = TernarySearchTree()
+        for word in shuffled_words:
+            tst.insert(word, weights[word])
+
+        self.results['top_k'] = {'k': k, 'queries': num_queries}
+        for prefix_length in (1, 2, 3):
+            prefixes = [word[:prefix_length] for word in random.sample(words, min(num_queries, len(words)))]
+
+            start_time = time.perf_counter()
+            for prefix in prefixes:
+                tst.top_k(prefix, k)
+            top_k_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for prefix in prefixes:
+                sorted(tst.keys_with_prefix(prefix), key=lambda word: -weights[word])[:k]
+            sort_time = time.perf_counter() - start_time
+
+            self.results['top_k'][f'prefix_{prefix_length}'] = {
+                'top_k_time': top_k_time,
+                'sort_time': sort_time
+            }
+
+            print(f"  Prefix length {prefix_length}: top_k {top_k_time:.4f}s, collect and sort {sort_time:.4f}s")
+
+    # Ordered-set queries: range against filtering all_strings(), and rank/select with and without
+    # subtree counts.
+    def benchmark_ordered_queries(self, words, num_queries=20, range_size=100):
+        print("Benchmarking ordered-set queries...")
+
+        tst = TernarySearchTree.build(words)
+        ordered = tst.all_strings()
+        starts = [random.randrange(len(ordered) - range_size) for _ in range(num_queries)]
+        bounds = [(ordered[start], ordered[start + range_size]) for start in starts]  # range_size words each
+
+        start_time = time.perf_counter()
+        for lo, hi in bounds:
+            list(tst.range(lo, hi))
+        range_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for lo, hi in bounds:
+            [word for word in tst.all_strings() if lo <= word < hi]
+        scan_time = time.perf_counter() - start_time
+
+        self.results['ordered_queries'] = {
+            'queries': num_queries,
+            'range_time': range_time,
+            'scan_time': scan_time
+        }
+        print(f"  Range: {range_time:.4f}s, filtered all_strings: {scan_time:.4f}s")
+
+        probes = random.sample(ordered, min(num_queries, len(ordered)))
+        for counted in (False, True):
+            if counted:
+                tst.enable_subtree_counts()
+            start_time = time.perf_counter()
+            for word in probes:
+                tst.select(tst.rank(word))
+            rank_select_time = time.perf_counter() - start_time
+
+            label = 'with_counts' if counted else 'without_counts'
+            self.results['ordered_queries'][f'rank_select_{label}'] = rank_select_time
+            print(f"  Rank + select {label.replace('_', ' ')}: {rank_select_time:.4f}s")
+
+    # Set algebra between two versions of a vocabulary: walking both trees together against
+    # flattening them with all_strings(), using Python sets and rebuilding. Time and peak memory.
+    def benchmark_set_algebra(self, words, churn=0.05):
+        print("Benchmarking set algebra between trees...")
+
+        removed = set(random.sample(words, int(len(words) * churn)))
+        added = set(self.generate_random_words(int(len(words) * churn), min_length=6)) - set(words)
+        old = TernarySearchTree.build(words)
+        new = TernarySearchTree.build([word for word in words if word not in removed] + list(added))
+        delta = TernarySearchTree.build(added)
+        bases = [TernarySearchTree.build(words) for _ in range(2)]  # merged into in place, once per run
+
+        # Timed without tracemalloc (which slows down allocations), then run again for the peak memory
+        def measure(operation):
+            start_time = time.perf_counter()
+            operation()
+            elapsed = time.perf_counter() - start_time
+            tracemalloc.start()
+            operation()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return elapsed, peak / 1024 / 1024
+
+        def rebuild(combine, first, second):
+            return lambda: TernarySearchTree.build(combine(set(first.all_strings()), set(second.all_strings())))
+
+        cases = {
+            'union': (lambda: old.union(new), rebuild(set.union, old, new)),
+            'intersection': (lambda: old.intersection(new), rebuild(set.intersection, old, new)),
+            'difference': (lambda: new.difference(old), rebuild(set.difference, new, old)),
+            'merge_delta': (lambda: bases.pop().merge_from(delta), rebuild(set.union, old, delta)),
+        }
+        for name, (walk, flatten) in cases.items():
+            walk_time, walk_memory = measure(walk)
+            flatten_time, flatten_memory = measure(flatten)
+            self.results['set_algebra'][name] = {
+                'walk_time': walk_time,
+                'walk_memory': walk_memory,
+                'flatten_time': flatten_time,
+                'flatten_memory': flatten_memory
+            }
+            print(f"  {name}: walk {walk_time:.4f}s / {walk_memory:.2f}MB, "
+                  f"flatten and rebuild {flatten_time:.4f}s / {flatten_memory:.2f}MB")
+
+    # Mixed read/write workload: per-operation latency percentiles from HDR-style histograms for
+    # Zipf and uniform keys, then a write-heavy sustained run reporting ops/sec per window.
+    def benchmark_mixed_workload(self, words, num_operations=100000, negatives_path='not_insert_words.txt',
+                                 window_ops=10000):
+        print(f"Benchmarking mixed workload ({num_operations} operations)...")
+
+        negatives = self.load_words_from_file(negatives_path) if os.path.exists(negatives_path) else None
+        seed = random.randrange(2 ** 32)
+        for distribution in ('zipf', 'uniform'):
+            workload = Workload(words, distribution=distribution, negatives=negatives, seed=seed)
+            tst = workload.build_tree()
+            histograms = replay(tst, workload.operations(num_operations))
+
+            self.results['mixed_workload'][distribution] = {
+                kind: dict(histogram.summary(), histogram=histogram.to_dict())
+                for kind, histogram in histograms.items() if histogram.count
+            }
+            for kind, data in self.results['mixed_workload'][distribution].items():
+                print(f"  {distribution} {kind:<7} - {data['count']} ops, median {data['median_ns']} ns, "
+                      f"p99 {data['p99_ns']} ns, p99.9 {data['p999_ns']} ns, max {data['max_ns']} ns")
+
+        workload = Workload(words, mix={'search': 0.5, 'insert': 0.5}, negatives=negatives, preload=0.2, seed=seed)
+        tst = workload.build_tree()
+        windows = sustained(tst, workload.operations(num_operations), window_ops)
+        self.results['mixed_workload']['sustained'] = windows
+        for window in windows:
+            print(f"  Sustained: {window['operations']} ops, {window['words']} words, {window['ops_per_sec']:.0f} ops/s")
+
+    # Cached vs uncached lookups on a Zipf-distributed query stream: half exact searches and half
+    # bounded prefix completions, drawn from the words with Zipf(s) popularity.
+    def benchmark_query_cache(self, words, num_queries=100000, maxsize=1024, s=1.0, limit=10):
+        print(f"Benchmarking LRU query cache ({num_queries} Zipf queries, maxsize {maxsize})...")
+
+        popularity = self.generate_zipf_weights(words, s)
+        hot_words = random.choices(list(popularity), weights=list(popularity.values()), k=num_queries)
+        queries = [(word, i % 2 == 0) for i, word in enumerate(hot_words)]  # (query, exact search or completion)
+        tst = TernarySearchTree.build(words)
+
+        def run():
+            start_time = time.perf_counter()
+            for word, exact in queries:
+                if exact:
+                    tst.search(word, exact=True)
+                else:
+                    list(tst.keys_with_prefix(word[:3], limit=limit))
+            return time.perf_counter() - start_time
+
+        uncached_time = run()
+        tst.enable_cache(maxsize)
+        cached_time = run()
+        info = tst.cache_info()
+
+        self.results['query_cache'] = {
+            'queries': num_queries,
+            'maxsize': maxsize,
+            'uncached_time': uncached_time,
+            'cached_time': cached_time,
+            'speedup': uncached_time / cached_time,
+            'hits': info['hits'],
+            'misses': info['misses'],
+            'hit_rate': info['hits'] / (info['hits'] + info['misses'])
+        }
+        data = self.results['query_cache']
+        print(f"  Uncached: {uncached_time:.4f}s, cached: {cached_time:.4f}s ({data['speedup']:.2f}x), "
+              f"hit rate {data['hit_rate']:.1%}")
+
+    # Substring index vs a linear scan of the words: build time and peak memory of the full index
+    # and of space-bounded ones (suffixes of at least 3 or 5 characters, shorter queries fall back
+    # to a scan), then the time to collect all matches and the first 10 matches of substrings of
+    # 3 to 5 characters taken from random words.
+    def benchmark_substring_index(self, words, num_queries=500, first=10):
+        print(f"Benchmarking substring index ({num_queries} queries)...")
+
+        queries = []
+        for word in random.choices([word for word in words if len(word) >= 5], k=num_queries):
+            length = random.randint(3, 5)
+            start = random.randint(0, len(word) - length)
+            queries.append(word[start:start + length])
+
+        start_time = time.perf_counter()
+        for query in queries:
+            [word for word in words if query in word]
+        scan_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for query in queries:
+            list(islice((word for word in words if query in word), first))
+        scan_first_time = time.perf_counter() - start_time
+
+        self.results['substring_index'] = {'queries': num_queries, 'first': first, 'words': len(words), 'variants': {}}
+        for min_suffix in (1, 3, 5):
+            start_time = time.perf_counter()
+            index = SubstringIndex.build(words, min_suffix)
+            build_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for query in queries:
+                list(index.contains_substring(query))
+            query_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for query in queries:
+                list(islice(index.contains_substring(query), first))
+            first_time = time.perf_counter() - start_time
+
+            suffixes = len(index.tree)
+            del index
+            tracemalloc.start()
+            gc.collect()
+            index = SubstringIndex.build(words, min_suffix)
+            memory = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+            del index
+
+            self.results['substring_index']['variants'][f'min_suffix_{min_suffix}'] = {
+                'build_time': build_time,
+                'memory': memory,
+                'suffixes': suffixes,
+                'query_time': query_time,
+                'scan_time': scan_time,
+                'speedup': scan_time / query_time,
+                'first_time': first_time,
+                'scan_first_time': scan_first_time,
+                'first_speedup': scan_first_time / first_time
+            }
+            print(f"  min_suffix={min_suffix}: build {build_time:.4f}s, {memory:.2f}MB, {suffixes} suffixes; "
+                  f"all matches {query_time:.4f}s vs scan {scan_time:.4f}s ({scan_time / query_time:.1f}x), "
+                  f"first {first} {first_time:.4f}s vs scan {scan_first_time:.4f}s")
+
+    # Non-ASCII corpus from the same words: every other word is spelled with Cyrillic letters,
+    # the others with accented vowels, and a fraction gets an initial capital, which makes it a
+    # duplicate of the lowercase word once case is folded.
+    def generate_non_ascii_words(self, words, capitalized=0.1):
+        cyrillic = str.maketrans(string.ascii_lowercase, "абцдефгхийклмнопкрстуввкиз")
+        accented = str.maketrans("aeiouc", "áéíöüç")
+        non_ascii = [word.translate(cyrillic if i % 2 else accented) for i, word in enumerate(words)]
+        non_ascii += [word.capitalize() for word in random.sample(non_ascii, int(len(non_ascii) * capitalized))]
+        return non_ascii
+
+    # Key codecs on an ASCII and a non-ASCII corpus: build time, exact lookup time and node count
+    # of the plain compact and node trees against the same storage behind each codec, plus the
+    # entries left after NFC + casefold normalization.
+    def benchmark_key_codecs(self, words, num_lookups=100000):
+        print("Benchmarking key codecs...")
+
+        corpora = {'ascii': words, 'non_ascii': self.generate_non_ascii_words(words)}
+        for corpus, corpus_words in corpora.items():
+            lookups = random.choices(corpus_words, k=num_lookups)
+            variants = [
+                ('compact', lambda: CompactTernarySearchTree.build(corpus_words)),
+                ('nodes', lambda: TernarySearchTree.build(corpus_words))
+            ]
+            for codec in ('codepoint', 'utf-8', 'alphabet'):
+                variants.append((f'{codec}_compact', lambda codec=codec: EncodedTernarySearchTree.build(corpus_words, codec)))
+                variants.append((f'{codec}_nodes', lambda codec=codec: EncodedTernarySearchTree.build(
+                    corpus_words, codec, storage=TernarySearchTree)))
+            variants.append(('normalized_compact', lambda: EncodedTernarySearchTree.build(
+                corpus_words, normalize=['NFC', 'casefold'])))
+
+            self.results['key_codecs'][corpus] = {}
+            for name, build in variants:
+                start_time = time.perf_counter()
+                tst = build()
+                build_time = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                for word in lookups:
+                    tst.search(word, exact=True)
+                search_time = time.perf_counter() - start_time
+
+                nodes = tst.node_count() if hasattr(tst, 'node_count') else tst.stats()['node_count']
+                self.results['key_codecs'][corpus][name] = {
+                    'build_time': build_time,
+                    'search_time': search_time,
+                    'nodes': nodes,
+                    'words': len(tst)
+                }
+                print(f"  {corpus} {name:<18} - Build: {build_time:.4f}s, Search: {search_time:.4f}s, "
+                      f"Nodes: {nodes}, Words: {len(tst)}")
+
+    # Compiled lookup kernel (_tst_kernel.c) vs the pure-Python path on the flat layout: exact
+    # searches one at a time, the same probes through search_many, and bounded prefix completions,
+    # on a compact tree and on its frozen snapshot.
+    def benchmark_native_kernel(self, words, num_queries=100000, limit=10):
+        print(f"Benchmarking compiled lookup kernel ({num_queries} queries)...")
+
+        if CompactTernarySearchTree._kernel is None:
+            self.results['native_kernel'] = {'available': False}
+            print("  Kernel not built, skipped (see _tst_kernel.c for the build command)")
+            return
+
+        probes = random.choices(words, k=num_queries)
+        prefixes = [word[:3] for word in probes]
+        compact = CompactTernarySearchTree.build(words)
+        operations = {
+            'search': lambda tree: [tree.search(word, exact=True) for word in probes],
+            'search_many': lambda tree: tree.search_many(probes),
+            'prefix': lambda tree: [list(tree.keys_with_prefix(prefix, limit=limit)) for prefix in prefixes]
+        }
+
+        self.results['native_kernel'] = {'available': True, 'queries': num_queries, 'limit': limit, 'trees': {}}
+        for name, tree in (('compact', compact), ('frozen', compact.freeze())):
+            timings = {}
+            for operation, run in operations.items():
+                times = {}
+                for backend, kernel in (('python', None), ('kernel', tree._kernel)):
+                    tree._kernel = kernel
+                    start_time = time.perf_counter()
+                    run(tree)
+                    times[backend] = time.perf_counter() - start_time
+                times['speedup'] = times['python'] / times['kernel']
+                timings[operation] = times
+                print(f"  {name.capitalize():<7} {operation:<11} - Python: {times['python']:.4f}s, "
+                      f"kernel: {times['kernel']:.4f}s ({times['speedup']:.2f}x)")
+            self.results['native_kernel']['trees'][name] = timings
+
+    # Compare storing values in the tree against a plain tree plus a dict holding the values.
+    def benchmark_symbol_table(self, words):
+        print("Benchmarking TST symbol table vs TST + dict...")
+
+        shuffled_words = list(words)
+        random.shuffle(shuffled_words)
+
+        tracemalloc.start()
+        gc.collect()
+        start_time = time.perf_counter()
+        table = TernarySearchTree()
+        for value, word in enumerate(shuffled_words):
+            table[word] = value
+        table_build = time.perf_counter() - start_time
+        table_memory = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        gc.collect()
+        start_time = time.perf_counter()
+        tst, values = TernarySearchTree(), {}
+        for value, word in enumerate(shuffled_words):
+            tst.insert(word)
+            values[word] = value
+        pair_build = time.perf_counter() - start_time
+        pair_memory = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+        start_time = time.perf_counter()
+        for word in words:
+            table.get(word)
+        table_lookup = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for word in words:
+            values[word] if tst.search(word, exact=True) else None
+        pair_lookup = time.perf_counter() - start_time
+
+        self.results['symbol_table'] = {
+            'tst_map': {'build_time': table_build, 'lookup_time': table_lookup, 'memory': table_memory},
+            'tst_plus_dict': {'build_time': pair_build, 'lookup_time': pair_lookup, 'memory': pair_memory}
+        }
+
+        print(f"  TST map    - Build: {table_build:.4f}s, Lookup: {table_lookup:.4f}s, Memory: {table_memory:.2f}MB")
+        print(f"  TST + dict - Build: {pair_build:.4f}s, Lookup: {pair_lookup:.4f}s, Memory: {pair_memory:.2f}MB")
+
+    # Compare removing part of the vocabulary with delete() against clear() and a full rebuild.
+    def benchmark_delete(self, words, fraction=0.1):
+        print("Benchmarking delete vs rebuild...")
+
+        removed = set(random.sample(words, int(len(words) * fraction)))
+        kept = [word for word in words if word not in removed]
+
+        results = {}
+        for name, tree_class in (('tst', TernarySearchTree), ('compact', CompactTernarySearchTree)):
+            tst = tree_class.build(words)
+            start_time = time.perf_counter()
+            for word in removed:
+                tst.delete(word)
+            delete_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            tst.clear()
+            tst = tree_class.build(kept)
+            rebuild_time = time.perf_counter() - start_time
+
+            results[name] = {'delete_time': delete_time, 'rebuild_time': rebuild_time}
+            print(f"  {tree_class.__name__}: delete {len(removed)} words {delete_time:.4f}s, rebuild {rebuild_time:.4f}s")
+
+        self.results['delete'] = results
+
+    # Compare peak memory and time of streaming a file into the tree against loading the word list first.
+    def benchmark_streaming_ingestion(self, file_path):
+        print("Benchmarking streaming ingestion vs load-then-insert...")
+
+        for name in ('load_then_insert', 'insert_from_file'):
+            tracemalloc.start()
+            gc.collect()
+            start_time = time.perf_counter()
+            tst = TernarySearchTree()
+            if name == 'load_then_insert':
+                for word in self.load_words_from_file(file_path):
+                    tst.insert(word)
+            else:
+                tst.insert_from_file(file_path)
+            total_time = time.perf_counter() - start_time
+            peak_memory = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+
+            self.results['streaming_ingestion'][name] = {'time': total_time, 'peak_memory': peak_memory}
+            print(f"  {name.replace('_', ' ').capitalize():<17} - Time: {total_time:.4f}s, Peak memory: {peak_memory:.2f}MB")
+
+    # Compare the cold start of building the tree from the text file against loading a saved tree.
+    def benchmark_cold_start(self, file_path, num_lookups=1000):
+        print("Benchmarking cold start: build from text vs load from binary file...")
+
+        start_time = time.perf_counter()
+        tst = TernarySearchTree()
+        for word in self.load_words_from_file(file_path):
+            tst.insert(word)
+        build_time = time.perf_counter() - start_time
+
+        lookups = random.sample(tst.all_strings(), min(num_lookups, len(tst)))
+        with tempfile.TemporaryDirectory() as directory:
+            tree_path = os.path.join(directory, "words.tst")
+            start_time = time.perf_counter()
+            tst.save(tree_path)
+            save_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            frozen = TernarySearchTree.load(tree_path, mmap=True)
+            mmap_load_time = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            for word in lookups:
+                frozen.search(word, exact=True)
+            mmap_lookup_time = time.perf_counter() - start_time
+            frozen.close()
+
+            start_time = time.perf_counter()
+            TernarySearchTree.load(tree_path, mmap=False)
+            copy_load_time = time.perf_counter() - start_time
+            file_size = os.path.getsize(tree_path)
+
+        start_time = time.perf_counter()
+        for word in lookups:
+            tst.search(word, exact=True)
+        node_lookup_time = time.perf_counter() - start_time
+
+        self.results['cold_start'] = {
+            'build_from_text': build_time,
+            'save': save_time,
+            'mmap_load': mmap_load_time,
+            'load_without_mmap': copy_load_time,
+            'file_size_mb': file_size / 1024 / 1024,
+            'lookups': len(lookups),
+            'mmap_lookup_time': mmap_lookup_time,
+            'node_lookup_time': node_lookup_time
+        }
+
+        print(f"  Build from text: {build_time:.4f}s, save: {save_time:.4f}s ({file_size / 1024 / 1024:.2f}MB)")
+        print(f"  Load with mmap: {mmap_load_time:.6f}s, without mmap: {copy_load_time:.4f}s")
+        print(f"  {len(lookups)} lookups - mmap: {mmap_lookup_time:.4f}s, nodes: {node_lookup_time:.4f}s")
+
+    # Read throughput of frozen snapshots with 1/2/4/8 reader threads and processes while a writer
+    # keeps inserting words and publishing new versions.
+    def benchmark_concurrent_reads(self, words, reader_counts=(1, 2, 4, 8), lookups_per_reader=50000):
+        print("Benchmarking concurrent reads with an active writer...")
+
+        versioned = VersionedTernarySearchTree(TernarySearchTree.build(words))
+        new_words = [f"{word}x" for word in words]
+        lookups = random.sample(words, min(10000, len(words)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.tst")
+            versioned.publish(path)
+
+            # The writer adds 100 words per version, then pauses briefly
+            stop = threading.Event()
+            def write():
+                for start in range(0, len(new_words), 100):
+                    if stop.is_set():
+                        break
+                    versioned.insert_many(new_words[start:start + 100])
+                    versioned.publish(path)
+                    stop.wait(0.05)
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            try:
+                for readers in reader_counts:
+                    elapsed = []
+                    def read():
+                        start_time = time.perf_counter()
+                        for i in range(lookups_per_reader):
+                            versioned.search(lookups[i % len(lookups)], exact=True)
+                        elapsed.append(time.perf_counter() - start_time)
+
+                    threads = [threading.Thread(target=read) for _ in range(readers)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                    thread_throughput = readers * lookups_per_reader / max(elapsed)
+
+                    with ProcessPoolExecutor(max_workers=readers) as pool:
+                        futures = [pool.submit(concurrent_read_worker, path, lookups, lookups_per_reader)
+                                   for _ in range(readers)]
+                        process_elapsed = [future.result() for future in futures]
+                    process_throughput = readers * lookups_per_reader / max(process_elapsed)
+
+                    self.results['concurrent_reads'][readers] = {
+                        'thread_ops_per_sec': thread_throughput,
+                        'process_ops_per_sec': process_throughput
+                    }
+                    print(f"  {readers} readers - threads: {thread_throughput:,.0f} ops/s, "
+                          f"processes: {process_throughput:,.0f} ops/s")
+            finally:
+                stop.set()
+                writer.join()
+
+        print(f"  Writer published {versioned.version} versions")
+
+    # Levenshtein distance, used by the brute-force baseline of benchmark_fuzzy_search.
+    def edit_distance(self, first, second):
+        row = list(range(len(second) + 1))
+        for i, first_char in enumerate(first, 1):
+            new_row = [i]
+            for j, second_char in enumerate(second, 1):
+                new_row.append(min(row[j] + 1, new_row[j - 1] + 1, row[j - 1] + (first_char != second_char)))
+            row = new_row
+        return row[-1]
+
+    # Compare fuzzy_search against scanning every word for k = 1 and k = 2.
+    def benchmark_fuzzy_search(self, words, num_queries=20):
+        print("Benchmarking fuzzy search vs brute-force scan...")
+
+        tst = TernarySearchTree.build(words)
+        queries = []
+        for word in random.sample(words, min(num_queries, len(words))):
+            position = random.randrange(len(word))
+            queries.append(word[:position] + random.choice(string.ascii_lowercase) + word[position + 1:])  # one typo
+
+        for max_distance in (1, 2):
+            start_time = time.perf_counter()
+            for query in queries:
+                tst.fuzzy_search(query, max_distance)
+            fuzzy_time = time.perf_counter() - start_time
+
+            # The scan skips words whose length alone rules them out
+            start_time = time.perf_counter()
+            for query in queries:
+                [word for word in words
+                 if abs(len(word) - len(query)) <= max_distance and self.edit_distance(query, word) <= max_distance]
+            scan_time = time.perf_counter() - start_time
+
+            self.results['fuzzy_search'][f'k={max_distance}'] = {
+                'queries': len(queries),
+                'fuzzy_time': fuzzy_time,
+                'scan_time': scan_time
+            }
+            print(f"  k={max_distance}: fuzzy_search {fuzzy_time:.4f}s, brute force {scan_time:.4f}s "
+                  f"for {len(queries)} queries")
+
+    # Compare wildcard matching against a regular expression scan, for selective and broad patterns.
+    def benchmark_pattern_match(self, words, repeats=20):
+        print("Benchmarking wildcard pattern matching...")
+
+        tst = TernarySearchTree.build(words)
+        patterns = {
+            'high_selectivity': ['c?mb*', 'd?ck', '?uck', 'str?ng*'],
+            'low_selectivity': ['?????', 's*', '?a*', '???e*'],
+        }
+
+        for selectivity, group in patterns.items():
+            regexes = [re.compile(re.escape(p).replace(r'\?', '.').replace(r'\*', '.*') + r'\Z') for p in group]
+
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                matches = sum(len(list(tst.match(pattern))) for pattern in group)
+            match_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for _ in range(repeats):
+                [sum(1 for word in words if regex.match(word)) for regex in regexes]
+            scan_time = time.perf_counter() - start_time
+
+            self.results['pattern_match'][selectivity] = {
+                'patterns': group,
+                'matches': matches,
+                'match_time': match_time,
+                'scan_time': scan_time
+            }
+            print(f"  {selectivity.replace('_', ' ').capitalize()} ({matches} matches): "
+                  f"match {match_time:.4f}s, regex scan {scan_time:.4f}s")
+
+    # Build time of a sharded tree against the number of worker processes.
+    def benchmark_sharded_build(self, words, worker_counts=(1, 2, 4, 8), num_shards=8):
+        print(f"Benchmarking sharded build ({len(words)} words, {num_shards} shards)...")
+
+        for frozen in (False, True):
+            label = 'frozen' if frozen else 'mutable'
+            timings = {}
+            for workers in worker_counts:
+                start_time = time.perf_counter()
+                ShardedTernarySearchTree.build(words, num_shards=num_shards, workers=workers, frozen=frozen)
+                timings[workers] = time.perf_counter() - start_time
+
+            self.results['sharded_build'][label] = {
+                workers: {'time': build_time, 'speedup': timings[worker_counts[0]] / build_time}
+                for workers, build_time in timings.items()
+            }
+            for workers, data in self.results['sharded_build'][label].items():
+                print(f"  {label.capitalize()} shards, {workers} workers: {data['time']:.4f}s ({data['speedup']:.2f}x)")
+
+    # Plain root against a direct-indexed table over the first one or two characters: character
+    # comparisons per lookup (below the table) and search latency, for each dataset.
+    def benchmark_hybrid_root(self, datasets, num_lookups=100000):
+        print("Benchmarking hybrid root table...")
+
+        for dataset, words in datasets.items():
+            lookups = [random.choice(words) for _ in range(num_lookups)]
+            variants = (
+                ('plain', TernarySearchTree.build(words)),
+                ('table_1', HybridTernarySearchTree.build(words, table_depth=1)),
+                ('table_2', HybridTernarySearchTree.build(words, table_depth=2)),
+            )
+            self.results['hybrid_root'][dataset] = {}
+            for name, tst in variants:
+                _, _, mean_comparisons, max_comparisons = self.measure_search_cost(tst, lookups)
+
+                start_time = time.perf_counter()
+                for word in lookups:
+                    tst.search(word, exact=True)
+                search_time = time.perf_counter() - start_time
+
+                self.results['hybrid_root'][dataset][name] = {
+                    'mean_comparisons': mean_comparisons,
+                    'max_comparisons': max_comparisons,
+                    'search_time': search_time,
+                    'latency_ns': search_time / num_lookups * 1e9
+                }
+                print(f"  {dataset} {name:<8} - {mean_comparisons:.2f} comparisons/lookup (max {max_comparisons}), "
+                      f"{search_time / num_lookups * 1e9:.0f} ns/lookup")
+
+    # Tree-shape stats and profiled insert/search counts for a tree built in file order and a
+    # balanced one, plus the cost of searching with profiling enabled.
+    def benchmark_instrumentation(self, words, num_lookups=50000):
+        print("Benchmarking instrumentation (stats and profiling)...")
+
+        lookups = [random.choice(words) for _ in range(num_lookups)]
+        for name, order in (('file_order', words), ('balanced', None)):
+            if order is None:
+                tst = TernarySearchTree.build(words)
+                tst.enable_profiling()
+            else:
+                tst = TernarySearchTree()
+                tst.enable_profiling()
+                for word in order:
+                    tst.insert(word)
+
+            start_time = time.perf_counter()
+            for word in lookups:
+                tst.search(word, exact=True)
+            profiled_time = time.perf_counter() - start_time
+
+            profile = tst.profile()
+
+            tst.disable_profiling()
+            start_time = time.perf_counter()
+            for word in lookups:
+                tst.search(word, exact=True)
+            search_time = time.perf_counter() - start_time
+
+            self.results['instrumentation'][name] = {
+                'stats': tst.stats(),
+                'profile': profile,
+                'search_time': search_time,
+                'profiled_search_time': profiled_time
+            }
+            stats = self.results['instrumentation'][name]['stats']
+            print(f"  {name}: {stats['node_count']} nodes, depth max {stats['max_depth']} / mean "
+                  f"{stats['mean_depth']:.2f}, {stats['bytes_per_word']:.1f} bytes/word, "
+                  f"profiling overhead {profiled_time / search_time:.2f}x")
+
+    # Compare the iterative insert/search paths against the original recursive ones.
+    def benchmark_iterative_vs_recursive(self, words):
+        print("Benchmarking iterative vs recursive implementation...")
+
+        for name, tree_class in (('recursive', RecursiveTernarySearchTree), ('iterative', TernarySearchTree)):
+            tst = tree_class()
+
+            try:
+                start_time = time.perf_counter()
+                for word in words:
+                    tst.insert(word)
+                insert_time = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                for word in words:
+                    tst.search(word, exact=True)
+                search_time = time.perf_counter() - start_time
+            except RecursionError:
+                insert_time = search_time = None
+                print(f"  {name.capitalize():<10} - hit the recursion limit")
+            else:
+                print(f"  {name.capitalize():<10} - Insert: {insert_time:.4f}s, Search: {search_time:.4f}s")
+
+            self.results['iterative_vs_recursive'][name] = {
+                'insert_time': insert_time,
+                'search_time': search_time
+            }
+
+        data = self.results['iterative_vs_recursive']
+        if data['recursive']['search_time'] and data['iterative']['search_time']:
+            data['insert_speedup'] = data['recursive']['insert_time'] / data['iterative']['insert_time']
+            data['search_speedup'] = data['recursive']['search_time'] / data['iterative']['search_time']
+            print(f"  Speedup  - Insert: {data['insert_speedup']:.2f}x, Search: {data['search_speedup']:.2f}x")
+
     # Compare TST performance with Python's built-in data structures.
     def compare_with_builtin_structures(self, word_count):
         print(f"Comparing with built-in structures ({word_count} words)...")
@@ -252,7 +1189,7 @@ class TSTBenchmark:
         print(f"  Set    - Insert: {set_insert_time:.4f}s, Search: {set_search_time:.4f}s")
         print(f"  List   - Insert: {list_insert_time:.4f}s, Search: {list_search_time:.4f}s")
     
-    def create_performance_plots(self):
+    def create_performance_plots(self, output_dir='.'):
         print("Creating performance plots...")
         
         fig, axs = plt.subplots(2, 2, figsize=(15, 12))
@@ -310,11 +1247,101 @@ class TSTBenchmark:
             axs[1, 1].grid(axis='y', alpha=0.3)
         
         plt.tight_layout()
-        plt.savefig('tst_performance_analysis.png', dpi=300, bbox_inches='tight')
-        print("  Saved performance plots to 'tst_performance_analysis.png'")
+        plot_path = os.path.join(output_dir, 'tst_performance_analysis.png')
+        plt.savefig(plot_path, dpi=300, bbox_inches='tight')
+        print(f"  Saved performance plots to '{plot_path}'")
     
+    # Harness: a fresh fixture for one run of a scenario on the first size words. Returns
+    # (operation, arguments); the operation is timed once per argument.
+    def prepare_scenario(self, scenario, words, size):
+        subset = words[:size]
+        probes = random.sample(subset, len(subset))
+        if scenario == 'insert':
+            return TernarySearchTree().insert, probes
+
+        tst = TernarySearchTree.build(subset)
+        if scenario == 'search':
+            return (lambda word: tst.search(word, exact=True)), probes
+        if scenario == 'search_miss':
+            present = set(subset)
+            misses = [word + 'q' for word in probes if word + 'q' not in present]
+            return (lambda word: tst.search(word, exact=True)), misses
+        if scenario == 'prefix':
+            return (lambda word: list(tst.keys_with_prefix(word[:3], limit=10))), probes
+        if scenario == 'delete':
+            return tst.delete, probes
+        raise ValueError(f"unknown scenario: {scenario}")
+
+    # Runs operation on each argument and returns the latency of each call in nanoseconds
+    def measure_latencies(self, operation, arguments):
+        clock = time.perf_counter_ns
+        latencies = []
+        for argument in arguments:
+            start = clock()
+            operation(argument)
+            latencies.append(clock() - start)
+        return latencies
+
+    # Value at percentile q (0-100) of sorted values, nearest-rank method
+    @staticmethod
+    def percentile(sorted_values, q):
+        if not sorted_values:
+            return 0
+        rank = max(1, -(-len(sorted_values) * q // 100))
+        return sorted_values[int(rank) - 1]
+
+    # Times each scenario at each size: warmup runs are discarded, then the per-operation
+    # latencies of all repeats are pooled into median/p95/p99, and ops/sec is the median over
+    # the repeats of operations divided by the wall-clock time of the whole run (loop and timer
+    # overhead included, scenario setup excluded).
+    def run_harness(self, words, scenarios=HARNESS_SCENARIOS, repeats=5, warmup=1):
+        for scenario in scenarios:
+            print(f"Harness: {scenario} ({repeats} repeats, {warmup} warmup)...")
+            self.results['harness'][scenario] = {}
+            for size in self.sizes:
+                if size > len(words):
+                    break
+                for _ in range(warmup):
+                    self.measure_latencies(*self.prepare_scenario(scenario, words, size))
+
+                latencies, throughputs = [], []
+                for _ in range(repeats):
+                    operation, arguments = self.prepare_scenario(scenario, words, size)
+                    start = time.perf_counter_ns()
+                    run = self.measure_latencies(operation, arguments)
+                    elapsed = time.perf_counter_ns() - start
+                    latencies.extend(run)
+                    throughputs.append(len(run) / (elapsed / 1e9) if elapsed else 0.0)
+                latencies.sort()
+                throughputs.sort()
+
+                summary = {
+                    'operations': len(latencies),
+                    'median_ns': self.percentile(latencies, 50),
+                    'p95_ns': self.percentile(latencies, 95),
+                    'p99_ns': self.percentile(latencies, 99),
+                    'mean_ns': sum(latencies) / len(latencies) if latencies else 0.0,
+                    'ops_per_sec': throughputs[len(throughputs) // 2] if throughputs else 0.0
+                }
+                self.results['harness'][scenario][str(size)] = summary
+                print(f"  {size} words: median {summary['median_ns']} ns, p95 {summary['p95_ns']} ns, "
+                      f"p99 {summary['p99_ns']} ns, {summary['ops_per_sec']:.0f} ops/s")
+
+    # Writes the harness results with the run configuration and environment metadata
+    def save_harness(self, path, config):
+        document = {
+            'schema_version': HARNESS_SCHEMA_VERSION,
+            'environment': environment_metadata(),
+            'config': config,
+            'results': self.results['harness']
+        }
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=4)
+        print(f"  Saved harness results to '{path}'")
+        return document
+
     # Generate a comprehensive performance report.
-    def generate_report(self):
+    def generate_report(self, output_dir='.'):
         print("\nGenerating performance report...")
         
         report = []
@@ -332,6 +1359,10 @@ class TSTBenchmark:
             
             if 'memory' in self.results['insert']:
                 report.append(f"  Peak memory usage (for {self.results['insert']['counts'][-1]} words): {self.results['insert']['memory'][-1]:.2f}MB")
+            if 'compact_memory' in self.results['insert']:
+                memory = self.results['insert']['memory'][-1]
+                compact = self.results['insert']['compact_memory'][-1]
+                report.append(f"  Peak memory usage with compact storage: {compact:.2f}MB ({(1 - compact / memory) * 100:.1f}% less)")
             report.append("")
         
         # Search performance analysis
@@ -340,6 +1371,8 @@ class TSTBenchmark:
             report.append("-" * 19)
             for count, time_taken in zip(self.results['search']['counts'], self.results['search']['times']):
                 report.append(f"  Total time for {count} searches: {time_taken:.4f}s")
+            for count, time_taken in zip(self.results['search']['counts'], self.results['search'].get('batch_times', [])):
+                report.append(f"  Total time for {count} searches with search_many: {time_taken:.4f}s")
             report.append("")
         
         # Best case scenarios
@@ -359,8 +1392,246 @@ class TSTBenchmark:
                 report.append(f"  {scenario_name.replace('_', ' ').title()}:")
                 report.append(f"    Insert: {data['insert_time']:.4f}s")
                 report.append(f"    Search: {data['search_time']:.4f}s")
+                if 'radix_nodes' in data:
+                    report.append(f"    Nodes: {data['nodes']} plain, {data['radix_nodes']} radix")
+                    report.append(f"    Memory: {data['memory']:.2f}MB plain, {data['radix_memory']:.2f}MB radix")
+                    report.append(f"    Radix search: {data['radix_search_time']:.4f}s")
             report.append("")
         
+        # Bulk load vs incremental insert
+        if 'bulk_load' in self.results and self.results['bulk_load']:
+            report.append("BULK LOAD VS INCREMENTAL INSERT:")
+            report.append("-" * 32)
+            for name, data in self.results['bulk_load'].items():
+                report.append(f"  {name.capitalize():<12} - Build: {data['build_time']:.4f}s, Search: {data['search_time']:.4f}s, "
+                              f"Depth: mean {data['mean_depth']:.1f}, max {data['max_depth']}")
+            report.append("")
+
+        # Prefix completion
+        if 'prefix_completion' in self.results:
+            data = self.results['prefix_completion']
+            report.append("PREFIX COMPLETION:")
+            report.append("-" * 18)
+            report.append(f"  keys_with_prefix (top {data['limit']}): {data['completion_time']:.4f}s for {data['queries']} queries")
+            report.append(f"  all_strings scan (top {data['limit']}): {data['scan_time']:.4f}s for {data['queries']} queries")
+            report.append("")
+
+        # Top-k autocomplete
+        if 'top_k' in self.results and self.results['top_k']:
+            data = self.results['top_k']
+            title = f"TOP-{data['k']} AUTOCOMPLETE (ZIPF WEIGHTS, {data['queries']} QUERIES):"
+            report.append(title)
+            report.append("-" * len(title))
+            for prefix_length in (1, 2, 3):
+                times = data[f'prefix_{prefix_length}']
+                report.append(f"  Prefix length {prefix_length}: top_k {times['top_k_time']:.4f}s, "
+                              f"collect and sort {times['sort_time']:.4f}s")
+            report.append("")
+
+        # Ordered-set queries
+        if 'ordered_queries' in self.results and self.results['ordered_queries']:
+            data = self.results['ordered_queries']
+            title = f"ORDERED-SET QUERIES ({data['queries']} QUERIES):"
+            report.append(title)
+            report.append("-" * len(title))
+            report.append(f"  Range: {data['range_time']:.4f}s, filtered all_strings: {data['scan_time']:.4f}s")
+            report.append(f"  Rank + select without subtree counts: {data['rank_select_without_counts']:.4f}s, "
+                          f"with: {data['rank_select_with_counts']:.4f}s")
+            report.append("")
+
+        # Set algebra
+        if 'set_algebra' in self.results and self.results['set_algebra']:
+            report.append("SET ALGEBRA (WALK BOTH TREES VS FLATTEN AND REBUILD):")
+            report.append("-" * 53)
+            for name, data in self.results['set_algebra'].items():
+                report.append(f"  {name}: walk {data['walk_time']:.4f}s / {data['walk_memory']:.2f}MB, "
+                              f"flatten and rebuild {data['flatten_time']:.4f}s / {data['flatten_memory']:.2f}MB")
+            report.append("")
+
+        # Mixed workload
+        if 'mixed_workload' in self.results and self.results['mixed_workload']:
+            report.append("MIXED WORKLOAD LATENCY (PER OPERATION):")
+            report.append("-" * 39)
+            for distribution in ('zipf', 'uniform'):
+                for kind, data in self.results['mixed_workload'].get(distribution, {}).items():
+                    report.append(f"  {distribution} {kind:<7} - {data['count']} ops, median {data['median_ns']} ns, "
+                                  f"p99 {data['p99_ns']} ns, p99.9 {data['p999_ns']} ns, max {data['max_ns']} ns")
+            for window in self.results['mixed_workload'].get('sustained', []):
+                report.append(f"  Sustained: {window['operations']} ops, {window['words']} words, "
+                              f"{window['ops_per_sec']:.0f} ops/s")
+            report.append("")
+
+        # Query cache
+        if 'query_cache' in self.results and self.results['query_cache']:
+            data = self.results['query_cache']
+            title = f"LRU QUERY CACHE (ZIPF STREAM, {data['queries']} QUERIES, MAXSIZE {data['maxsize']}):"
+            report.append(title)
+            report.append("-" * len(title))
+            report.append(f"  Uncached: {data['uncached_time']:.4f}s, cached: {data['cached_time']:.4f}s "
+                          f"({data['speedup']:.2f}x)")
+            report.append(f"  Hits: {data['hits']}, misses: {data['misses']} (hit rate {data['hit_rate']:.1%})")
+            report.append("")
+
+        # Substring index
+        if 'substring_index' in self.results and self.results['substring_index']:
+            data = self.results['substring_index']
+            title = f"SUBSTRING INDEX VS LINEAR SCAN ({data['queries']} QUERIES, {data['words']} WORDS):"
+            report.append(title)
+            report.append("-" * len(title))
+            for name, variant in data['variants'].items():
+                report.append(f"  {name.replace('_', ' ').capitalize()} - Build: {variant['build_time']:.4f}s, "
+                              f"Memory: {variant['memory']:.2f}MB, Suffixes: {variant['suffixes']}")
+                report.append(f"    All matches: {variant['query_time']:.4f}s vs scan {variant['scan_time']:.4f}s "
+                              f"({variant['speedup']:.1f}x)")
+                report.append(f"    First {data['first']}: {variant['first_time']:.4f}s vs scan "
+                              f"{variant['scan_first_time']:.4f}s ({variant['first_speedup']:.1f}x)")
+            report.append("")
+
+        # Key codecs
+        if 'key_codecs' in self.results and self.results['key_codecs']:
+            report.append("KEY CODECS (ASCII VS NON-ASCII CORPUS):")
+            report.append("-" * 39)
+            for corpus, variants in self.results['key_codecs'].items():
+                for name, data in variants.items():
+                    report.append(f"  {corpus} {name:<18} - Build: {data['build_time']:.4f}s, "
+                                  f"Search: {data['search_time']:.4f}s, Nodes: {data['nodes']}, Words: {data['words']}")
+            report.append("")
+
+        # Compiled lookup kernel
+        if 'native_kernel' in self.results and self.results['native_kernel']:
+            data = self.results['native_kernel']
+            report.append("COMPILED LOOKUP KERNEL VS PURE PYTHON:")
+            report.append("-" * 38)
+            if not data['available']:
+                report.append("  Kernel not built")
+            for name, timings in data.get('trees', {}).items():
+                for operation, times in timings.items():
+                    report.append(f"  {name.capitalize():<7} {operation:<11} - Python: {times['python']:.4f}s, "
+                                  f"kernel: {times['kernel']:.4f}s ({times['speedup']:.2f}x)")
+            report.append("")
+
+        # Symbol table
+        if 'symbol_table' in self.results:
+            report.append("SYMBOL TABLE (VALUES IN TREE VS TST + DICT):")
+            report.append("-" * 44)
+            for name, label in (('tst_map', 'TST map   '), ('tst_plus_dict', 'TST + dict')):
+                data = self.results['symbol_table'][name]
+                report.append(f"  {label} - Build: {data['build_time']:.4f}s, Lookup: {data['lookup_time']:.4f}s, "
+                              f"Memory: {data['memory']:.2f}MB")
+            report.append("")
+
+        # Delete vs rebuild
+        if 'delete' in self.results and self.results['delete']:
+            report.append("DELETE VS REBUILD:")
+            report.append("-" * 18)
+            for name, data in self.results['delete'].items():
+                label = 'TST' if name == 'tst' else name.capitalize()
+                report.append(f"  {label:<8} - Delete: {data['delete_time']:.4f}s, Rebuild: {data['rebuild_time']:.4f}s")
+            report.append("")
+
+        # Streaming ingestion
+        if 'streaming_ingestion' in self.results and self.results['streaming_ingestion']:
+            report.append("STREAMING INGESTION VS LOAD-THEN-INSERT:")
+            report.append("-" * 40)
+            for name, data in self.results['streaming_ingestion'].items():
+                report.append(f"  {name.replace('_', ' ').capitalize():<17} - Time: {data['time']:.4f}s, "
+                              f"Peak memory: {data['peak_memory']:.2f}MB")
+            report.append("")
+
+        # Cold start
+        if 'cold_start' in self.results:
+            data = self.results['cold_start']
+            report.append("COLD START (BUILD FROM TEXT VS LOAD):")
+            report.append("-" * 36)
+            report.append(f"  Build from text:     {data['build_from_text']:.4f}s")
+            report.append(f"  Load with mmap:      {data['mmap_load']:.6f}s")
+            report.append(f"  Load without mmap:   {data['load_without_mmap']:.4f}s")
+            report.append(f"  File size:           {data['file_size_mb']:.2f}MB")
+            report.append(f"  {data['lookups']} lookups - mmap: {data['mmap_lookup_time']:.4f}s, nodes: {data['node_lookup_time']:.4f}s")
+            report.append("")
+
+        # Concurrent reads
+        if 'concurrent_reads' in self.results and self.results['concurrent_reads']:
+            report.append("CONCURRENT READS WITH AN ACTIVE WRITER:")
+            report.append("-" * 39)
+            for readers, data in self.results['concurrent_reads'].items():
+                report.append(f"  {readers} readers - threads: {data['thread_ops_per_sec']:,.0f} ops/s, "
+                              f"processes: {data['process_ops_per_sec']:,.0f} ops/s")
+            report.append("")
+
+        # Fuzzy search
+        if 'fuzzy_search' in self.results and self.results['fuzzy_search']:
+            report.append("FUZZY SEARCH VS BRUTE-FORCE SCAN:")
+            report.append("-" * 33)
+            for name, data in self.results['fuzzy_search'].items():
+                report.append(f"  {name}: fuzzy_search {data['fuzzy_time']:.4f}s, brute force {data['scan_time']:.4f}s "
+                              f"for {data['queries']} queries")
+            report.append("")
+
+        # Wildcard pattern matching
+        if 'pattern_match' in self.results and self.results['pattern_match']:
+            report.append("WILDCARD PATTERN MATCHING VS REGEX SCAN:")
+            report.append("-" * 40)
+            for selectivity, data in self.results['pattern_match'].items():
+                report.append(f"  {selectivity.replace('_', ' ').capitalize()} {data['patterns']} ({data['matches']} matches): "
+                              f"match {data['match_time']:.4f}s, regex scan {data['scan_time']:.4f}s")
+            report.append("")
+
+        # Sharded build
+        if 'sharded_build' in self.results and self.results['sharded_build']:
+            report.append("SHARDED BUILD SPEEDUP:")
+            report.append("-" * 22)
+            for label, timings in self.results['sharded_build'].items():
+                for workers, data in timings.items():
+                    report.append(f"  {label.capitalize()} shards, {workers} workers: {data['time']:.4f}s ({data['speedup']:.2f}x)")
+            report.append("")
+
+        # Hybrid root table
+        if 'hybrid_root' in self.results and self.results['hybrid_root']:
+            report.append("HYBRID ROOT TABLE (COMPARISONS AND LATENCY PER LOOKUP):")
+            report.append("-" * 55)
+            for dataset, variants in self.results['hybrid_root'].items():
+                for name, data in variants.items():
+                    report.append(f"  {dataset} {name:<8} - {data['mean_comparisons']:.2f} comparisons "
+                                  f"(max {data['max_comparisons']}), {data['latency_ns']:.0f} ns")
+            report.append("")
+
+        # Instrumentation: tree shape and per-operation profile
+        if 'instrumentation' in self.results and self.results['instrumentation']:
+            report.append("TREE SHAPE AND OPERATION PROFILE:")
+            report.append("-" * 33)
+            for name, data in self.results['instrumentation'].items():
+                stats = data['stats']
+                report.append(f"  {name.replace('_', ' ').capitalize()}:")
+                report.append(f"    Nodes: {stats['node_count']} for {stats['word_count']} words, "
+                              f"{stats['bytes_per_word']:.1f} bytes/word")
+                report.append(f"    Depth: max {stats['max_depth']}, mean {stats['mean_depth']:.2f}")
+                report.append(f"    Links: {stats['ls_links']} _ls, {stats['eq_links']} _eq, {stats['gt_links']} _gt; "
+                              f"nodes by children {stats['branching']}")
+                for operation, profile in data['profile'].items():
+                    if not profile['operations']:
+                        continue
+                    report.append(f"    {operation.capitalize()}: {profile['operations']} ops, visits mean "
+                                  f"{profile['mean_visits']:.2f} (max {profile['max_visits']}), comparisons mean "
+                                  f"{profile['mean_comparisons']:.2f} (max {profile['max_comparisons']})")
+                report.append(f"    Search: {data['search_time']:.4f}s, with profiling {data['profiled_search_time']:.4f}s")
+            report.append("")
+
+        # Iterative vs recursive implementation
+        if 'iterative_vs_recursive' in self.results and self.results['iterative_vs_recursive']:
+            report.append("ITERATIVE VS RECURSIVE:")
+            report.append("-" * 23)
+            for name in ('recursive', 'iterative'):
+                data = self.results['iterative_vs_recursive'][name]
+                if data['insert_time'] is None:
+                    report.append(f"  {name.capitalize():<10} - hit the recursion limit")
+                else:
+                    report.append(f"  {name.capitalize():<10} - Insert: {data['insert_time']:.4f}s, Search: {data['search_time']:.4f}s")
+            if 'search_speedup' in self.results['iterative_vs_recursive']:
+                data = self.results['iterative_vs_recursive']
+                report.append(f"  Speedup    - Insert: {data['insert_speedup']:.2f}x, Search: {data['search_speedup']:.2f}x")
+            report.append("")
+
         # Comparison with built-in structures
         if 'comparison' in self.results:
             comp = self.results['comparison']
@@ -372,25 +1643,32 @@ class TSTBenchmark:
             report.append("")
         
         # Save results to a JSON file for analysis script
-        json_path = "benchmark_results.json"
+        json_path = os.path.join(output_dir, "benchmark_results.json")
         with open(json_path, 'w') as f:
             json.dump(self.results, f, indent=4)
         print(f"  Saved raw results to '{json_path}'")
         
         # Save report to a text file
-        report_path = "tst_performance_report.txt"
+        report_path = os.path.join(output_dir, "tst_performance_report.txt")
         with open(report_path, 'w') as f:
             f.write("\n".join(report))
         
         print(f"  Saved performance report to '{report_path}'")
 
-def run_all_benchmarks(word_source='file'):
+def run_all_benchmarks(word_source='file', file_path='corncob_lowercase.txt', sizes=DEFAULT_SIZES, seed=None,
+                       output_dir='.'):
     """Main function to run all benchmark tests."""
-    benchmark = TSTBenchmark()
+    if seed is not None:
+        random.seed(seed)
+    benchmark = TSTBenchmark(sizes)
     
     words_to_insert = []
     if word_source == 'file':
-        words_to_insert = benchmark.load_words_from_file('corncob_lowercase.txt')
+        words_to_insert = benchmark.load_words_from_file(file_path)
+        # Cold start from the text file vs a saved binary tree
+        benchmark.benchmark_cold_start(file_path)
+        # Streaming the file into the tree vs loading the word list first
+        benchmark.benchmark_streaming_ingestion(file_path)
     else:
         # Fallback to random word generation
         words_to_insert = benchmark.generate_random_words(60000)
@@ -407,13 +1685,175 @@ def run_all_benchmarks(word_source='file'):
     # Run worst case scenarios benchmark
     benchmark.benchmark_worst_case_scenarios()
     
+    # Compare a balanced bulk-built tree against incremental insertion
+    benchmark.benchmark_bulk_load(words_to_insert)
+    
+    # Compare lazy prefix completion against a full scan
+    benchmark.benchmark_prefix_completion(words_to_insert)
+    
+    # Ranked autocomplete with Zipf-distributed weights
+    benchmark.benchmark_top_k(words_to_insert)
+    
+    # Range, floor/ceiling and rank/select queries
+    benchmark.benchmark_ordered_queries(words_to_insert)
+    
+    # Union, intersection, difference and delta merges between vocabulary versions
+    benchmark.benchmark_set_algebra(words_to_insert)
+    
+    # Mixed read/write workload with tail latencies and sustained throughput
+    benchmark.benchmark_mixed_workload(words_to_insert)
+    
+    # Hot-query result cache on a Zipf query stream
+    benchmark.benchmark_query_cache(words_to_insert)
+    
+    # Compiled lookup kernel vs the pure-Python fallback
+    benchmark.benchmark_native_kernel(words_to_insert)
+    
+    # Code point, UTF-8 and alphabet-mapped keys on ASCII and non-ASCII words
+    benchmark.benchmark_key_codecs(words_to_insert)
+    
+    # Substring search through the suffix index vs a linear scan
+    benchmark.benchmark_substring_index(words_to_insert)
+    
+    # Values stored in the tree vs a separate dict
+    benchmark.benchmark_symbol_table(words_to_insert)
+    
+    # Vocabulary churn: delete vs rebuild
+    benchmark.benchmark_delete(words_to_insert)
+    
+    # Frozen snapshots read from threads and processes while a writer publishes new versions
+    benchmark.benchmark_concurrent_reads(words_to_insert)
+    
+    # Spell correction vs brute force
+    benchmark.benchmark_fuzzy_search(words_to_insert)
+    
+    # Wildcard patterns vs a regex scan
+    benchmark.benchmark_pattern_match(words_to_insert)
+    
+    # Parallel sharded build on a larger vocabulary
+    benchmark.benchmark_sharded_build(words_to_insert + benchmark.generate_random_words(500000))
+    
+    # Direct-indexed root table vs the plain root, on the loaded words and on random words
+    benchmark.benchmark_hybrid_root({'corncob' if word_source == 'file' else 'generated': words_to_insert,
+                                     'random': benchmark.generate_random_words(len(words_to_insert))})
+    
+    # Tree-shape stats and per-operation visit/comparison histograms
+    benchmark.benchmark_instrumentation(words_to_insert)
+    
+    # Compare the iterative implementation against the original recursive one
+    benchmark.benchmark_iterative_vs_recursive(words_to_insert)
+    
     # Compare with built-in structures
     # The comparison benchmark will run with the full dataset size
     benchmark.compare_with_builtin_structures(len(words_to_insert))
     
     # Create plots and generate textual report
-    benchmark.create_performance_plots()
-    benchmark.generate_report()
+    benchmark.create_performance_plots(output_dir)
+    benchmark.generate_report(output_dir)
+
+
+# Python, machine and code version of a benchmark run
+def environment_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit
+    }
+
+
+# Compares two harness documents: a scenario/size is a regression when its median or p95
+# latency grew by more than threshold (0.1 = 10%) or its ops/sec dropped by more than threshold.
+# Returns a list of (scenario, size, metric, baseline value, current value).
+def compare_results(baseline, current, threshold=0.1):
+    if baseline.get('schema_version') != current.get('schema_version'):
+        raise ValueError(f"schema version {baseline.get('schema_version')} of the baseline doesn't match "
+                         f"{current.get('schema_version')}")
+
+    regressions = []
+    for scenario, sizes in current['results'].items():
+        for size, data in sizes.items():
+            reference = baseline['results'].get(scenario, {}).get(size)
+            if reference is None:
+                continue
+            for metric in ('median_ns', 'p95_ns'):
+                if reference[metric] and data[metric] > reference[metric] * (1 + threshold):
+                    regressions.append((scenario, size, metric, reference[metric], data[metric]))
+            if data['ops_per_sec'] < reference['ops_per_sec'] * (1 - threshold):
+                regressions.append((scenario, size, 'ops_per_sec', reference['ops_per_sec'], data['ops_per_sec']))
+    return regressions
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ternary search tree benchmarks. Without --scenarios the full suite runs; with "
+                    "--scenarios only the harness scenarios run, with warmup, repeats and latency percentiles.")
+    parser.add_argument('--dataset', default='corncob_lowercase.txt',
+                        help="word list file (one word per line), or 'random' for generated words")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="word counts to test")
+    parser.add_argument('--scenarios', nargs='+', choices=HARNESS_SCENARIOS + ('all',),
+                        help="harness scenarios to run ('all' for every scenario)")
+    parser.add_argument('--repeats', type=int, default=5, help="measured runs per scenario and size")
+    parser.add_argument('--warmup', type=int, default=1, help="discarded runs before the measured ones")
+    parser.add_argument('--seed', type=int, default=42, help="seed of the random module")
+    parser.add_argument('--output-dir', default='.', help="directory for the result files")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="harness JSON of an earlier run: flag regressions against it (exit status 1)")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative change that counts as a regression (default 0.1 = 10%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    word_source = 'random' if args.dataset == 'random' else 'file'
+
+    if not args.scenarios:
+        run_all_benchmarks(word_source, args.dataset, args.sizes, args.seed, args.output_dir)
+        return 0
+
+    random.seed(args.seed)
+    benchmark = TSTBenchmark(args.sizes)
+    if word_source == 'file':
+        words = benchmark.load_words_from_file(args.dataset)
+    else:
+        words = benchmark.generate_random_words(max(args.sizes) * 2)
+    scenarios = HARNESS_SCENARIOS if 'all' in args.scenarios else args.scenarios
+
+    benchmark.run_harness(words, scenarios, args.repeats, args.warmup)
+    config = {
+        'dataset': args.dataset,
+        'sizes': args.sizes,
+        'scenarios': list(scenarios),
+        'repeats': args.repeats,
+        'warmup': args.warmup,
+        'seed': args.seed
+    }
+    document = benchmark.save_harness(os.path.join(args.output_dir, 'benchmark_harness.json'), config)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for key in ('dataset', 'seed'):
+            if baseline.get('config', {}).get(key) != config[key]:
+                print(f"  Warning: the baseline was run with {key}={baseline.get('config', {}).get(key)!r}")
+        regressions = compare_results(baseline, document, args.threshold)
+        for scenario, size, metric, before, after in regressions:
+            print(f"  REGRESSION {scenario} @ {size} words: {metric} {before:.0f} -> {after:.0f}")
+        if regressions:
+            return 1
+        print(f"  No regressions against '{args.compare}' (threshold {args.threshold:.0%})")
+    return 0
 
 if __name__ == "__main__":
-    run_all_benchmarks()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,206 @@
+import time
+import random
+import string
+from itertools import accumulate
+
+from ternary_search_tree import TernarySearchTree
+
+
+# Operation kinds of a workload: exact search of a present word, prefix completion, exact
+# search of an absent word and insert of a new word
+OPERATIONS = ('search', 'prefix', 'miss', 'insert')
+
+DEFAULT_MIX = {'search': 0.6, 'prefix': 0.2, 'miss': 0.15, 'insert': 0.05}
+
+
+# Latency histogram in the style of HdrHistogram: values are counted in log-linear buckets, so
+# recording is O(1), memory stays small for any number of values, and every percentile is
+# exact up to a relative error of 2 ** -sub_bucket_bits (< 1% with the default of 7 bits).
+class LatencyHistogram:
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}  # bucket index -> number of values
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def __len__(self):
+        return self.count
+
+    # Bucket of a value: small values get a bucket each, larger ones keep their top
+    # sub_bucket_bits + 1 bits (the exponent is in the high part of the index)
+    def _bucket(self, value):
+        shift = max(value.bit_length() - self.sub_bucket_bits - 1, 0)
+        return (shift << (self.sub_bucket_bits + 1)) | (value >> shift)
+
+    # Largest value that falls in a bucket
+    def _bucket_high(self, bucket):
+        shift = bucket >> (self.sub_bucket_bits + 1)
+        mantissa = bucket & ((1 << (self.sub_bucket_bits + 1)) - 1)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value):
+        value = int(value)
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    # Adds the values of another histogram with the same resolution
+    def merge(self, other):
+        for bucket, times in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + times
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    # Value at percentile q (0-100): the upper end of the bucket holding it, capped by the maximum
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * q // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return min(self._bucket_high(bucket), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ns': self.mean(),
+            'median_ns': self.percentile(50),
+            'p90_ns': self.percentile(90),
+            'p99_ns': self.percentile(99),
+            'p999_ns': self.percentile(99.9),
+            'max_ns': self.max
+        }
+
+    # Export of the raw buckets as [upper value of the bucket, count] pairs in ascending order
+    def to_dict(self):
+        return {
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'buckets': [[self._bucket_high(bucket), self.counts[bucket]] for bucket in sorted(self.counts)]
+        }
+
+
+# A replayable stream of operations over a word list. The first preload fraction of the
+# (shuffled) words is in the tree before the replay and is where search and prefix keys come
+# from, with Zipf(s) or uniform popularity; the rest of the words are inserted in order as the
+# replay asks for inserts. Misses come from negatives (e.g. the lines of not_insert_words.txt)
+# or, without them, from generated words that aren't in the list.
+class Workload:
+
+    def __init__(self, words, mix=None, distribution='zipf', s=1.0, negatives=None, preload=0.8, seed=None):
+        if distribution not in ('zipf', 'uniform'):
+            raise ValueError("distribution must be 'zipf' or 'uniform'")
+        mix = dict(DEFAULT_MIX if mix is None else mix)
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"unknown operations in mix: {sorted(unknown)}")
+
+        self.rng = random.Random(seed)
+        self.mix = mix
+        self.distribution = distribution
+        self.s = s
+
+        words = list(dict.fromkeys(word for word in words if word))  # unique, first occurrence order
+        self.rng.shuffle(words)
+        split = max(1, int(len(words) * preload))
+        self.preloaded, self.pending = words[:split], words[split:]
+        self._pending = iter(self.pending)  # shared by successive operations() calls
+
+        present = set(words)
+        negatives = [word for word in (negatives or ()) if word and word not in present]
+        while len(negatives) < 1000:
+            word = self.rng.choice(self.preloaded) + ''.join(self.rng.choices(string.ascii_lowercase, k=2))
+            if word not in present:
+                negatives.append(word)
+        self.negatives = negatives
+
+        # Rank r (1-based) of the hot keys is drawn with weight 1 / r ** s
+        self.cum_weights = list(accumulate(1 / rank ** s for rank in range(1, len(self.preloaded) + 1)))
+
+    # Tree holding the preloaded words
+    def build_tree(self, tree_class=TernarySearchTree):
+        return tree_class.build(self.preloaded)
+
+    def _keys(self, count):
+        if self.distribution == 'uniform':
+            return [self.rng.choice(self.preloaded) for _ in range(count)]
+        return self.rng.choices(self.preloaded, cum_weights=self.cum_weights, k=count)
+
+    # List of count (operation, key) pairs drawn from the mix
+    def operations(self, count):
+        kinds = self.rng.choices(list(self.mix), weights=list(self.mix.values()), k=count)
+        keys = iter(self._keys(count))
+        operations = []
+        for kind in kinds:
+            if kind == 'search':
+                operations.append((kind, next(keys)))
+            elif kind == 'prefix':
+                operations.append((kind, next(keys)[:3]))
+            elif kind == 'miss':
+                operations.append((kind, self.rng.choice(self.negatives)))
+            else:
+                word = next(self._pending, None)
+                if word is None:  # out of held-out words: insert generated ones
+                    word = ''.join(self.rng.choices(string.ascii_lowercase, k=self.rng.randint(6, 12)))
+                operations.append((kind, word))
+        return operations
+
+
+# Runs one operation on the tree
+def apply(tst, kind, key, limit=10):
+    if kind == 'insert':
+        tst.insert(key)
+    elif kind == 'prefix':
+        for _ in tst.keys_with_prefix(key, limit=limit):
+            pass
+    else:
+        tst.search(key, exact=True)
+
+
+# Replays operations on the tree and returns a LatencyHistogram per operation kind
+def replay(tst, operations):
+    histograms = {kind: LatencyHistogram() for kind in OPERATIONS}
+    clock = time.perf_counter_ns
+    for kind, key in operations:
+        start = clock()
+        apply(tst, kind, key)
+        histograms[kind].record(clock() - start)
+    return histograms
+
+
+# Sustained-throughput mode: replays operations back to back and reports, per window of
+# window_ops operations, the throughput and the size of the tree at the end of the window,
+# which shows how throughput degrades as the tree grows
+def sustained(tst, operations, window_ops=10000):
+    windows = []
+    clock = time.perf_counter
+    total = 0.0
+    for start in range(0, len(operations), window_ops):
+        window = operations[start:start + window_ops]
+        started = clock()
+        for kind, key in window:
+            apply(tst, kind, key)
+        elapsed = clock() - started
+        total += elapsed
+        windows.append({
+            'operations': start + len(window),
+            'elapsed': total,
+            'seconds': elapsed,
+            'ops_per_sec': len(window) / elapsed if elapsed else 0.0,
+            'words': len(tst)
+        })
+    return windows
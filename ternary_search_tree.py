@@ -1,121 +1,2409 @@
-class TernarySearchTree:
+import gzip
+import io
+import os
+import struct
+import sys
+import threading
+import unicodedata
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from heapq import heappop, heappush
+from itertools import chain, count, islice
+from mmap import ACCESS_READ, mmap as memory_map
+
+try:
+    import _tst_kernel  # optional compiled lookups on the flat layout, built from _tst_kernel.c
+except ImportError:
+    _tst_kernel = None
+
+
+# Yields sorted words in median-first order: inserting them in this order gives balanced _ls/_gt links
+def _median_order(sorted_words):
+    stack = [(0, len(sorted_words))]
+    while stack:
+        lo, hi = stack.pop()
+        if lo >= hi:
+            continue
+        mid = (lo + hi) // 2
+        yield sorted_words[mid]
+        stack.append((mid + 1, hi))
+        stack.append((lo, mid))
+
+
+# Binary file format: a header followed by the node arrays of the flat layout, all little-endian.
+# Header: magic, format version, reserved, number of slots (sentinel included), word count, root, reserved.
+# Then chars (uint32), ls, eq and gt (int32) and flags (uint8), each with one entry per slot.
+_FILE_MAGIC = b"TSTB"
+_FILE_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+# Packs the flat node arrays into the binary file format
+def _pack_flat(chars, flags, ls, eq, gt, word_count, root):
+    parts = [_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, 0, len(chars), word_count, root, 0)]
+    for values, typecode in ((chars, "I"), (ls, "i"), (eq, "i"), (gt, "i")):
+        values = array(typecode, values)
+        if sys.byteorder == "big":
+            values.byteswap()
+        parts.append(values.tobytes())
+    parts.append(bytes(flags))
+    return b"".join(parts)
+
+
+# Unpacks a buffer in the binary file format into (chars, flags, ls, eq, gt, word_count, root).
+# On little-endian machines the arrays are zero-copy views on the buffer.
+def _unpack_flat(buffer):
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise ValueError("not a ternary search tree file: too short")
+    magic, version, _, slots, word_count, root, _ = _HEADER.unpack_from(view)
+    if magic != _FILE_MAGIC:
+        raise ValueError("not a ternary search tree file: bad magic")
+    if version != _FILE_VERSION:
+        raise ValueError(f"unsupported ternary search tree file version {version}")
+    if len(view) != _HEADER.size + 17 * slots:
+        raise ValueError("ternary search tree file is truncated or corrupt")
+
+    arrays = []
+    offset = _HEADER.size
+    for typecode in ("I", "i", "i", "i"):
+        values = view[offset:offset + 4 * slots].cast(typecode)
+        if sys.byteorder == "big":
+            values = array(typecode, values)
+            values.byteswap()
+        arrays.append(values)
+        offset += 4 * slots
+    chars, ls, eq, gt = arrays
+    flags = view[offset:offset + slots]
+    return chars, flags, ls, eq, gt, word_count, root
+
+
+_READ_BUFFER_SIZE = 1 << 20  # insert_from_file reads the file in chunks of this many bytes
+
+
+# Streams the words of a text file (one per line, optionally gzip'd): each line is stripped and
+# normalized. Yields (line number, word) for every line without building a list; the word is
+# empty for blank lines, so callers can skip them and still count every line.
+def _read_words(path, encoding="utf-8", normalize=None):
+    with open(path, "rb", buffering=_READ_BUFFER_SIZE) as raw:
+        if raw.peek(2)[:2] == b"\x1f\x8b":  # gzip magic number
+            raw = io.BufferedReader(gzip.GzipFile(fileobj=raw), _READ_BUFFER_SIZE)
+        with io.TextIOWrapper(raw, encoding=encoding) as lines:
+            for line_number, line in enumerate(lines, 1):
+                word = line.strip()
+                if normalize is not None and word:
+                    word = normalize(word)
+                yield line_number, word
+
+
+_MAX_CHAR = chr(0x10FFFF)  # no character sorts after this one
+
+_BATCH_SPLIT_MIN = 8  # search_many stops splitting groups of at most this many probes
+
+# Marks a node that doesn't end a word; any other value (including None) means it does
+_NO_VALUE = object()
+
+
+# In-order traversal shared by every node layout: lazily yields (word, node) for the nodes below
+# node that end a word, in sorted order, each word prefixed with prefix. fields(node) returns
+# (text the node adds to the word, mark, _ls, _eq, _gt) with falsy missing children, and a word
+# ends at the node unless mark is no_word. Without fields the nodes are TernarySearchTree.Nodes,
+# read inline since that is the hot path. The explicit stack means deep trees can't hit the
+# recursion limit. A node is expanded when popped: its _gt subtree, its _eq subtree, its own word
+# and its _ls subtree are pushed in that order, so they come back off the stack in sorted order.
+def _in_order(node, prefix, fields=None, no_word=_NO_VALUE):
+    stack = [(node, prefix, False)] if node else []
+    while stack:
+        node, prefix, emit = stack.pop()
+        if emit:
+            yield prefix, node
+            continue
+        if fields is None:
+            label, mark, less, equal, greater = node.char, node.value, node._ls, node._eq, node._gt
+        else:
+            label, mark, less, equal, greater = fields(node)
+        if greater:
+            stack.append((greater, prefix, False))
+        word = prefix + label
+        if equal:
+            stack.append((equal, word, False))
+        if mark is not no_word:
+            stack.append((node, word, True))
+        if less:
+            stack.append((less, prefix, False))
+
+
+# Bulk loading shared by everything that adds words one at a time with _add_word() (insert()
+# unless overridden) and counts them with len()
+class _UpdatableTree:
+
+    def _add_word(self, word):
+        self.insert(word)
+
+    # Adds the words of an iterable one at a time, returns the number of new words
+    def update(self, words):
+        before = len(self)
+        for word in words:
+            self._add_word(word)
+        return len(self) - before
+
+    # Streams the words of a text file in one pass (see _read_words), also gzip'd files. normalize
+    # is a callable or normalization name(s) as for EncodedTernarySearchTree. Duplicates only
+    # count once. progress(lines_read, words_added) is called every progress_every lines (blank
+    # ones included) and at the end. Returns the number of new words.
+    def insert_from_file(self, path, encoding="utf-8", normalize=None, progress=None, progress_every=100000):
+        before = len(self)
+        line_number = 0
+        for line_number, word in _read_words(path, encoding, _normalizer(normalize)):
+            if word:
+                self._add_word(word)
+            if progress is not None and line_number % progress_every == 0:
+                progress(line_number, len(self) - before)
+        if progress is not None:
+            progress(line_number, len(self) - before)
+        return len(self) - before
+
+
+# Constructors shared by the trees that add words one at a time with insert(). Extra arguments
+# (e.g. HybridTernarySearchTree's table_depth) are passed on to the constructor.
+class _InsertableTree(_UpdatableTree):
+
+    # Builds a balanced tree from words that are already sorted and unique
+    @classmethod
+    def from_sorted(cls, sorted_words, *args, **kwargs):
+        tst = cls(*args, **kwargs)
+        for word in _median_order(sorted_words):
+            tst.insert(word)
+        return tst
+
+    # Builds a balanced tree from any iterable of words (sorted and deduplicated first)
+    @classmethod
+    def build(cls, words, *args, **kwargs):
+        return cls.from_sorted(sorted({word for word in words if isinstance(word, str) and word}), *args, **kwargs)
+
+
+# Read API shared by the word sets: len() is word_count, `in` is an exact search, and iteration,
+# all_strings() and keys_with_prefix() are built on _prefix_words(prefix, limit), which lazily
+# yields the words starting with prefix in sorted order. limit is only a hint for layouts with a
+# bounded fast path (the compiled kernel, the result cache); the words are cut to it here.
+class _SortedWords:
+
+    def __len__(self):
+        return self.word_count
+
+    def is_empty(self):
+        return len(self) == 0
+
+    def __contains__(self, word):
+        return self.search(word, exact=True)
+
+    # Autocomplete: lazily yields the words starting with prefix in sorted order, at most limit of them
+    def keys_with_prefix(self, prefix, limit=None):
+        if not isinstance(prefix, str):
+            return iter(())
+        words = self._prefix_words(prefix, limit)
+        return words if limit is None else islice(words, limit)
+
+    def __iter__(self):
+        return self._prefix_words("")
+
+    # Words inside the tree
+    def all_strings(self):
+        return list(self)
+
+
+class TernarySearchTree(_InsertableTree, _SortedWords):
     # Tree initialization 
     def __init__(self):
         self.root = None  # Because there are no words yet
         self.word_count = 0  # Keeps track of how many words are inserted
+        self._cache = None  # Query -> result (LRU order) while the result cache is enabled
+        self._cache_maxsize = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._profile = None  # Operation -> visit/comparison histograms while profiling is enabled
+        self.subtree_counts = False  # True while Node.size is kept up to date
 
-    # Node initialization
+    # Node initialization. The size slot is there even while subtree counts are off: 8 bytes per
+    # node (96 instead of 88 on 64-bit CPython), so counts can be enabled on an existing tree.
     class Node:
+        __slots__ = ("char", "value", "weight", "max_weight", "size", "_ls", "_eq", "_gt")  # no per-node __dict__
+
         def __init__(self, char):
             self.char = char  # Letter that is stored in the node
-            self.end_of_word = False  # True when the letter is the end of the word
+            self.value = _NO_VALUE  # Value of the word ending here, _NO_VALUE when no word ends here
+            self.weight = 0  # Weight of the word ending here (e.g. its frequency)
+            self.max_weight = 0  # Largest weight of any word in this subtree (_ls, _eq and _gt included)
+            self.size = 0  # Number of words in this subtree (_ls, _eq and _gt included), see enable_subtree_counts
             self._ls = None  # Next node that has a character lesser
             self._eq = None  # Next node that is the following character of the word
             self._gt = None  # Nets node that has a character greater
 
-    # Length of the tree
-    def __len__(self):
-        return self.word_count  # returns number of words
+        # True when the letter is the end of the word. For callers outside this module: the tree's
+        # own loops check node.value is not _NO_VALUE directly, which skips the property call.
+        @property
+        def end_of_word(self):
+            return self.value is not _NO_VALUE
 
-    # Words inside the tree
-    def all_strings(self):
-        # A more efficient way to get all strings by traversing the tree
-        def _collect_strings_recursive(node, path, result):
-            if node:
-                _collect_strings_recursive(node._ls, path, result)
-                
-                path.append(node.char)
-                if node.end_of_word:
-                    result.append("".join(path))
-                _collect_strings_recursive(node._eq, path, result)
-                path.pop()
-
-                _collect_strings_recursive(node._gt, path, result)
-
-        all_words = []
-        _collect_strings_recursive(self.root, [], all_words)
-        return all_words
-
-    # Helper function for inserting words
-    def insert_character(self, node, word, index):
-        char = word[index]  # character to insert
+        @end_of_word.setter
+        def end_of_word(self, terminates):
+            if not terminates:
+                self.value = _NO_VALUE
+            elif self.value is _NO_VALUE:
+                self.value = None
 
-        if node is None:
-            node = self.Node(char)  # creates a new node if there is none already
+    # Opt-in LRU cache for the results of search, keys_with_prefix (with a limit) and top_k, keyed
+    # by the query and its mode. Keeps at most maxsize results and is emptied whenever a word is
+    # added or deleted, a weight changes or the tree is cleared.
+    def enable_cache(self, maxsize=1024):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self._cache = OrderedDict()
+        self._cache_maxsize = maxsize
+        self.cache_hits = self.cache_misses = 0
+
+    def disable_cache(self):
+        self._cache = None
+
+    # Hit/miss counters and occupancy of the result cache
+    def cache_info(self):
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self._cache) if self._cache is not None else 0,
+            "maxsize": self._cache_maxsize if self._cache is not None else 0,
+        }
 
-        if char < node.char:
-            node._ls = self.insert_character(node._ls, word, index)  # go left
-        elif char > node.char:
-            node._gt = self.insert_character(node._gt, word, index)  # go right
+    # Returns the cached result for key, or computes it with compute(*args) and caches it
+    def _cached(self, key, compute, *args):
+        cache = self._cache
+        result = cache.get(key, _NO_VALUE)
+        if result is _NO_VALUE:
+            self.cache_misses += 1
+            result = cache[key] = compute(*args)
+            if len(cache) > self._cache_maxsize:
+                cache.popitem(last=False)  # evict the least recently used result
         else:
-            if index + 1 == len(word):
-                if not node.end_of_word:  # Check if a new word is being added
-                    self.word_count += 1
-                node.end_of_word = True  # marks as end of the word
+            self.cache_hits += 1
+            cache.move_to_end(key)
+        return result
+
+    def _invalidate_cache(self):
+        if self._cache:
+            self._cache.clear()
+
+    # Shape of the tree: node and word count, max depth (nodes on the longest root path), mean
+    # depth of the words (nodes visited by a successful exact search), number of nodes per number
+    # of children, how many _ls/_eq/_gt links there are, and the node memory per word in bytes.
+    def stats(self):
+        node_count = max_depth = depth_total = node_bytes = 0
+        branching = Counter()
+        links = Counter()
+        stack = [(self.root, 1)] if self.root else []
+        while stack:
+            node, depth = stack.pop()
+            node_count += 1
+            node_bytes += sys.getsizeof(node)
+            max_depth = max(max_depth, depth)
+            if node.value is not _NO_VALUE:
+                depth_total += depth
+            children = 0
+            for link in ("_ls", "_eq", "_gt"):
+                child = getattr(node, link)
+                if child is not None:
+                    children += 1
+                    links[link] += 1
+                    stack.append((child, depth + 1))
+            branching[children] += 1
+
+        return {
+            "node_count": node_count,
+            "word_count": self.word_count,
+            "max_depth": max_depth,
+            "mean_depth": depth_total / self.word_count if self.word_count else 0.0,
+            "branching": {children: branching[children] for children in range(4)},
+            "ls_links": links["_ls"],
+            "eq_links": links["_eq"],
+            "gt_links": links["_gt"],
+            "bytes_per_word": node_bytes / self.word_count if self.word_count else 0.0,
+        }
+
+    # Profiling mode: every insert and search also counts the nodes it visits and the character
+    # comparisons it makes, into one histogram per operation (see profile). Off by default; when
+    # off, insert and search only pay for one attribute check.
+    def enable_profiling(self):
+        self._profile = {operation: {"operations": 0, "visits": Counter(), "comparisons": Counter()}
+                         for operation in ("insert", "search")}
+
+    def disable_profiling(self):
+        self._profile = None
+
+    # Per operation: count, mean and max visits and comparisons, and the histograms as
+    # {visits: operations} and {comparisons: operations} in ascending order
+    def profile(self):
+        report = {}
+        for operation, counters in (self._profile or {}).items():
+            total = counters["operations"]
+            entry = {"operations": total}
+            for name in ("visits", "comparisons"):
+                histogram = counters[name]
+                entry[f"mean_{name}"] = sum(n * times for n, times in histogram.items()) / total if total else 0.0
+                entry[f"max_{name}"] = max(histogram, default=0)
+                entry[f"{name}_histogram"] = dict(sorted(histogram.items()))
+            report[operation] = entry
+        return report
+
+    # Walks word down the tree like search_helper, counting node visits and character comparisons
+    # (1 when going to _ls, 2 otherwise). Returns (node where word ends or None, visits,
+    # comparisons, number of characters an insert would still have to create nodes for).
+    def _trace(self, word):
+        node, index, last = self.root, 0, len(word) - 1
+        visits = comparisons = 0
+        while node is not None:
+            visits += 1
+            if word[index] < node.char:
+                comparisons += 1
+                node = node._ls
+            elif word[index] > node.char:
+                comparisons += 2
+                node = node._gt
             else:
-                node._eq = self.insert_character(node._eq, word, index + 1)  # go middle
+                comparisons += 2
+                if index == last:
+                    return node, visits, comparisons, 0
+                index += 1
+                node = node._eq
+        return None, visits, comparisons, len(word) - index
 
-        return node
+    def _record(self, operation, visits, comparisons):
+        counters = self._profile[operation]
+        counters["operations"] += 1
+        counters["visits"][visits] += 1
+        counters["comparisons"][comparisons] += 1
 
-    # Insert word function
-    def insert(self, word):
+    # Lazily yields (word, terminal node) for the words below node in sorted order, each prefixed with prefix
+    def _iter_nodes(self, node, prefix):
+        return _in_order(node, prefix)
+
+    # Lazily yields the words starting with prefix in sorted order. While the cache is enabled,
+    # bounded completions are cached, as a tuple of at most limit words.
+    def _prefix_words(self, prefix, limit=None):
+        if self._cache is not None and limit is not None:
+            return iter(self._cached(("prefix", prefix, limit), self._completions, prefix, limit))
+
+        if prefix:
+            node = self.search_helper(self.root, prefix, 0)  # find the prefix node once
+            if node is None:
+                return iter(())
+            words = (word for word, _ in self._iter_nodes(node._eq, prefix))
+            if node.value is not _NO_VALUE:
+                return chain((prefix,), words)
+            return words
+        return (word for word, _ in self._iter_nodes(self.root, ""))
+
+    def _completions(self, prefix, limit):
+        return tuple(islice(self._prefix_words(prefix), limit))
+
+    # Lazily yields (word, terminal node) for the words w with lo <= w < hi in sorted order, or in
+    # descending order with reverse; None means no bound. Like _iter_nodes, but a subtree is only
+    # entered when it can hold words in the range. Stack entries are (node, prefix, state): state 0
+    # still has to order the node's _ls/_gt subtrees, 1 continues into _eq and 2 emits its word.
+    def _iter_range(self, lo, hi, reverse=False):
+        stack = [(self.root, "", 0)] if self.root else []
+        while stack:
+            node, prefix, state = stack.pop()
+            word = prefix + node.char
+            if state == 0:
+                # _ls holds words < word, _gt words starting with a character > node.char
+                left = node._ls if node._ls and (lo is None or word > lo) else None
+                right = node._gt if node._gt and (hi is None or prefix + chr(ord(node.char) + 1) < hi) else None
+                # The node's word and its _eq subtree all start with word
+                here = (lo is None or word >= lo[:len(word)]) and (hi is None or word < hi)
+                first, last = (right, left) if reverse else (left, right)
+                if last:
+                    stack.append((last, prefix, 0))
+                if here:
+                    stack.append((node, prefix, 1))
+                if first:
+                    stack.append((first, prefix, 0))
+            elif state == 1 and reverse:
+                stack.append((node, prefix, 2))  # the word comes after the longer words below it
+                if node._eq:
+                    stack.append((node._eq, word, 0))
+            else:
+                if node.value is not _NO_VALUE and (lo is None or word >= lo) and (hi is None or word < hi):
+                    yield word, node
+                if state == 1 and node._eq:
+                    stack.append((node._eq, word, 0))
+
+    # Ordered-set queries
+
+    # Lazily yields the words w with lo <= w < hi in sorted order (None for no bound)
+    def range(self, lo=None, hi=None):
+        return (word for word, _ in self._iter_range(lo, hi))
+
+    # Largest word <= word, or None
+    def floor(self, word):
+        if not isinstance(word, str):
+            raise TypeError(f"word must be a string, not {type(word).__name__}")
+        return next((found for found, _ in self._iter_range(None, word + "\0", reverse=True)), None)
+
+    # Smallest word >= word, or None
+    def ceiling(self, word):
+        if not isinstance(word, str):
+            raise TypeError(f"word must be a string, not {type(word).__name__}")
+        return next((found for found, _ in self._iter_range(word, None)), None)
+
+    # Smallest word, or None for an empty tree
+    def min(self):
+        return next(iter(self), None)
+
+    # Largest word, or None for an empty tree
+    def max(self):
+        return next((word for word, _ in self._iter_range(None, None, reverse=True)), None)
+
+    # Number of words < word. O(depth) with subtree counts, otherwise a scan of those words.
+    def rank(self, word):
+        if not isinstance(word, str):
+            raise TypeError(f"word must be a string, not {type(word).__name__}")
+        if not self.subtree_counts:
+            return sum(1 for _ in self._iter_range(None, word))
+        if not word:
+            return 0
+
+        rank = 0
+        node, index, last = self.root, 0, len(word) - 1
+        while node is not None:
+            if word[index] < node.char:
+                node = node._ls
+            elif word[index] > node.char:
+                rank += node.size - (node._gt.size if node._gt else 0)  # all of node except _gt
+                node = node._gt
+            else:
+                rank += node._ls.size if node._ls else 0
+                if index == last:
+                    break  # the words below node._eq are longer and thus greater
+                if node.value is not _NO_VALUE:
+                    rank += 1  # a proper prefix of word
+                index += 1
+                node = node._eq
+        return rank
+
+    # Word at position i in sorted order (negative i counts from the end). O(depth) with subtree
+    # counts, otherwise a scan of the first i words.
+    def select(self, i):
+        if i < 0:
+            i += self.word_count
+        if not 0 <= i < self.word_count:
+            raise IndexError("select index out of range")
+        if not self.subtree_counts:
+            return next(islice(iter(self), i, None))
+
+        node, prefix = self.root, ""
+        while True:
+            left = node._ls.size if node._ls else 0
+            if i < left:
+                node = node._ls
+                continue
+            i -= left
+            if node.value is not _NO_VALUE:
+                if i == 0:
+                    return prefix + node.char
+                i -= 1
+            below = node._eq.size if node._eq else 0
+            if i < below:
+                prefix += node.char
+                node = node._eq
+            else:
+                i -= below
+                node = node._gt
+
+    # Keeps a word count in every node from now on (maintained by insert and delete), which makes
+    # rank and select O(depth). Costs one extra pass over the path of every new word.
+    def enable_subtree_counts(self):
+        stack = [(self.root, False)] if self.root else []
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                self._update_size(node)  # children first
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in (node._ls, node._eq, node._gt) if child)
+        self.subtree_counts = True
+
+    def disable_subtree_counts(self):
+        self.subtree_counts = False
+
+    # Recomputes size of a node from its own word and its children
+    @staticmethod
+    def _update_size(node):
+        node.size = (
+            (node.value is not _NO_VALUE)
+            + (node._ls.size if node._ls else 0)
+            + (node._eq.size if node._eq else 0)
+            + (node._gt.size if node._gt else 0)
+        )
+
+    # Adds delta to the size of every node on the path of word, starting at node and word[index]
+    @staticmethod
+    def _add_to_sizes(node, word, index, delta):
+        last = len(word) - 1
+        while node is not None:
+            node.size += delta
+            if word[index] < node.char:
+                node = node._ls
+            elif word[index] > node.char:
+                node = node._gt
+            elif index == last:
+                return
+            else:
+                index += 1
+                node = node._eq
+
+    # Pattern query: lazily yields the words matching pattern in sorted order. "?" matches any
+    # single character and a trailing "*" any (possibly empty) suffix, e.g. "c?mb*". Literal
+    # characters follow only the one matching branch; only "?" explores _ls, _eq and _gt.
+    def match(self, pattern):
+        if not isinstance(pattern, str):
+            raise TypeError(f"pattern must be a string, not {type(pattern).__name__}")
+        if "*" in pattern[:-1]:
+            raise ValueError("'*' is only supported at the end of a pattern")
+        return self._match(pattern)
+
+    def _match(self, pattern):
+        if pattern == "*":
+            yield from self.__iter__()
+            return
+
+        last = len(pattern) - 1
+        stack = [(self.root, "", 0, False)] if self.root and pattern else []
+        while stack:
+            node, prefix, index, expanded = stack.pop()
+            if expanded:
+                word = prefix + node.char
+                if index == last:
+                    if node.value is not _NO_VALUE:
+                        yield word
+                elif pattern[index + 1] == "*":
+                    if node.value is not _NO_VALUE:
+                        yield word
+                    for completion, _ in self._iter_nodes(node._eq, word):
+                        yield completion
+                elif node._eq:
+                    stack.append((node._eq, word, index + 1, False))
+                continue
+
+            char = pattern[index]
+            if char == "?":
+                if node._gt:
+                    stack.append((node._gt, prefix, index, False))
+                stack.append((node, prefix, index, True))
+                if node._ls:
+                    stack.append((node._ls, prefix, index, False))
+            elif char < node.char:
+                if node._ls:
+                    stack.append((node._ls, prefix, index, False))
+            elif char > node.char:
+                if node._gt:
+                    stack.append((node._gt, prefix, index, False))
+            else:
+                stack.append((node, prefix, index, True))
+
+    # Ranked autocomplete: the k heaviest words starting with prefix as (word, weight) pairs.
+    # Best-first search on max_weight, so subtrees that can't beat the k-th result are never expanded.
+    def top_k(self, prefix, k):
+        if not isinstance(prefix, str) or k <= 0:
+            return []
+        if self._cache is not None:
+            return list(self._cached(("top_k", prefix, k), self._top_k, prefix, k))
+        return self._top_k(prefix, k)
+
+    def _top_k(self, prefix, k):
+        # Heap entries: (-weight, 1, word) for words, (-max_weight, 0, tiebreak, node, prefix) for subtrees.
+        # On equal weights subtrees are expanded first so that tied words come out alphabetically.
+        heap = []
+        tiebreak = count()
+        if prefix:
+            node = self.search_helper(self.root, prefix, 0)
+            if node is None:
+                return []
+            if node.value is not _NO_VALUE:
+                heappush(heap, (-node.weight, 1, prefix))
+            if node._eq:
+                heappush(heap, (-node._eq.max_weight, 0, next(tiebreak), node._eq, prefix))
+        elif self.root:
+            heappush(heap, (-self.root.max_weight, 0, next(tiebreak), self.root, ""))
+
+        results = []
+        while heap and len(results) < k:
+            entry = heappop(heap)
+            if entry[1]:
+                results.append((entry[2], -entry[0]))
+                continue
+
+            node, node_prefix = entry[3], entry[4]
+            word = node_prefix + node.char
+            if node.value is not _NO_VALUE:
+                heappush(heap, (-node.weight, 1, word))
+            for child, child_prefix in ((node._ls, node_prefix), (node._eq, word), (node._gt, node_prefix)):
+                if child:
+                    heappush(heap, (-child.max_weight, 0, next(tiebreak), child, child_prefix))
+
+        return results
+
+    # Spell correction: the words within Levenshtein distance max_distance of word, as
+    # (word, distance) pairs sorted by distance and then alphabetically. The tree is walked with
+    # one DP row per _eq step; subtrees whose row minimum exceeds max_distance are skipped.
+    def fuzzy_search(self, word, max_distance):
+        if not isinstance(word, str) or max_distance < 0:
+            return []
+
+        results = []
+        first_row = list(range(len(word) + 1))  # distances from the empty prefix
+        stack = [(self.root, "", first_row)] if self.root else []
+        while stack:
+            node, prefix, row = stack.pop()
+            if node._ls:
+                stack.append((node._ls, prefix, row))
+            if node._gt:
+                stack.append((node._gt, prefix, row))
+
+            # Row for prefix + node.char
+            char = node.char
+            new_row = [row[0] + 1]
+            for j in range(1, len(row)):
+                new_row.append(min(row[j] + 1, new_row[j - 1] + 1, row[j - 1] + (word[j - 1] != char)))
+
+            if node.value is not _NO_VALUE and new_row[-1] <= max_distance:
+                results.append((prefix + char, new_row[-1]))
+            if node._eq and min(new_row) <= max_distance:
+                stack.append((node._eq, prefix + char, new_row))
+
+        results.sort(key=lambda result: (result[1], result[0]))
+        return results
+
+    # Weight of a word, None if it isn't in the tree
+    def get_weight(self, word):
+        if not isinstance(word, str) or not word:
+            return None
+
+        node = self.search_helper(self.root, word, 0)
+        return node.weight if node and node.value is not _NO_VALUE else None
+
+    # Sets the weight of a word that was just inserted and recomputes max_weight bottom-up along its path
+    def _set_weight(self, word, weight):
+        path = []
+        node, index, last = self.root, 0, len(word) - 1
+        while True:
+            path.append(node)
+            if word[index] < node.char:
+                node = node._ls
+            elif word[index] > node.char:
+                node = node._gt
+            elif index == last:
+                break
+            else:
+                index += 1
+                node = node._eq
+
+        node.weight = weight
+        self._invalidate_cache()  # cached top_k results may be stale
+        for node in reversed(path):
+            self._update_max_weight(node)
+
+    # Recomputes max_weight of a node from its own weight and its children
+    @staticmethod
+    def _update_max_weight(node):
+        node.max_weight = max(
+            node.weight if node.value is not _NO_VALUE else 0,
+            node._ls.max_weight if node._ls else 0,
+            node._eq.max_weight if node._eq else 0,
+            node._gt.max_weight if node._gt else 0,
+        )
+
+    # Helper function for inserting words, stores value at the last node unless it is _NO_VALUE
+    def insert_character(self, node, word, index, value=_NO_VALUE):
+        # Walks down iteratively instead of recursing once per node, returns the (possibly new) subtree root
+        if node is None:
+            node = self.Node(word[index])  # creates a new node if there is none already
+        root, start = node, index
+        last = len(word) - 1
+        char = word[index]  # character to insert
+
+        while True:
+            if char < node.char:
+                if node._ls is None:
+                    node._ls = self.Node(char)
+                node = node._ls  # go left
+            elif char > node.char:
+                if node._gt is None:
+                    node._gt = self.Node(char)
+                node = node._gt  # go right
+            elif index == last:
+                if node.value is _NO_VALUE:  # Check if a new word is being added
+                    self.word_count += 1
+                    self._invalidate_cache()
+                    if self.subtree_counts:
+                        self._add_to_sizes(root, word, start, 1)
+                    node.value = None  # marks as end of the word
+                if value is not _NO_VALUE:
+                    node.value = value
+                return root
+            else:
+                index += 1
+                char = word[index]
+                if node._eq is None:
+                    node._eq = self.Node(char)
+                node = node._eq  # go middle
+
+    # Insert word function, optionally with a non-negative weight used by top_k
+    # (re-inserting a word without a weight keeps the weight it already has)
+    def insert(self, word, weight=None):
         if not isinstance(word, str) or not word:
             return  # doesn't insert empty strings or invalid types into the tree
 
+        if weight is not None and weight < 0:
+            raise ValueError("weight must be non-negative")
+
+        if self._profile is not None:
+            # Each node the insert creates is visited once, with an equal comparison
+            _, visits, comparisons, created = self._trace(word)
+            self._record("insert", visits + created, comparisons + 2 * created)
+
         self.root = self.insert_character(self.root, word, 0)
 
+        if weight is not None:
+            self._set_weight(word, weight)
+
+    # Rebuilds the tree in median order, e.g. after inserting sorted input one word at a time
+    def rebalance(self):
+        entries = [(word, node.value, node.weight) for word, node in self._iter_nodes(self.root, "")]
+        self.clear()
+        for word, value, weight in _median_order(entries):
+            self.root = self.insert_character(self.root, word, 0, value)
+            if weight:
+                self._set_weight(word, weight)
+
     # Helper function for search tool
     def search_helper(self, node, word, index):
-        if node is None:
-            return None  # if the node doesn't exist, then the word doesn't either
-
+        # Iterative descent: no Python frame per visited node and no depth limit
+        last = len(word) - 1
         char = word[index]  # current letter to compare
-        
-        if char < node.char:
-            return self.search_helper(node._ls, word, index)  # going to left node
-        
-        elif char > node.char:
-            return self.search_helper(node._gt, word, index)  # going to right node
-        
-        else:
-            if index + 1 == len(word):
+
+        while node is not None:
+            if char < node.char:
+                node = node._ls  # going to left node
+            elif char > node.char:
+                node = node._gt  # going to right node
+            elif index == last:
                 return node  # return node if last character
-            return self.search_helper(node._eq, word, index + 1)  # going to middle node
+            else:
+                index += 1
+                char = word[index]
+                node = node._eq  # going to middle node
+
+        return None  # if the node doesn't exist, then the word doesn't either
 
     # Search tool
     def search(self, word, exact=False):
         if not isinstance(word, str) or not word:
             return False
 
-        node = self.search_helper(self.root, word, 0)
+        if self._cache is not None:
+            return self._cached(("search", word, exact), self._search, word, exact)
+        return self._search(word, exact)
+
+    def _search(self, word, exact):
+        if self._profile is not None:
+            node, visits, comparisons, _ = self._trace(word)
+            self._record("search", visits, comparisons)
+        else:
+            node = self.search_helper(self.root, word, 0)
         
         if not node:
             return False
 
-        return node.end_of_word if exact else True
+        return node.value is not _NO_VALUE if exact else True
 
-    def is_empty(self):
-        return self.root is None
+    # Batch lookup: one result per word, in input order (a NumPy bool array if as_array is set).
+    # The probes are sorted once and then pushed down the tree together: at each node a group of
+    # probes sharing a prefix is split into its _ls/_eq/_gt parts with bisect, so every node on
+    # the union of the descent paths is visited once per batch instead of once per probe.
+    def search_many(self, words, exact=True, as_array=False):
+        words = list(words)
+        results = [False] * len(words)
+        order = sorted((position for position, word in enumerate(words) if isinstance(word, str) and word),
+                       key=words.__getitem__)
+        keys = [words[position] for position in order]
+
+        stack = [(self.root, 0, len(keys), "")] if self.root and keys else []
+        while stack:
+            node, lo, hi, prefix = stack.pop()
+            if hi - lo <= _BATCH_SPLIT_MIN:
+                # Too few probes left to be worth splitting, finish them one by one from here
+                depth = len(prefix)
+                for index in range(lo, hi):
+                    found = self.search_helper(node, keys[index], depth) if len(keys[index]) > depth else None
+                    if found is not None and (not exact or found.value is not _NO_VALUE):
+                        results[order[index]] = True
+                continue
+
+            char = node.char
+            key = prefix + char
+            lower = bisect_left(keys, key, lo, hi)  # keys[lo:lower] continue with a lesser character
+            upper = bisect_left(keys, prefix + chr(ord(char) + 1), lower, hi) if char < _MAX_CHAR else hi
+            if lo < lower and node._ls:
+                stack.append((node._ls, lo, lower, prefix))
+            if upper < hi and node._gt:
+                stack.append((node._gt, upper, hi, prefix))
+            if lower < upper:
+                found = bisect_right(keys, key, lower, upper)  # keys[lower:found] end at this node
+                if lower < found and (not exact or node.value is not _NO_VALUE):
+                    for index in range(lower, found):
+                        results[order[index]] = True
+                if found < upper and node._eq:
+                    stack.append((node._eq, found, upper, key))
+
+        if as_array:
+            import numpy as np  # optional dependency, only needed for array output
+            return np.array(results, dtype=bool)
+        return results
+
+    # Batch insert, returns the number of new words. The words are validated and deduplicated once,
+    # then inserted in median order so a sorted batch doesn't degenerate the tree.
+    def insert_many(self, words):
+        batch = sorted({word for word in words if isinstance(word, str) and word})
+        before = self.word_count
+        for word in _median_order(batch):
+            self.root = self.insert_character(self.root, word, 0)
+        return self.word_count - before
+
+    # Adds the words of an iterable, or the items of a mapping, one at a time. Returns the number of new words.
+    def update(self, words):
+        if not hasattr(words, "items"):
+            return super().update(words)
+        before = self.word_count
+        for word, value in words.items():
+            self[word] = value
+        return self.word_count - before
+
+    # Removes a word, returns False if it wasn't in the tree.
+    # Nodes that no longer lead to any word are pruned on the way back up.
+    def delete(self, word):
+        if not isinstance(word, str) or not word:
+            return False
+
+        # Path from the root as (node, parent, name of the parent's link to node)
+        path = []
+        node, parent, link = self.root, None, None
+        index, last = 0, len(word) - 1
+        while node is not None:
+            path.append((node, parent, link))
+            if word[index] < node.char:
+                node, parent, link = node._ls, node, "_ls"
+            elif word[index] > node.char:
+                node, parent, link = node._gt, node, "_gt"
+            elif index == last:
+                break
+            else:
+                index += 1
+                node, parent, link = node._eq, node, "_eq"
+
+        if node is None or node.value is _NO_VALUE:
+            return False
+
+        node.value = _NO_VALUE
+        node.weight = 0
+        self.word_count -= 1
+        self._invalidate_cache()
+
+        for node, parent, link in reversed(path):
+            if node.value is _NO_VALUE and node._eq is None:
+                replacement = self._unlink(node)  # no word ends in or below this node anymore
+                if parent is None:
+                    self.root = replacement
+                else:
+                    setattr(parent, link, replacement)
+            else:
+                self._update_max_weight(node)
+                if self.subtree_counts:
+                    self._update_size(node)
+
+        return True
+
+    # Removes a node from the binary search tree formed by the _ls/_gt links of its level,
+    # returns the node that takes its place
+    def _unlink(self, node):
+        if node._ls is None:
+            return node._gt
+        if node._gt is None:
+            return node._ls
+
+        # Two children: the smallest node of the _gt subtree replaces it
+        path = []
+        successor = node._gt
+        while successor._ls is not None:
+            path.append(successor)
+            successor = successor._ls
+        if path:
+            path[-1]._ls = successor._gt
+            successor._gt = node._gt
+            for parent in reversed(path):
+                self._update_max_weight(parent)
+                if self.subtree_counts:
+                    self._update_size(parent)
+        successor._ls = node._ls
+        self._update_max_weight(successor)
+        if self.subtree_counts:
+            self._update_size(successor)
+        return successor
+
+    # Set algebra between trees. Both trees are walked together one level (the _ls/_gt binary
+    # search tree of one character position) at a time, so no word list is ever built and the
+    # cost is proportional to the nodes visited. The result levels are linked balanced.
+
+    # New tree with the words of both trees; for words in both, other's value and weight win
+    def union(self, other):
+        return self._combine(other, "union")
+
+    # New tree with the words that are in both trees, with the values and weights of this one
+    def intersection(self, other):
+        return self._combine(other, "intersection")
+
+    # New tree with the words of this tree that aren't in other
+    def difference(self, other):
+        return self._combine(other, "difference")
+
+    # In-place version of union: adds the words of other to this tree (other's value and weight
+    # win for words in both). Only other's levels are walked; nodes of other that have no match
+    # here are copied in as leaves of the matching level. Returns the number of new words.
+    def merge_from(self, other):
+        if not isinstance(other, TernarySearchTree):
+            raise TypeError(f"can only merge a TernarySearchTree, not {type(other).__name__}")
+        before = self.word_count
+        if other.root is None:
+            return 0
+        weighted = other.root.max_weight or (self.root is not None and self.root.max_weight)
+
+        stack = [(self, "root", other.root)]  # (parent, link to the level root here, level root in other)
+        while stack:
+            parent, link, theirs = stack.pop()
+            if getattr(parent, link) is None:
+                setattr(parent, link, self._copy_level(theirs))
+                continue
+            for node in _median_order(self._level(theirs)):  # median first keeps the level balanced
+                mine = self._find_in_level(parent, link, node.char)
+                if node.value is not _NO_VALUE:
+                    if mine.value is _NO_VALUE:
+                        self.word_count += 1
+                    mine.value, mine.weight = node.value, node.weight
+                if node._eq:
+                    stack.append((mine, "_eq", node._eq))
+
+        self._invalidate_cache()
+        if weighted or self.subtree_counts:
+            self._refresh_aggregates()
+        return self.word_count - before
+
+    # Nodes of the level below node (linked by _ls/_gt) in sorted order
+    @staticmethod
+    def _level(node):
+        if node._ls is None and node._gt is None:
+            return [node]  # most levels below the top are a single node
+        nodes, stack = [], []
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node._ls
+            node = stack.pop()
+            nodes.append(node)
+            node = node._gt
+        return nodes
+
+    # Node for char in the level at getattr(parent, link), added as a new leaf when it's missing
+    def _find_in_level(self, parent, link, char):
+        node = getattr(parent, link)
+        while True:
+            if char < node.char:
+                link = "_ls"
+            elif char > node.char:
+                link = "_gt"
+            else:
+                return node
+            if getattr(node, link) is None:
+                setattr(node, link, self.Node(char))
+            node = getattr(node, link)
+
+    # Deep copy of the nodes below node (its _ls, _eq and _gt subtrees included)
+    def _copy_level(self, node):
+        root = self._copy_node(node)
+        stack = [(node, root)]
+        while stack:
+            original, copy = stack.pop()
+            for link in ("_ls", "_eq", "_gt"):
+                child = getattr(original, link)
+                if child is not None:
+                    child_copy = self._copy_node(child)
+                    setattr(copy, link, child_copy)
+                    stack.append((child, child_copy))
+                    self.word_count += child.value is not _NO_VALUE
+        self.word_count += node.value is not _NO_VALUE
+        return root
+
+    def _copy_node(self, node):
+        copy = self.Node(node.char)
+        copy.value, copy.weight, copy.max_weight = node.value, node.weight, node.max_weight
+        return copy
+
+    # Recomputes max_weight (and size, with subtree counts) of every node, children first
+    def _refresh_aggregates(self):
+        stack = [(self.root, False)] if self.root else []
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                self._update_max_weight(node)
+                if self.subtree_counts:
+                    self._update_size(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in (node._ls, node._eq, node._gt) if child)
+
+    # Builds union, intersection or difference level by level. Each "expand" step merges the two
+    # levels by character into new nodes and schedules their _eq levels; the "link" step of a
+    # level runs after all levels below it, drops nodes that ended up without words and links the
+    # remaining ones into a balanced level.
+    def _combine(self, other, operation):
+        if not isinstance(other, TernarySearchTree):
+            raise TypeError(f"can only combine with a TernarySearchTree, not {type(other).__name__}")
+
+        result = type(self)()
+        weighted = bool((self.root and self.root.max_weight) or (other.root and other.root.max_weight))
+        union, intersection = operation == "union", operation == "intersection"
+        holder = result.Node("")  # result.root is built as the _eq level of this placeholder
+        # Entries are (level here, level in other, parent of the result level, None) for an expand
+        # step and (None, None, parent, result nodes) for a link step
+        stack = [(self.root, other.root, holder, None)]
+        while stack:
+            mine, theirs, parent, nodes = stack.pop()
+            if nodes is not None:
+                parent._eq = self._link_balanced(
+                    [node for node in nodes if node.value is not _NO_VALUE or node._eq is not None], weighted)
+                continue
+
+            # Pairs of nodes with the same character in both levels (None where one side has none)
+            if (mine and theirs and mine.char == theirs.char and mine._ls is None and mine._gt is None
+                    and theirs._ls is None and theirs._gt is None):
+                pairs = [(mine, theirs)]  # the common case below the top levels
+            elif union:
+                others = {node.char: node for node in self._level(theirs)} if theirs else {}
+                ours = {node.char: node for node in self._level(mine)} if mine else {}
+                pairs = [(ours.get(char), others.get(char)) for char in sorted(ours.keys() | others.keys())]
+            elif not mine:
+                pairs = []
+            else:
+                others = {node.char: node for node in self._level(theirs)} if theirs else {}
+                pairs = [(a, others.get(a.char)) for a in self._level(mine)]
+                if intersection:
+                    pairs = [(a, b) for a, b in pairs if b is not None]
+
+            nodes, below = [], []
+            for a, b in pairs:
+                in_a = a is not None and a.value is not _NO_VALUE
+                in_b = b is not None and b.value is not _NO_VALUE
+                if union:
+                    source = b if in_b else a if in_a else None
+                elif intersection:
+                    source = a if in_a and in_b else None
+                else:
+                    source = a if in_a and not in_b else None
+
+                node = result.Node((a or b).char)
+                if source is not None:
+                    node.value, node.weight = source.value, source.weight
+                    result.word_count += 1
+                nodes.append(node)
+
+                mine_below, theirs_below = a and a._eq, b and b._eq
+                if mine_below and theirs_below:
+                    below.append((mine_below, theirs_below, node, None))
+                elif intersection:
+                    continue
+                elif mine_below:
+                    node._eq = result._copy_level(mine_below)  # only in this tree: copied as it is
+                elif theirs_below and union:
+                    node._eq = result._copy_level(theirs_below)
+
+            stack.append((None, None, parent, nodes))  # linked after all levels below
+            stack.extend(below)
+
+        result.root = holder._eq
+        if self.subtree_counts:
+            result.enable_subtree_counts()
+        return result
+
+    # Links nodes (sorted by char) into a balanced level, returns its root. Nodes are linked
+    # parents first, so with weighted max_weight is then updated in reverse order (children first).
+    def _link_balanced(self, nodes, weighted):
+        if len(nodes) == 1:
+            if weighted:
+                self._update_max_weight(nodes[0])
+            return nodes[0]
+        root, order = None, []
+        stack = [(0, len(nodes), None, None)]
+        while stack:
+            lo, hi, parent, link = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            if parent is None:
+                root = node
+            else:
+                setattr(parent, link, node)
+            order.append(node)
+            stack.append((lo, mid, node, "_ls"))
+            stack.append((mid + 1, hi, node, "_gt"))
+        if weighted:
+            for node in reversed(order):
+                self._update_max_weight(node)
+        return root
+
+    # Mapping interface: the tree as a symbol table from words to values
+
+    def __delitem__(self, word):
+        if not self.delete(word):
+            raise KeyError(word)
+
+    def __setitem__(self, word, value):
+        if not isinstance(word, str):
+            raise TypeError(f"keys must be strings, not {type(word).__name__}")
+        if not word:
+            raise ValueError("keys must be non-empty strings")
+
+        self.root = self.insert_character(self.root, word, 0, value)
+
+    def __getitem__(self, word):
+        value = self.get(word, _NO_VALUE)
+        if value is _NO_VALUE:
+            raise KeyError(word)
+        return value
+
+    # Value of word, default when it isn't in the tree
+    def get(self, word, default=None):
+        if not isinstance(word, str) or not word:
+            return default
+
+        node = self.search_helper(self.root, word, 0)
+        if node is None or node.value is _NO_VALUE:
+            return default
+        return node.value
+
+    def keys(self):
+        return iter(self)
+
+    # (word, value) pairs in sorted order (words added with insert have value None)
+    def items(self):
+        return ((word, node.value) for word, node in self._iter_nodes(self.root, ""))
+
+    def values(self):
+        return (node.value for _, node in self._iter_nodes(self.root, ""))
 
     def clear(self):
         self.root = None
         self.word_count = 0
+        self._invalidate_cache()
+
+    # Copy of the tree in the array-backed layout, nodes numbered in pre-order. The flat layout
+    # (and so to_bytes, save and freeze) only keeps the words: a ValueError is raised if any word
+    # has a value other than None or a non-zero weight, unless words_only=True explicitly accepts
+    # dropping them.
+    def to_compact(self, words_only=False):
+        if not words_only and self.root is not None and self.root.max_weight:
+            raise ValueError("the flat layout doesn't store weights, pass words_only=True to drop them")
+        compact = CompactTernarySearchTree()
+        chars, flags, ls, eq, gt = compact._chars, compact._flags, compact._ls, compact._eq, compact._gt
+        # Each entry is (node, parent index, parent's child array that must point to the node)
+        stack = [(self.root, 0, None)] if self.root else []
+        while stack:
+            node, parent, links = stack.pop()
+            index = len(chars)
+            if links is not None:
+                links[parent] = index
+            if not words_only and node.value is not None and node.value is not _NO_VALUE:
+                raise ValueError("the flat layout doesn't store values, pass words_only=True to drop them")
+            chars.append(ord(node.char))
+            flags.append(compact.END_OF_WORD if node.value is not _NO_VALUE else 0)
+            ls.append(0)
+            eq.append(0)
+            gt.append(0)
+            if node._gt:
+                stack.append((node._gt, index, gt))
+            if node._eq:
+                stack.append((node._eq, index, eq))
+            if node._ls:
+                stack.append((node._ls, index, ls))
+
+        compact.root = 1 if self.root else 0
+        compact.word_count = self.word_count
+        return compact
+
+    # The words of the tree in the binary file format (words_only as for to_compact)
+    def to_bytes(self, words_only=False):
+        return self.to_compact(words_only).to_bytes()
+
+    # Writes the words of the tree in the binary file format, see load(). Raises ValueError
+    # instead of silently dropping values and weights unless words_only=True.
+    def save(self, path, words_only=False):
+        self.to_compact(words_only).save(path)
+
+    # Immutable snapshot of the words in one contiguous buffer, safe to share between threads
+    # (and, after save(), between processes). Later changes to this tree don't affect it.
+    # words_only as for to_compact.
+    def freeze(self, words_only=False):
+        return FrozenTernarySearchTree(self.to_bytes(words_only))
+
+    # Reads a file written by save(). With mmap the lookups run directly on the memory-mapped
+    # file and a read-only FrozenTernarySearchTree is returned; without it the nodes are rebuilt.
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(path, "rb") as f:
+            if not mmap:
+                return cls.from_bytes(f.read())
+            return FrozenTernarySearchTree(memory_map(f.fileno(), 0, access=ACCESS_READ))
+
+    # Tree from the binary file format
+    @classmethod
+    def from_bytes(cls, data):
+        chars, flags, ls, eq, gt, word_count, root = _unpack_flat(data)
+        nodes = [None] + [cls.Node(chr(code)) for code in chars[1:]]
+        for index in range(1, len(nodes)):
+            node = nodes[index]
+            if flags[index] & _FlatTernarySearchTree.END_OF_WORD:
+                node.value = None
+            node._ls, node._eq, node._gt = nodes[ls[index]], nodes[eq[index]], nodes[gt[index]]
+
+        tst = cls()
+        tst.root = nodes[root]
+        tst.word_count = word_count
+        return tst
 
     # Tree visualization
     def __str__(self):
-        def _str_helper(node, prefix="    ", child=""):
+        if self.root is None:
+            return ""
+
+        # Pre-order walk with an explicit stack; children are pushed in reverse so _ls is printed first
+        lines = ["terminates: False"]
+        stack = [(self.root, "    ", "")]
+        while stack:
+            node, prefix, child = stack.pop()
             child = f"{child}:" if child else ""
-            lines = [f"{child} {prefix} char: {node.char}, terminates: {node.end_of_word}"]
+            lines.append(f"{child} {prefix} char: {node.char}, terminates: {node.value is not _NO_VALUE}")
 
-            if node._ls:
-                lines.append(_str_helper(node._ls, prefix + "  ", "_ls"))
-            if node._eq:
-                lines.append(_str_helper(node._eq, prefix + "  ", "_eq"))
             if node._gt:
-                lines.append(_str_helper(node._gt, prefix + "  ", "_gt"))
+                stack.append((node._gt, prefix + "  ", "_gt"))
+            if node._eq:
+                stack.append((node._eq, prefix + "  ", "_eq"))
+            if node._ls:
+                stack.append((node._ls, prefix + "  ", "_ls"))
 
-            return "\n".join(lines)
+        return "\n".join(lines)
 
-        if self.root is None:
+
+# Read-only part shared by the trees whose nodes live in parallel typed arrays.
+# A node is an index into the arrays; index 0 is a sentinel that means "no node".
+class _FlatTernarySearchTree(_SortedWords):
+    END_OF_WORD = 1  # bit in the flags array
+
+    # Compiled kernel for search_helper, search_many and bounded keys_with_prefix when it is
+    # built; set to None (on the class or an instance) to force the pure-Python lookups
+    _kernel = _tst_kernel
+
+    # Number of allocated nodes (without the sentinel)
+    def node_count(self):
+        return len(self._chars) - 1
+
+    # Lazily yields the words below node in sorted order, each prefixed with prefix
+    def _iter_words(self, node, prefix):
+        chars, flags, ls, eq, gt = self._chars, self._flags, self._ls, self._eq, self._gt
+        end_of_word = self.END_OF_WORD
+
+        def fields(node):
+            return chr(chars[node]), not flags[node] & end_of_word, ls[node], eq[node], gt[node]
+        return (word for word, _ in _in_order(node, prefix, fields, True))
+
+    # Lazily yields the words w with lo <= w < hi in sorted order (None for no bound), only
+    # entering the subtrees that can hold words in the range (see TernarySearchTree._iter_range)
+    def range(self, lo=None, hi=None):
+        chars, flags, ls, eq, gt = self._chars, self._flags, self._ls, self._eq, self._gt
+        stack = [(self.root, "", False)] if self.root else []
+        while stack:
+            node, prefix, expanded = stack.pop()
+            word = prefix + chr(chars[node])
+            if expanded:
+                if flags[node] & self.END_OF_WORD and (lo is None or word >= lo) and (hi is None or word < hi):
+                    yield word
+                if eq[node]:
+                    stack.append((eq[node], word, False))
+            else:
+                if gt[node] and (hi is None or prefix + chr(chars[node] + 1) < hi):
+                    stack.append((gt[node], prefix, False))
+                if (lo is None or word >= lo[:len(word)]) and (hi is None or word < hi):
+                    stack.append((node, prefix, True))
+                if ls[node] and (lo is None or word > lo):
+                    stack.append((ls[node], prefix, False))
+
+    # Lazily yields the words starting with prefix in sorted order; bounded completions run in
+    # the compiled kernel when it is built
+    def _prefix_words(self, prefix, limit=None):
+        bounded = self._kernel is not None and limit is not None and limit >= 0
+        if prefix:
+            node = self.search_helper(self.root, prefix, 0)
+            if not node:
+                return iter(())
+            if bounded:
+                words = [prefix] if self._flags[node] & self.END_OF_WORD else []
+                if len(words) < limit:
+                    words += self._kernel.complete(self._chars, self._flags, self._ls, self._eq, self._gt,
+                                                   self._eq[node], prefix, limit - len(words))
+                return iter(words[:limit])
+            words = self._iter_words(self._eq[node], prefix)
+            if self._flags[node] & self.END_OF_WORD:
+                return chain((prefix,), words)
+            return words
+        if bounded:
+            return iter(self._kernel.complete(self._chars, self._flags, self._ls, self._eq, self._gt,
+                                              self.root, "", limit))
+        return self._iter_words(self.root, "")
+
+    # Helper function for search tool, returns a node index or 0
+    def search_helper(self, node, word, index):
+        if self._kernel is not None:
+            return self._kernel.find(self._chars, self._flags, self._ls, self._eq, self._gt, node, word, index)
+
+        chars, ls, eq, gt = self._chars, self._ls, self._eq, self._gt
+        last = len(word) - 1
+        code = ord(word[index])
+
+        while node:
+            node_code = chars[node]
+            if code < node_code:
+                node = ls[node]
+            elif code > node_code:
+                node = gt[node]
+            elif index == last:
+                return node
+            else:
+                index += 1
+                code = ord(word[index])
+                node = eq[node]
+
+        return 0
+
+    # Search tool
+    def search(self, word, exact=False):
+        if not isinstance(word, str) or not word:
+            return False
+
+        node = self.search_helper(self.root, word, 0)
+
+        if not node:
+            return False
+
+        return bool(self._flags[node] & self.END_OF_WORD) if exact else True
+
+    # Batch lookup: one result per word, in input order (a NumPy bool array if as_array is set).
+    # With the kernel the whole batch is answered in one call.
+    def search_many(self, words, exact=True, as_array=False):
+        words = list(words)
+        if self._kernel is not None:
+            results = self._kernel.search_many(self._chars, self._flags, self._ls, self._eq, self._gt,
+                                               self.root, words, exact)
+        else:
+            results = [self.search(word, exact) for word in words]
+
+        if as_array:
+            import numpy as np  # optional dependency, only needed for array output
+            return np.array(results, dtype=bool)
+        return results
+
+    # The tree in the binary file format
+    def to_bytes(self):
+        return _pack_flat(self._chars, self._flags, self._ls, self._eq, self._gt, self.word_count, self.root)
+
+    # Writes the tree in the binary file format
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    # Immutable snapshot of the tree in one contiguous buffer, safe to share between threads
+    def freeze(self):
+        return FrozenTernarySearchTree(self.to_bytes())
+
+    # Tree visualization, same layout as TernarySearchTree.__str__
+    def __str__(self):
+        if not self.root:
             return ""
-        return "terminates: False\n" + _str_helper(self.root)
\ No newline at end of file
+
+        lines = ["terminates: False"]
+        stack = [(self.root, "    ", "")]
+        while stack:
+            node, prefix, child = stack.pop()
+            child = f"{child}:" if child else ""
+            terminates = bool(self._flags[node] & self.END_OF_WORD)
+            lines.append(f"{child} {prefix} char: {chr(self._chars[node])}, terminates: {terminates}")
+
+            if self._gt[node]:
+                stack.append((self._gt[node], prefix + "  ", "_gt"))
+            if self._eq[node]:
+                stack.append((self._eq[node], prefix + "  ", "_eq"))
+            if self._ls[node]:
+                stack.append((self._ls[node], prefix + "  ", "_ls"))
+
+        return "\n".join(lines)
+
+
+# Same tree, but nodes live in parallel typed arrays instead of one Python object each.
+class CompactTernarySearchTree(_InsertableTree, _FlatTernarySearchTree):
+
+    # Tree initialization
+    def __init__(self):
+        self.clear()
+
+    # Appends a node to the arrays (or reuses a slot from the free list) and returns its index
+    def _new_node(self, code):
+        if self._free:
+            node = self._free.pop()
+            self._chars[node] = code
+            self._flags[node] = self._ls[node] = self._eq[node] = self._gt[node] = 0
+            return node
+
+        self._chars.append(code)  # code point of the letter stored in the node
+        self._flags.append(0)  # END_OF_WORD bit set when the letter ends a word
+        self._ls.append(0)  # index of the node with a lesser character
+        self._eq.append(0)  # index of the node with the following character of the word
+        self._gt.append(0)  # index of the node with a greater character
+        return len(self._chars) - 1
+
+    # Number of nodes in use (without the sentinel and the free slots)
+    def node_count(self):
+        return len(self._chars) - 1 - len(self._free)
+
+    # Helper function for inserting words, returns the index of the subtree root
+    def insert_character(self, node, word, index):
+        chars, ls, eq, gt = self._chars, self._ls, self._eq, self._gt
+        code = ord(word[index])
+        if not node:
+            node = self._new_node(code)
+        root = node
+        last = len(word) - 1
+
+        while True:
+            node_code = chars[node]
+            if code < node_code:
+                if not ls[node]:
+                    ls[node] = self._new_node(code)
+                node = ls[node]
+            elif code > node_code:
+                if not gt[node]:
+                    gt[node] = self._new_node(code)
+                node = gt[node]
+            elif index == last:
+                if not self._flags[node] & self.END_OF_WORD:
+                    self.word_count += 1
+                    self._flags[node] |= self.END_OF_WORD
+                return root
+            else:
+                index += 1
+                code = ord(word[index])
+                if not eq[node]:
+                    eq[node] = self._new_node(code)
+                node = eq[node]
+
+    # Insert word function
+    def insert(self, word):
+        if not isinstance(word, str) or not word:
+            return
+
+        self.root = self.insert_character(self.root, word, 0)
+
+    # Rebuilds the tree in median order, e.g. after inserting sorted input one word at a time
+    def rebalance(self):
+        words = self.all_strings()
+        self.clear()
+        for word in _median_order(words):
+            self.insert(word)
+
+    # Removes a word, returns False if it wasn't in the tree.
+    # Pruned nodes go on the free list, compact() gives their memory back.
+    def delete(self, word):
+        if not isinstance(word, str) or not word:
+            return False
+
+        chars, ls, eq, gt = self._chars, self._ls, self._eq, self._gt
+
+        # Path from the root as (node, parent, child array of the parent that points to node)
+        path = []
+        node, parent, links = self.root, 0, None
+        index, last = 0, len(word) - 1
+        while node:
+            path.append((node, parent, links))
+            code = ord(word[index])
+            if code < chars[node]:
+                node, parent, links = ls[node], node, ls
+            elif code > chars[node]:
+                node, parent, links = gt[node], node, gt
+            elif index == last:
+                break
+            else:
+                index += 1
+                node, parent, links = eq[node], node, eq
+
+        if not node or not self._flags[node] & self.END_OF_WORD:
+            return False
+
+        self._flags[node] &= ~self.END_OF_WORD
+        self.word_count -= 1
+
+        for node, parent, links in reversed(path):
+            if self._flags[node] & self.END_OF_WORD or eq[node]:
+                break  # this node and everything above it still lead to a word
+            replacement = self._unlink(node)
+            if parent:
+                links[parent] = replacement
+            else:
+                self.root = replacement
+            self._free.append(node)
+
+        return True
+
+    # Removes a node from the binary search tree of its level, returns the index that takes its place
+    def _unlink(self, node):
+        ls, gt = self._ls, self._gt
+        if not ls[node]:
+            return gt[node]
+        if not gt[node]:
+            return ls[node]
+
+        parent, successor = 0, gt[node]
+        while ls[successor]:
+            parent, successor = successor, ls[successor]
+        if parent:
+            ls[parent] = gt[successor]
+            gt[successor] = gt[node]
+        ls[successor] = ls[node]
+        return successor
+
+    # Rewrites the arrays without the free slots, numbering the nodes in pre-order
+    def compact(self):
+        chars, flags, ls, eq, gt = self._chars, self._flags, self._ls, self._eq, self._gt
+        order = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            for child in (gt[node], eq[node], ls[node]):
+                if child:
+                    stack.append(child)
+
+        new_index = {node: position for position, node in enumerate(order, 1)}
+        new_index[0] = 0
+        self._chars = array("I", [0] + [chars[node] for node in order])
+        self._flags = array("B", [0] + [flags[node] for node in order])
+        self._ls = array("i", [0] + [new_index[ls[node]] for node in order])
+        self._eq = array("i", [0] + [new_index[eq[node]] for node in order])
+        self._gt = array("i", [0] + [new_index[gt[node]] for node in order])
+        self._free = []
+        self.root = new_index[self.root]
+
+    def clear(self):
+        self._chars = array("I", [0])
+        self._flags = array("B", [0])
+        self._ls = array("i", [0])
+        self._eq = array("i", [0])
+        self._gt = array("i", [0])
+        self._free = []  # indices of slots freed by delete
+        self.root = 0
+        self.word_count = 0
+
+    # Reads a tree written by save(); the arrays are copied, so the tree can be modified
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    # Tree from the binary file format
+    @classmethod
+    def from_bytes(cls, data):
+        chars, flags, ls, eq, gt, word_count, root = _unpack_flat(data)
+        tst = cls()
+        tst._chars, tst._flags = array("I", chars), array("B", flags)
+        tst._ls, tst._eq, tst._gt = array("i", ls), array("i", eq), array("i", gt)
+        tst.word_count, tst.root = word_count, root
+        return tst
+
+
+# Read-only tree that runs lookups directly on a buffer in the binary file format, e.g. a
+# memory-mapped file (see TernarySearchTree.load). No node objects are created, and processes
+# mapping the same file share one page-cached copy.
+class FrozenTernarySearchTree(_FlatTernarySearchTree):
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._chars, self._flags, self._ls, self._eq, self._gt, self.word_count, self.root = _unpack_flat(buffer)
+
+    # Releases the buffer (and closes it when it is a memory map); the tree can't be used afterwards
+    def close(self):
+        for view in (self._chars, self._flags, self._ls, self._eq, self._gt):
+            if isinstance(view, memoryview):
+                view.release()
+        if hasattr(self._buffer, "close"):
+            self._buffer.close()
+
+    # Already immutable
+    def freeze(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Copy-on-write writer for VersionedTernarySearchTree. seal() hands out the current version in
+# O(1) by sharing its nodes; after that, a write copies the shared nodes on its search path (and,
+# for a delete, the successor chain it relinks) and leaves every other node shared. Nodes created
+# or copied since the last seal() are private and are changed in place.
+class _CopyOnWriteTree(TernarySearchTree):
+
+    def __init__(self, tst=None):
+        super().__init__()
+        self._owned = set()  # Nodes private to the current version
+        if tst is not None:  # shares tst's nodes, tst itself is never changed
+            self.root, self.word_count = tst.root, tst.word_count
+
+    # Returns the current version as a TernarySearchTree sharing its nodes; later writes copy them
+    def seal(self):
+        version = TernarySearchTree()
+        version.root, version.word_count = self.root, self.word_count
+        self._owned = set()
+        return version
+
+    # Replaces a shared node by a private copy in its parent (or the root), returns the copy
+    def _own(self, node, parent, link):
+        copy = self._copy_node(node)
+        copy.size, copy._ls, copy._eq, copy._gt = node.size, node._ls, node._eq, node._gt
+        if parent is None:
+            self.root = copy
+        else:
+            setattr(parent, link, copy)
+        self._owned.add(copy)
+        return copy
+
+    # Makes every node on the search path of word private. With copy=False the nodes are only
+    # claimed, which is how the nodes an insert just created become private.
+    def _own_path(self, word, copy=True):
+        owned = self._owned
+        node, parent, link = self.root, None, None
+        index, last = 0, len(word) - 1
+        while node is not None:
+            if node not in owned:
+                if copy:
+                    node = self._own(node, parent, link)
+                else:
+                    owned.add(node)
+            if word[index] < node.char:
+                node, parent, link = node._ls, node, "_ls"
+            elif word[index] > node.char:
+                node, parent, link = node._gt, node, "_gt"
+            elif index == last:
+                return
+            else:
+                index += 1
+                node, parent, link = node._eq, node, "_eq"
+
+    def insert_character(self, node, word, index, value=_NO_VALUE):
+        if index or node is not self.root:
+            return super().insert_character(node, word, index, value)
+        self._own_path(word)
+        self.root = super().insert_character(self.root, word, index, value)
+        self._own_path(word, copy=False)
+        return self.root
+
+    def delete(self, word):
+        if not self.search(word, exact=True):
+            return False
+        self._own_path(word)
+        return super().delete(word)
+
+    # The two-children case relinks the successor chain below node, so that chain is copied too
+    def _unlink(self, node):
+        if node._ls is not None and node._gt is not None:
+            parent, link, child = node, "_gt", node._gt
+            while child is not None:
+                if child not in self._owned:
+                    child = self._own(child, parent, link)
+                parent, link, child = child, "_ls", child._ls
+        return super()._unlink(node)
+
+
+# Single writer, many readers: reads go to an immutable FrozenTernarySearchTree snapshot and
+# need no locking. Writes go to a private copy-on-write tree (under a lock) and become visible
+# when publish() freezes a new version and swaps it in with a single reference assignment.
+# Readers that still hold the previous snapshot keep a consistent view of it. Snapshots hold
+# the words only; weights given to insert() stay in the writer.
+class VersionedTernarySearchTree:
+
+    def __init__(self, tst=None):
+        self._lock = threading.Lock()  # guards the writer
+        self._publish_lock = threading.Lock()  # one publish at a time, so versions go out in order
+        self._writer = _CopyOnWriteTree(tst)
+        self._snapshot = self._writer.freeze(words_only=True)
+        self.version = 0
+
+    # Current published snapshot; keep the reference to run several queries against one version
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    # Writes, not visible to readers until publish()
+
+    def insert(self, word, weight=None):
+        with self._lock:
+            self._writer.insert(word, weight)
+
+    def insert_many(self, words):
+        with self._lock:
+            return self._writer.insert_many(words)
+
+    def delete(self, word):
+        with self._lock:
+            return self._writer.delete(word)
+
+    # Freezes the pending writes into a new snapshot and swaps it in atomically. With path the
+    # snapshot is also saved there (via a temporary file and os.replace) so that other processes
+    # can memory-map the new version while existing mappings of the old file stay valid.
+    # Only sealing the version holds the writer lock; serializing and writing it don't.
+    def publish(self, path=None):
+        with self._publish_lock:
+            with self._lock:
+                version = self._writer.seal()
+            data = version.to_bytes(words_only=True)
+            snapshot = FrozenTernarySearchTree(data)
+            if path is not None:
+                temporary_path = f"{path}.{os.getpid()}.tmp"
+                with open(temporary_path, "wb") as f:
+                    f.write(data)
+                os.replace(temporary_path, path)
+            self._snapshot = snapshot
+            self.version += 1
+        return snapshot
+
+    # Reads, always against the current snapshot
+
+    def search(self, word, exact=False):
+        return self._snapshot.search(word, exact)
+
+    def keys_with_prefix(self, prefix, limit=None):
+        return self._snapshot.keys_with_prefix(prefix, limit)
+
+    def all_strings(self):
+        return self._snapshot.all_strings()
+
+    def __contains__(self, word):
+        return word in self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+
+# Builds one shard in a worker process and sends it back in the binary file format
+def _build_shard(sorted_words):
+    return TernarySearchTree.from_sorted(sorted_words).to_bytes()
+
+
+# Splits the words over independent trees by key range: shard i holds the words w with
+# boundaries[i - 1] <= w < boundaries[i]. Each query goes to the one shard that owns its key,
+# and because the ranges are ordered, results that span shards are merged by concatenation.
+class ShardedTernarySearchTree(_SortedWords):
+
+    def __init__(self, boundaries=()):
+        self.boundaries = sorted(boundaries)
+        self.shards = [TernarySearchTree() for _ in range(len(self.boundaries) + 1)]
+
+    # Builds num_shards shards of (about) equal size, in parallel in a pool of workers processes.
+    # With workers=1 the shards are built one after the other in this process. With frozen the
+    # shards stay read-only FrozenTernarySearchTrees on the buffers the workers send back, which
+    # skips rebuilding their nodes in this process.
+    @classmethod
+    def build(cls, words, num_shards=4, workers=None, frozen=False):
+        words = sorted({word for word in words if isinstance(word, str) and word})
+        size = -(-len(words) // num_shards) if words else 1
+        chunks = [words[start:start + size] for start in range(0, len(words), size)] or [[]]
+
+        tst = cls(chunk[0] for chunk in chunks[1:])
+        if workers == 1:
+            tst.shards = [TernarySearchTree.from_sorted(chunk) for chunk in chunks]
+            if frozen:
+                tst.shards = [shard.freeze() for shard in tst.shards]
+        else:
+            load = FrozenTernarySearchTree if frozen else TernarySearchTree.from_bytes
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                tst.shards = [load(data) for data in pool.map(_build_shard, chunks)]
+        return tst
+
+    # Shard that owns word
+    def shard_for(self, word):
+        return self.shards[bisect_right(self.boundaries, word)]
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def insert(self, word, weight=None):
+        if isinstance(word, str) and word:
+            self.shard_for(word).insert(word, weight)
+
+    def delete(self, word):
+        if not isinstance(word, str) or not word:
+            return False
+        return self.shard_for(word).delete(word)
+
+    def search(self, word, exact=False):
+        if not isinstance(word, str) or not word:
+            return False
+        if exact:
+            return self.shard_for(word).search(word, exact=True)
+        # A prefix can continue into the following shards
+        return next(iter(self.keys_with_prefix(word, limit=1)), None) is not None
+
+    # Shards that can hold words between lo and hi (both included, None for no bound)
+    def _shards_between(self, lo, hi):
+        first = 0 if lo is None else bisect_right(self.boundaries, lo)
+        last = len(self.boundaries) if hi is None else bisect_right(self.boundaries, hi)
+        return self.shards[first:last + 1]
+
+    # Autocomplete across shards, in sorted order
+    def _prefix_words(self, prefix, limit=None):
+        shards = self._shards_between(prefix, prefix + _MAX_CHAR) if prefix else self.shards
+        return chain.from_iterable(shard.keys_with_prefix(prefix) for shard in shards)
+
+    # Words w with lo <= w < hi, in sorted order (None for no bound)
+    def range(self, lo=None, hi=None):
+        return chain.from_iterable(shard.range(lo, hi) for shard in self._shards_between(lo, hi))
+
+
+# Hybrid root: the first table_depth (1 or 2) characters of a word index directly into a dict
+# of sub-trees, so lookups skip the _ls/_gt walk over the widest, most visited top levels.
+# Each sub-tree keeps the rest of the words behind its table key (their characters from
+# table_depth on); words that are no longer than table_depth live in a plain set.
+class HybridTernarySearchTree(_InsertableTree, _SortedWords):
+
+    def __init__(self, table_depth=1):
+        if table_depth not in (1, 2):
+            raise ValueError("table_depth must be 1 or 2")
+        self.table_depth = table_depth
+        self.clear()
+
+    def clear(self):
+        self.table = {}  # first table_depth characters -> TernarySearchTree of the remaining characters
+        self.short_words = set()  # words of at most table_depth characters
+        self.word_count = 0
+
+    def insert(self, word):
+        if not isinstance(word, str) or not word:
+            return  # doesn't insert empty strings or invalid types into the tree
+
+        depth = self.table_depth
+        if len(word) <= depth:
+            if word not in self.short_words:
+                self.short_words.add(word)
+                self.word_count += 1
+            return
+
+        key = word[:depth]
+        subtree = self.table.get(key)
+        if subtree is None:
+            subtree = self.table[key] = TernarySearchTree()
+        before = subtree.word_count
+        subtree.root = subtree.insert_character(subtree.root, word, depth)
+        self.word_count += subtree.word_count - before
+
+    # Table keys and short words starting with prefix, in sorted order
+    def _heads(self, prefix):
+        return sorted(head for head in self.table.keys() | self.short_words if head.startswith(prefix))
+
+    def search(self, word, exact=False):
+        if not isinstance(word, str) or not word:
+            return False
+
+        depth = self.table_depth
+        if len(word) <= depth:
+            if exact or word in self.short_words:
+                return word in self.short_words
+            return next(iter(self.keys_with_prefix(word, limit=1)), None) is not None
+
+        subtree = self.table.get(word[:depth])
+        if subtree is None:
+            return False
+        node = subtree.search_helper(subtree.root, word, depth)
+        if not node:
+            return False
+        return node.value is not _NO_VALUE if exact else True
+
+    # Lazily yields the words starting with prefix in sorted order
+    def _prefix_words(self, prefix, limit=None):
+        depth = self.table_depth
+        if len(prefix) < depth:
+            return chain.from_iterable(self._words_below(head) for head in self._heads(prefix))
+        if len(prefix) == depth:
+            return self._words_below(prefix)
+
+        subtree = self.table.get(prefix[:depth])
+        if subtree is None:
+            return iter(())
+        node = subtree.search_helper(subtree.root, prefix, depth)
+        if node is None:
+            return iter(())
+        words = (word for word, _ in subtree._iter_nodes(node._eq, prefix))
+        if node.value is not _NO_VALUE:
+            return chain((prefix,), words)
+        return words
+
+    # Words starting with head, a table key or short word: head itself first, then its sub-tree
+    def _words_below(self, head):
+        if head in self.short_words:
+            yield head
+        subtree = self.table.get(head)
+        if subtree is not None:
+            for word, _ in subtree._iter_nodes(subtree.root, head):
+                yield word
+
+
+# Path-compressed tree: a node holds a segment of one or more characters instead of a single
+# one, so a chain of nodes that only have an _eq child (e.g. a long shared prefix) is one node.
+# _ls and _gt branch on the first character of the segment; after the whole segment matched,
+# the word continues in _eq. Inserting a word that diverges inside a segment splits the node.
+class RadixTernarySearchTree(_InsertableTree, _SortedWords):
+
+    def __init__(self):
+        self.root = None
+        self.word_count = 0
+
+    class Node:
+        __slots__ = ("segment", "end_of_word", "_ls", "_eq", "_gt")  # no per-node __dict__
+
+        def __init__(self, segment, end_of_word=False):
+            self.segment = segment  # Characters stored in the node, at least one
+            self.end_of_word = end_of_word  # True when a word ends after the last character of segment
+            self._ls = None  # Next node whose segment starts with a lesser character
+            self._eq = None  # Next node that continues the word after segment
+            self._gt = None  # Next node whose segment starts with a greater character
+
+    def clear(self):
+        self.root = None
+        self.word_count = 0
+
+    # Number of nodes in the tree
+    def node_count(self):
+        count, stack = 0, [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(child for child in (node._ls, node._eq, node._gt) if child)
+        return count
+
+    def insert(self, word):
+        if not isinstance(word, str) or not word:
+            return  # doesn't insert empty strings or invalid types into the tree
+
+        parent, link = self, "root"
+        index, length = 0, len(word)
+        while True:
+            node = getattr(parent, link)
+            if node is None:
+                setattr(parent, link, self.Node(word[index:], True))  # the rest of the word in one node
+                self.word_count += 1
+                return
+
+            char = word[index]
+            segment = node.segment
+            if char < segment[0]:
+                parent, link = node, "_ls"
+            elif char > segment[0]:
+                parent, link = node, "_gt"
+            else:
+                # Length of the common prefix of segment and the rest of the word
+                common, limit = 1, min(len(segment), length - index)
+                while common < limit and segment[common] == word[index + common]:
+                    common += 1
+
+                if common < len(segment):
+                    # Diverges (or ends) inside the segment: split off the unmatched tail
+                    tail = self.Node(segment[common:], node.end_of_word)
+                    tail._eq = node._eq
+                    node.segment, node._eq, node.end_of_word = segment[:common], tail, False
+
+                index += common
+                if index == length:
+                    if not node.end_of_word:
+                        node.end_of_word = True
+                        self.word_count += 1
+                    return
+                parent, link = node, "_eq"
+
+    # Finds the node where prefix ends, returns (node, rest of its segment after prefix) or (None, "")
+    def search_helper(self, node, prefix, index):
+        length = len(prefix)
+        while node is not None:
+            char = prefix[index]
+            segment = node.segment
+            if char < segment[0]:
+                node = node._ls
+            elif char > segment[0]:
+                node = node._gt
+            elif length - index <= len(segment):
+                # The prefix ends inside (or at the end of) this segment
+                if segment.startswith(prefix[index:]):
+                    return node, segment[length - index:]
+                return None, ""
+            elif prefix.startswith(segment, index):
+                index += len(segment)
+                node = node._eq
+            else:
+                return None, ""
+        return None, ""
+
+    def search(self, word, exact=False):
+        if not isinstance(word, str) or not word:
+            return False
+
+        node, rest = self.search_helper(self.root, word, 0)
+        if node is None:
+            return False
+        return node.end_of_word and not rest if exact else True
+
+    # Node fields for _in_order
+    @staticmethod
+    def _fields(node):
+        return node.segment, node.end_of_word, node._ls, node._eq, node._gt
+
+    # Lazily yields the words below node in sorted order, each prefixed with prefix
+    def _iter_words(self, node, prefix):
+        return (word for word, _ in _in_order(node, prefix, self._fields, False))
+
+    # Lazily yields the words starting with prefix in sorted order
+    def _prefix_words(self, prefix, limit=None):
+        if not prefix:
+            return self._iter_words(self.root, "")
+        node, rest = self.search_helper(self.root, prefix, 0)
+        if node is None:
+            return iter(())
+        stem = prefix + rest  # the prefix completed to the end of its node's segment
+        words = self._iter_words(node._eq, stem)
+        if node.end_of_word:
+            return chain((stem,), words)
+        return words
+
+
+# Key codecs: map a word to the key string that is stored in the tree, one code unit per
+# character of the key, and back. Node keys stay integers in the flat layout (the code points of
+# the key string), so a codec that yields small dense codes keeps them small there as well.
+
+# Stores the characters of the word as they are (code point keys)
+class CodepointCodec:
+    name = "codepoint"
+
+    def encode(self, word, insert=False):
+        return word
+
+    def decode(self, key):
+        return key
+
+
+# Stores the UTF-8 bytes of the word, one node per byte (all keys < 256). Byte order is code
+# point order, so words are still iterated in sorted order.
+class Utf8Codec:
+    name = "utf-8"
+
+    def encode(self, word, insert=False):
+        return word.encode("utf-8", "surrogatepass").decode("latin-1")
+
+    def decode(self, key):
+        return key.encode("latin-1").decode("utf-8", "surrogatepass")
+
+
+# Translate table used by AlphabetCodec for inserts: unknown characters get the next free code
+class _GrowingTable(dict):
+
+    def __init__(self, codec):
+        super().__init__()
+        self.codec = codec
+
+    def __missing__(self, code):
+        return self.codec.add(chr(code))
+
+
+# Translate table used by AlphabetCodec for queries: unknown characters get a code that no
+# stored key contains, so the word is simply not found
+class _LookupTable(dict):
+
+    def __missing__(self, code):
+        return _MAX_CHAR
+
+
+# Dense alphabet map: the i-th character of the alphabet is stored as code i. from_words ranks
+# the characters by frequency, so the most common ones get the smallest codes. Words are
+# iterated in code order, which is only alphabetical when the alphabet is sorted.
+class AlphabetCodec:
+    name = "alphabet"
+
+    def __init__(self, alphabet=()):
+        self.alphabet = []  # character of each code, also the decode table of str.translate
+        self._insert_table = _GrowingTable(self)
+        self._lookup_table = _LookupTable()
+        for char in alphabet:
+            if ord(char) not in self._lookup_table:
+                self.add(char)
+
+    # Alphabet of the characters in words, by descending frequency
+    @classmethod
+    def from_words(cls, words):
+        counts = Counter(chain.from_iterable(words))
+        return cls(char for char, _ in counts.most_common())
+
+    def __len__(self):
+        return len(self.alphabet)
+
+    # Gives char the next code and returns it as a key character
+    def add(self, char):
+        key = chr(len(self.alphabet))
+        self.alphabet.append(char)
+        self._insert_table[ord(char)] = self._lookup_table[ord(char)] = key
+        return key
+
+    def encode(self, word, insert=False):
+        return word.translate(self._insert_table if insert else self._lookup_table)
+
+    def decode(self, key):
+        return key.translate(self.alphabet)
+
+
+_CODECS = {codec.name: codec for codec in (CodepointCodec, Utf8Codec, AlphabetCodec)}
+
+_NORMALIZERS = {
+    "NFC": lambda word: unicodedata.normalize("NFC", word),
+    "NFD": lambda word: unicodedata.normalize("NFD", word),
+    "NFKC": lambda word: unicodedata.normalize("NFKC", word),
+    "NFKD": lambda word: unicodedata.normalize("NFKD", word),
+    "casefold": str.casefold,
+    "lower": str.lower
+}
+
+
+# Function applying normalize: None, a callable, one of the _NORMALIZERS names or a list of
+# those, applied in order (e.g. ["NFC", "casefold"])
+def _normalizer(normalize):
+    if normalize is None or callable(normalize):
+        return normalize
+    steps = [normalize] if isinstance(normalize, str) else list(normalize)
+    functions = []
+    for step in steps:
+        if callable(step):
+            functions.append(step)
+        elif step in _NORMALIZERS:
+            functions.append(_NORMALIZERS[step])
+        else:
+            raise ValueError(f"unknown normalization {step!r}, expected one of {sorted(_NORMALIZERS)}")
+    if len(functions) == 1:
+        return functions[0]
+
+    def apply(word):
+        for function in functions:
+            word = function(word)
+        return word
+    return apply
+
+
+# Tree over encoded keys: every word is normalized (e.g. ["NFC", "casefold"] makes "Café",
+# "café" and "cafe" + combining acute one entry) and encoded by a key codec ("codepoint",
+# "utf-8", "alphabet" or a codec object) at insert and at query time, then stored in a storage
+# tree. With the default CompactTernarySearchTree storage the node keys are the integer codes.
+class EncodedTernarySearchTree(_UpdatableTree, _SortedWords):
+
+    def __init__(self, codec="codepoint", normalize=None, storage=CompactTernarySearchTree):
+        if isinstance(codec, str):
+            if codec not in _CODECS:
+                raise ValueError(f"unknown codec {codec!r}, expected one of {sorted(_CODECS)}")
+            codec = _CODECS[codec]()
+        self.codec = codec
+        self.normalize = _normalizer(normalize)
+        self.tree = storage()
+
+    # Builds a balanced tree from any iterable of words. The "alphabet" codec is fitted to the
+    # character frequencies of the (normalized) words.
+    @classmethod
+    def build(cls, words, codec="codepoint", normalize=None, storage=CompactTernarySearchTree):
+        tst = cls(codec, normalize, storage)
+        words = [word for word in words if isinstance(word, str) and word]
+        if tst.normalize is not None:
+            words = [tst.normalize(word) for word in words]
+        if codec == "alphabet":
+            tst.codec = AlphabetCodec.from_words(words)
+        tst.tree = storage.build(tst.codec.encode(word, insert=True) for word in words if word)
+        return tst
+
+    # Key of a word, None if it isn't a non-empty string (before or after normalization)
+    def _key(self, word, insert=False):
+        if not isinstance(word, str) or not word:
+            return None
+        if self.normalize is not None:
+            word = self.normalize(word)
+            if not word:
+                return None
+        return self.codec.encode(word, insert)
+
+    def __len__(self):
+        return len(self.tree)
+
+    def clear(self):
+        self.tree.clear()
+
+    # Number of nodes of the storage tree
+    def node_count(self):
+        if isinstance(self.tree, TernarySearchTree):
+            return self.tree.stats()["node_count"]
+        return self.tree.node_count()
+
+    def insert(self, word):
+        key = self._key(word, insert=True)
+        if key is not None:
+            self.tree.insert(key)
+
+    def delete(self, word):
+        key = self._key(word)
+        return key is not None and self.tree.delete(key)
+
+    def search(self, word, exact=False):
+        key = self._key(word)
+        return key is not None and self.tree.search(key, exact)
+
+    def search_many(self, words, exact=True):
+        return self.tree.search_many([self._key(word) for word in words], exact)
+
+    # Lazily yields the (normalized) words starting with prefix in key order; limit is passed on
+    # to the storage tree for its bounded fast path
+    def _prefix_words(self, prefix, limit=None):
+        key = self._key(prefix) if prefix else ""
+        if key is None:
+            return iter(())
+        return map(self.codec.decode, self.tree.keys_with_prefix(key, limit))
+
+
+# Substring (infix) index: every suffix of every word is a key of a TernarySearchTree whose value
+# lists the IDs of the words ending with that suffix. A word contains q exactly when q is a prefix
+# of one of its suffixes, so its ID is in a list below the node of q. With min_suffix=k only
+# suffixes of at least k characters are stored, which drops the short suffixes shared by most
+# words; queries shorter than k are then answered by a scan of the words.
+class SubstringIndex(_UpdatableTree):
+
+    def __init__(self, min_suffix=1):
+        if min_suffix < 1:
+            raise ValueError("min_suffix must be at least 1")
+        self.min_suffix = min_suffix
+        self.clear()
+
+    def __len__(self):
+        return len(self.words)
+
+    def clear(self):
+        self.tree = TernarySearchTree()  # suffix -> IDs of the words ending with it
+        self.words = []  # word of each ID
+        self.ids = {}  # ID of each word
+
+    # Gives word the next ID, returns None if it is invalid or already indexed
+    def _register(self, word):
+        if not isinstance(word, str) or not word or word in self.ids:
+            return None
+        word_id = self.ids[word] = len(self.words)
+        self.words.append(word)
+        return word_id
+
+    # Suffixes of word that are stored in the tree
+    def _suffixes(self, word):
+        return (word[start:] for start in range(len(word) - self.min_suffix + 1))
+
+    # Indexes a word, returns its ID (the existing one for a duplicate, None for invalid input)
+    def add(self, word):
+        word_id = self._register(word)
+        if word_id is None:
+            return self.ids.get(word) if isinstance(word, str) else None
+
+        tree = self.tree
+        for suffix in self._suffixes(word):
+            node = tree.search_helper(tree.root, suffix, 0)
+            if node is not None and node.value is not _NO_VALUE:
+                node.value.append(word_id)
+            else:
+                tree[suffix] = [word_id]
+        return word_id
+
+    # update() and insert_from_file() index words with add()
+    def _add_word(self, word):
+        self.add(word)
+
+    # Index of any iterable of words (IDs in first-occurrence order). The suffixes are collected
+    # first and inserted once each, in median order, so the tree is balanced.
+    @classmethod
+    def build(cls, words, min_suffix=1):
+        index = cls(min_suffix)
+        postings = {}
+        for word in words:
+            word_id = index._register(word)
+            if word_id is not None:
+                for suffix in index._suffixes(word):
+                    postings.setdefault(suffix, []).append(word_id)
+
+        tree = index.tree
+        for suffix in _median_order(sorted(postings)):
+            tree.root = tree.insert_character(tree.root, suffix, 0, postings[suffix])
+        return index
+
+    # Lazily yields the ID lists of the stored suffixes starting with prefix
+    def _postings(self, prefix):
+        node = self.tree.search_helper(self.tree.root, prefix, 0)
+        if node is None:
+            return
+        if node.value is not _NO_VALUE:
+            yield node.value
+
+        stack = [node._eq] if node._eq else []
+        while stack:
+            node = stack.pop()
+            if node.value is not _NO_VALUE:
+                yield node.value
+            for child in (node._gt, node._eq, node._ls):
+                if child:
+                    stack.append(child)
+
+    # Lazily yields the IDs of the words containing substring, each once
+    def substring_ids(self, substring):
+        if not isinstance(substring, str):
+            return iter(())
+        if len(substring) < self.min_suffix:
+            return (word_id for word_id, word in enumerate(self.words) if substring in word)
+        return self._unique(chain.from_iterable(self._postings(substring)))
+
+    @staticmethod
+    def _unique(ids):
+        seen = set()
+        for word_id in ids:
+            if word_id not in seen:
+                seen.add(word_id)
+                yield word_id
+
+    # Lazily yields the words containing substring, each once
+    def contains_substring(self, substring):
+        return map(self.words.__getitem__, self.substring_ids(substring))
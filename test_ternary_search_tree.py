@@ -1,20 +1,36 @@
 import unittest
 import sys
 import os
+import string
+import re
+import random
+import tempfile
+import gzip
+import threading
+import struct
 
 # Add the parent directory to the path to import our module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from ternary_search_tree import TernarySearchTree
+import ternary_search_tree
+from ternary_search_tree import (TernarySearchTree, CompactTernarySearchTree, FrozenTernarySearchTree,
+                                 VersionedTernarySearchTree, ShardedTernarySearchTree, HybridTernarySearchTree,
+                                 RadixTernarySearchTree, EncodedTernarySearchTree, AlphabetCodec,
+                                 SubstringIndex)
+
+# Words to insert from the provided file, shared by the test classes below
+WORDS = ["combine", "combinations", "combination", "combined", "combines", "ducks", "ducked", "duck", "futile",
+         "futility", "future", "fontain", "font", "far", "a", "the", "their", "therefor", "there", "bomb"]
 
 # Test cases for TernarySearchTree class.
 class TestTernarySearchTree(unittest.TestCase):
+    tree_class = TernarySearchTree
     
     # Set up test fixtures before each test method.
     def setUp(self):
-        self.tst = TernarySearchTree()
+        self.tst = self.tree_class()
         # Words to insert from the provided file
-        self.words_to_insert = ["combine", "combinations", "combination", "combined", "combines", "ducks", "ducked", "duck", "futile", "futility", "future", "fontain", "font", "far", "a", "the", "their", "therefor", "there", "bomb"]
+        self.words_to_insert = list(WORDS)
         # Words not to insert from the provided file
         self.words_not_to_insert = ["futures", "fontains", "alphabet", "gamma", "monster", "test"]
 
@@ -91,10 +107,1145 @@ class TestTernarySearchTree(unittest.TestCase):
         self.assertTrue(self.tst.search('ab'))
         self.assertFalse(self.tst.search('ac'))
         
-        # Test empty string insertion
+        # Test empty string insertion: insert ignores empty strings, so the tree still has 'abc' and 'aqt'
         self.tst.insert('')
-        self.assertEqual(len(self.tst), 3) # The TST has 'abc', 'aqt', and '' now
-        self.assertTrue(self.tst.search(''))
+        self.assertEqual(len(self.tst), 2)
+        self.assertFalse(self.tst.search('')) # The empty string is never in the tree, not even as a prefix
         self.assertTrue(self.tst.search('a'))
         self.assertTrue(self.tst.search('abc'))
-        self.assertFalse(self.tst.search('', exact=True)) # Exact search for empty string should be False
\ No newline at end of file
+        self.assertFalse(self.tst.search('', exact=True)) # Exact search for empty string should be False
+    
+    # Test that very long keys don't hit the recursion limit on insert, search or traversal.
+    def test_long_word_no_recursion_limit(self):
+        long_word = "a" * (sys.getrecursionlimit() * 2)
+        self.tst.insert(long_word)
+        self.tst.insert(long_word[:-1] + "b")
+
+        self.assertEqual(len(self.tst), 2)
+        self.assertTrue(self.tst.search(long_word, exact=True))
+        self.assertFalse(self.tst.search(long_word + "a", exact=True))
+        self.assertEqual(self.tst.all_strings(), [long_word, long_word[:-1] + "b"])
+        self.assertTrue(str(self.tst).startswith("terminates: False"))
+
+    # Test that all_strings returns the words in sorted order.
+    def test_all_strings_sorted(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+
+        self.assertEqual(self.tst.all_strings(), sorted(set(self.words_to_insert)))
+
+    # Test the bulk constructor sorts, deduplicates and puts the median at the root.
+    def test_build_balanced(self):
+        letters = list(string.ascii_lowercase)
+        tst = self.tree_class.build(letters + letters[::-1] + ["", None])
+
+        self.assertEqual(len(tst), 26)
+        self.assertEqual(tst.all_strings(), letters)
+        self.assertIn("char: n,", str(tst).split("\n")[1])
+
+    # Test that rebalancing a tree built from sorted input keeps its words and moves the median to the root.
+    def test_rebalance(self):
+        for word in sorted(self.words_to_insert):
+            self.tst.insert(word)
+        self.assertIn("char: a,", str(self.tst).split("\n")[1])
+
+        self.tst.rebalance()
+        self.assertEqual(len(self.tst), len(set(self.words_to_insert)))
+        self.assertEqual(self.tst.all_strings(), sorted(set(self.words_to_insert)))
+        self.assertIn("char: f,", str(self.tst).split("\n")[1])
+
+    # Test prefix completion returns sorted completions, including the prefix itself when it is a word.
+    def test_keys_with_prefix(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+
+        self.assertEqual(list(self.tst.keys_with_prefix("comb")),
+                         ["combination", "combinations", "combine", "combined", "combines"])
+        self.assertEqual(list(self.tst.keys_with_prefix("duck")), ["duck", "ducked", "ducks"])
+        self.assertEqual(list(self.tst.keys_with_prefix("the", limit=2)), ["the", "their"])
+        self.assertEqual(list(self.tst.keys_with_prefix("")), sorted(set(self.words_to_insert)))
+        self.assertEqual(list(self.tst.keys_with_prefix("gamma")), [])
+        self.assertEqual(list(self.tst.keys_with_prefix(None)), [])
+        self.assertEqual(list(self.tst.keys_with_prefix("f", limit=0)), [])
+
+    # Test that bounded completions agree with the unbounded ones, also for non-ASCII words.
+    def test_keys_with_prefix_limits(self):
+        words = self.words_to_insert + ["naïve", "naïvety", "日本", "日本語"]
+        for word in words:
+            self.tst.insert(word)
+
+        for prefix in ["", "f", "fut", "the", "naï", "日", "日本", "x"]:
+            completions = list(self.tst.keys_with_prefix(prefix))
+            for limit in [0, 1, 2, 5, 100]:
+                self.assertEqual(list(self.tst.keys_with_prefix(prefix, limit=limit)), completions[:limit])
+
+    # Test that a batch lookup gives the same answers as one search per word.
+    def test_search_many_matches_search(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+
+        probes = self.words_to_insert + self.words_not_to_insert + ["comb", "fu", "", None, 5]
+        for exact in [True, False]:
+            expected = [self.tst.search(word, exact=exact) for word in probes]
+            self.assertEqual(self.tst.search_many(probes, exact=exact), expected)
+        self.assertEqual(self.tree_class().search_many(["a", "b"]), [False, False])
+
+    # Test that completions are produced lazily.
+    def test_keys_with_prefix_is_lazy(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+
+        completions = self.tst.keys_with_prefix("fut")
+        self.assertEqual(next(completions), "futile")
+        self.assertEqual(next(completions), "futility")
+
+    # Test that range yields the words in [lo, hi) in sorted order, with open bounds as None.
+    def test_range(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+        words = sorted(set(self.words_to_insert) - {""})
+
+        for lo, hi in [("c", "d"), ("combination", "combines"), ("fu", "z"), ("", "a"), ("duck", "duck")]:
+            self.assertEqual(list(self.tst.range(lo, hi)), [w for w in words if lo <= w < hi])
+        self.assertEqual(list(self.tst.range(None, "d")), [w for w in words if w < "d"])
+        self.assertEqual(list(self.tst.range("th")), [w for w in words if w >= "th"])
+
+    # Test deleting words keeps the other words, their prefixes and the count intact.
+    def test_delete(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+
+        self.assertTrue(self.tst.delete("combination"))
+        self.assertTrue(self.tst.delete("the"))
+        self.assertTrue(self.tst.delete("bomb"))
+        self.assertFalse(self.tst.delete("bomb"))
+        self.assertFalse(self.tst.delete("comb"))
+        self.assertFalse(self.tst.delete(""))
+        self.assertFalse(self.tst.delete(None))
+
+        remaining = sorted(set(self.words_to_insert) - {"combination", "the", "bomb"})
+        self.assertEqual(len(self.tst), len(remaining))
+        self.assertEqual(self.tst.all_strings(), remaining)
+        self.assertTrue(self.tst.search("combinations", exact=True))
+        self.assertTrue(self.tst.search("combination", exact=False))
+        self.assertFalse(self.tst.search("combination", exact=True))
+        self.assertFalse(self.tst.search("bo"))  # pruned
+        self.assertTrue(self.tst.search("there", exact=True))
+
+    # Test that deleting every word (in random order) prunes the whole tree.
+    def test_delete_all(self):
+        words = list(set(self.words_to_insert))
+        for word in words:
+            self.tst.insert(word)
+        random.Random(7).shuffle(words)
+
+        for position, word in enumerate(words):
+            self.assertTrue(self.tst.delete(word))
+            self.assertEqual(self.tst.all_strings(), sorted(words[position + 1:]))
+        self.assertTrue(self.tst.is_empty())
+        self.assertEqual(len(self.tst), 0)
+        self.assertEqual(str(self.tst), "")
+
+    # Test streaming words from plain and gzip'd files, with normalization and progress reports.
+    def test_insert_from_file(self):
+        lines = "Duck\n  ducks \n\nduck\nFar\n"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(lines)
+            reports = []
+            self.assertEqual(self.tst.insert_from_file(path, progress=lambda *report: reports.append(report),
+                                                       progress_every=2), 4)
+            self.assertEqual(reports, [(2, 2), (4, 3), (5, 4)])
+            self.assertEqual(self.tst.all_strings(), ["Duck", "Far", "duck", "ducks"])
+
+            gzip_path = os.path.join(directory, "words.txt.gz")
+            with gzip.open(gzip_path, "wt", encoding="utf-8") as f:
+                f.write(lines + "font\n")
+            self.tst.clear()
+            self.assertEqual(self.tst.insert_from_file(gzip_path, normalize=str.lower), 4)
+            self.assertEqual(self.tst.all_strings(), ["duck", "ducks", "far", "font"])
+
+            # Progress counts lines, so a blank line at a multiple of progress_every still reports
+            reports = []
+            self.tst.clear()
+            self.tst.insert_from_file(path, normalize="lower", progress=lambda *report: reports.append(report),
+                                      progress_every=3)
+            self.assertEqual(reports, [(3, 2), (5, 3)])
+            self.assertEqual(self.tst.all_strings(), ["duck", "ducks", "far"])
+
+            # The same loader backs the other trees and the substring index
+            for tree in [CompactTernarySearchTree(), EncodedTernarySearchTree(), SubstringIndex()]:
+                self.assertEqual(tree.insert_from_file(path, normalize=["NFC", "casefold"]), 3)
+                self.assertEqual(tree.update(["far", "font"]), 1)
+
+    # Test adding the words of an iterable.
+    def test_update(self):
+        self.assertEqual(self.tst.update(iter(self.words_to_insert + ["", None])), len(set(self.words_to_insert)))
+        self.assertEqual(self.tst.update(["duck", "duckling"]), 1)
+        self.assertEqual(len(self.tst), len(set(self.words_to_insert)) + 1)
+
+
+# Test cases for the batch insert and lookup API.
+class TestTernarySearchTreeBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tst = TernarySearchTree()
+        self.words = list(WORDS)
+
+    # Test that insert_many skips invalid words and duplicates and reports the new words.
+    def test_insert_many(self):
+        self.assertEqual(self.tst.insert_many(self.words + ["", None, 5, "duck"]), len(self.words))
+        self.assertEqual(self.tst.insert_many(["duck", "duckling"]), 1)
+        self.assertEqual(self.tst.all_strings(), sorted(self.words + ["duckling"]))
+
+    # Test that search_many gives the same answers as search, in input order.
+    def test_search_many_matches_search(self):
+        self.tst.insert_many(self.words)
+        probes = self.words + ["futures", "fontains", "alphabet", "gamma", "comb", "th", "a", "a", "",
+                               None, 123, "thereforee", "zzz"]
+        random.Random(3).shuffle(probes)
+
+        for exact in (True, False):
+            self.assertEqual(self.tst.search_many(probes, exact=exact),
+                             [self.tst.search(word, exact=exact) for word in probes])
+
+    # Test search_many on large batches, where groups of probes are split at the nodes.
+    def test_search_many_large_batch(self):
+        words = ["".join(random.Random(seed).choices("abc", k=seed % 7 + 1)) for seed in range(500)]
+        self.tst.insert_many(words[::2])
+        for exact in (True, False):
+            self.assertEqual(self.tst.search_many(words, exact=exact),
+                             [self.tst.search(word, exact=exact) for word in words])
+
+    # Test search_many on an empty tree and with an empty batch.
+    def test_search_many_empty(self):
+        self.assertEqual(self.tst.search_many(["a", "b"]), [False, False])
+        self.tst.insert("a")
+        self.assertEqual(self.tst.search_many([]), [])
+
+
+# Test cases for approximate (edit distance) and wildcard search.
+class TestTernarySearchTreeFuzzy(unittest.TestCase):
+
+    def setUp(self):
+        self.words = list(WORDS)
+        self.tst = TernarySearchTree.build(self.words)
+
+    # Reference Levenshtein distance.
+    @staticmethod
+    def distance(first, second):
+        row = list(range(len(second) + 1))
+        for i, first_char in enumerate(first, 1):
+            new_row = [i]
+            for j, second_char in enumerate(second, 1):
+                new_row.append(min(row[j] + 1, new_row[j - 1] + 1, row[j - 1] + (first_char != second_char)))
+            row = new_row
+        return row[-1]
+
+    # Test typical spelling mistakes: substitution, insertion, deletion.
+    def test_fuzzy_search(self):
+        self.assertEqual(self.tst.fuzzy_search("combinaton", 1), [("combination", 1)])
+        self.assertEqual(self.tst.fuzzy_search("dock", 1), [("duck", 1)])
+        self.assertEqual(self.tst.fuzzy_search("thee", 1), [("the", 1), ("there", 1)])
+        self.assertEqual(self.tst.fuzzy_search("duck", 0), [("duck", 0)])
+        self.assertEqual(self.tst.fuzzy_search("duck", -1), [])
+        self.assertEqual(self.tst.fuzzy_search(None, 2), [])
+
+    # Test against a brute-force scan over all words.
+    def test_fuzzy_search_matches_brute_force(self):
+        for query in ["fonts", "futur", "bob", "xyz", "combines", "tehir"]:
+            for max_distance in (1, 2, 3):
+                expected = sorted(((word, self.distance(query, word)) for word in self.words
+                                   if self.distance(query, word) <= max_distance),
+                                  key=lambda result: (result[1], result[0]))
+                self.assertEqual(self.tst.fuzzy_search(query, max_distance), expected)
+
+    # Test wildcard pattern matching.
+    def test_match(self):
+        self.assertEqual(list(self.tst.match("c?mb*")),
+                         ["combination", "combinations", "combine", "combined", "combines"])
+        self.assertEqual(list(self.tst.match("d?ck")), ["duck"])
+        self.assertEqual(list(self.tst.match("?uck?")), ["ducks"])
+        self.assertEqual(list(self.tst.match("the*")), ["the", "their", "there", "therefor"])
+        self.assertEqual(list(self.tst.match("f??")), ["far"])
+        self.assertEqual(list(self.tst.match("font")), ["font"])
+        self.assertEqual(list(self.tst.match("?")), ["a"])
+        self.assertEqual(list(self.tst.match("*")), sorted(self.words))
+        self.assertEqual(list(self.tst.match("x*")), [])
+        self.assertEqual(list(self.tst.match("")), [])
+
+    # Test that a pattern agrees with the equivalent regular expression on every word.
+    def test_match_matches_regex(self):
+        for pattern in ["?????", "??t*", "f?t?r?", "??m?i?e?", "a*", "?*"]:
+            regex = re.compile(re.escape(pattern).replace(r"\?", ".").replace(r"\*", ".*") + r"\Z")
+            self.assertEqual(list(self.tst.match(pattern)), sorted(w for w in self.words if regex.match(w)))
+
+    # Test that "*" is only accepted as the last character.
+    def test_match_invalid_pattern(self):
+        with self.assertRaises(ValueError):
+            self.tst.match("*bomb")
+        with self.assertRaises(TypeError):
+            self.tst.match(None)
+
+
+# Test cases for weighted insertion and top-k autocomplete.
+class TestWeightedTernarySearchTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tst = TernarySearchTree()
+        self.weights = {"combine": 5, "combinations": 1, "combination": 8, "combined": 3, "combines": 3,
+                        "duck": 9, "ducks": 4, "ducked": 2, "comb": 7}
+        for word, weight in self.weights.items():
+            self.tst.insert(word, weight)
+
+    # Test that top_k returns the heaviest completions, ties in alphabetical order.
+    def test_top_k(self):
+        self.assertEqual(self.tst.top_k("comb", 3), [("combination", 8), ("comb", 7), ("combine", 5)])
+        self.assertEqual(self.tst.top_k("combine", 3), [("combine", 5), ("combined", 3), ("combines", 3)])
+        self.assertEqual(self.tst.top_k("", 2), [("duck", 9), ("combination", 8)])
+        self.assertEqual(self.tst.top_k("x", 2), [])
+        self.assertEqual(self.tst.top_k("comb", 0), [])
+
+    # Test that top_k agrees with sorting all matching words by weight.
+    def test_top_k_matches_brute_force(self):
+        expected = sorted(self.weights.items(), key=lambda item: (-item[1], item[0]))
+        self.assertEqual(self.tst.top_k("", len(self.weights) + 5), expected)
+
+    # Test that updating a weight (also downwards) keeps the subtree maxima correct.
+    def test_weight_update(self):
+        self.tst.insert("combination", 0)
+        self.tst.insert("duck", 1)
+        self.assertEqual(self.tst.top_k("", 2), [("comb", 7), ("combine", 5)])
+        self.assertEqual(self.tst.get_weight("duck"), 1)
+        self.assertEqual(len(self.tst), len(self.weights))
+
+        self.tst.insert("duck")  # no weight keeps the current one
+        self.assertEqual(self.tst.get_weight("duck"), 1)
+        self.assertIsNone(self.tst.get_weight("du"))
+
+    # Test that deleting a word drops it from the ranking and fixes the subtree maxima.
+    def test_delete_updates_weights(self):
+        self.tst.delete("duck")
+        del self.tst["combination"]
+
+        self.assertEqual(self.tst.top_k("", 3), [("comb", 7), ("combine", 5), ("ducks", 4)])
+        self.assertEqual(self.tst.top_k("duck", 1), [("ducks", 4)])
+        with self.assertRaises(KeyError):
+            del self.tst["duck"]
+
+    # Test that negative weights are rejected and rebalance keeps the weights.
+    def test_negative_weight_and_rebalance(self):
+        with self.assertRaises(ValueError):
+            self.tst.insert("bomb", -1)
+
+        self.tst.rebalance()
+        self.assertEqual(self.tst.top_k("duck", 2), [("duck", 9), ("ducks", 4)])
+
+
+# Test cases for using the tree as a mapping from words to values.
+class TestTernarySearchTreeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tst = TernarySearchTree.build(["combine", "combined", "combines", "duck", "ducks", "far", "font"])
+        self.tst.enable_cache(maxsize=2)
+
+    # Test that repeated queries are answered from the cache, per query and mode.
+    def test_hits_and_misses(self):
+        self.assertTrue(self.tst.search("duck", exact=True))
+        self.assertTrue(self.tst.search("duck", exact=True))
+        self.assertTrue(self.tst.search("duc"))
+        self.assertFalse(self.tst.search("duc", exact=True))
+        self.assertEqual(self.tst.cache_info(), {"hits": 1, "misses": 3, "size": 2, "maxsize": 2})
+        self.assertEqual(list(self.tst.keys_with_prefix("comb", limit=2)), ["combine", "combined"])
+        self.assertEqual(list(self.tst.keys_with_prefix("comb", limit=2)), ["combine", "combined"])
+        self.assertEqual(self.tst.cache_hits, 2)
+
+    # Test that the least recently used result is evicted first.
+    def test_lru_eviction(self):
+        self.tst.search("duck")
+        self.tst.search("far")
+        self.tst.search("duck")
+        self.tst.search("font")  # evicts "far"
+        self.tst.search("duck")
+        self.tst.search("far")
+        self.assertEqual((self.tst.cache_hits, self.tst.cache_misses), (2, 4))
+
+    # Test that insert, delete, weight changes and clear invalidate cached results.
+    def test_invalidation(self):
+        self.assertFalse(self.tst.search("fork", exact=True))
+        self.tst.insert("fork")
+        self.assertTrue(self.tst.search("fork", exact=True))
+        self.assertEqual(list(self.tst.keys_with_prefix("du", limit=5)), ["duck", "ducks"])
+        self.tst.delete("ducks")
+        self.assertEqual(list(self.tst.keys_with_prefix("du", limit=5)), ["duck"])
+        self.assertEqual(self.tst.top_k("f", 1), [("far", 0)])
+        self.tst.insert("font", weight=3)
+        self.assertEqual(self.tst.top_k("f", 1), [("font", 3)])
+        self.tst.clear()
+        self.assertFalse(self.tst.search("fork"))
+        self.assertEqual(self.tst.cache_hits, 0)
+
+    # Test that the cache can be switched off again and rejects a non-positive size.
+    def test_disable(self):
+        self.tst.search("duck")
+        self.tst.disable_cache()
+        self.tst.search("duck")
+        self.assertEqual(self.tst.cache_info(), {"hits": 0, "misses": 1, "size": 0, "maxsize": 0})
+        with self.assertRaises(ValueError):
+            self.tst.enable_cache(maxsize=0)
+
+
+class TestTernarySearchTreeInstrumentation(unittest.TestCase):
+
+    # Test the shape stats of a small tree: "cat", "cap" and "dog".
+    def test_stats(self):
+        tst = TernarySearchTree()
+        for word in ["cat", "cap", "dog"]:
+            tst.insert(word)
+        stats = tst.stats()
+        self.assertEqual(stats["node_count"], 7)
+        self.assertEqual(stats["word_count"], 3)
+        self.assertEqual(stats["max_depth"], 4)
+        self.assertAlmostEqual(stats["mean_depth"], (3 + 4 + 4) / 3)
+        self.assertEqual(stats["branching"], {0: 2, 1: 4, 2: 1, 3: 0})
+        self.assertEqual((stats["ls_links"], stats["eq_links"], stats["gt_links"]), (1, 4, 1))
+        self.assertGreater(stats["bytes_per_word"], 0)
+        self.assertEqual(TernarySearchTree().stats()["node_count"], 0)
+
+    # Test that profiling counts node visits and comparisons per insert and search.
+    def test_profiling(self):
+        tst = TernarySearchTree()
+        self.assertEqual(tst.profile(), {})
+        tst.enable_profiling()
+        tst.insert("cat")  # creates 3 nodes
+        tst.insert("cap")  # c, a, t, then creates p
+        self.assertTrue(tst.search("cap", exact=True))
+        self.assertFalse(tst.search("cx"))
+        profile = tst.profile()
+        self.assertEqual(profile["insert"]["visits_histogram"], {3: 1, 4: 1})
+        self.assertEqual(profile["insert"]["comparisons_histogram"], {6: 1, 7: 1})
+        self.assertEqual(profile["search"]["operations"], 2)
+        self.assertEqual(profile["search"]["visits_histogram"], {2: 1, 4: 1})
+        self.assertEqual(profile["search"]["mean_comparisons"], 5.5)
+        self.assertEqual(profile["search"]["max_visits"], 4)
+        tst.disable_profiling()
+        tst.search("cat")
+        self.assertEqual(tst.profile(), {})
+
+
+class TestTernarySearchTreeOrdered(unittest.TestCase):
+
+    def setUp(self):
+        self.words = sorted(set(WORDS))
+        self.tst = TernarySearchTree()
+        for word in random.sample(self.words, len(self.words)):
+            self.tst.insert(word)
+
+    # Test floor, ceiling, min and max against the sorted word list.
+    def test_floor_ceiling_min_max(self):
+        for query in ["", "a", "b", "combinat", "combined", "duckz", "fu", "zebra"]:
+            below = [w for w in self.words if w <= query]
+            above = [w for w in self.words if w >= query]
+            self.assertEqual(self.tst.floor(query), below[-1] if below else None)
+            self.assertEqual(self.tst.ceiling(query), above[0] if above else None)
+        self.assertEqual((self.tst.min(), self.tst.max()), ("a", "therefor"))
+        self.assertEqual((TernarySearchTree().min(), TernarySearchTree().max()), (None, None))
+        with self.assertRaises(TypeError):
+            self.tst.floor(5)
+
+    # Test rank and select with and without subtree counts.
+    def test_rank_and_select(self):
+        for counted in (False, True):
+            if counted:
+                self.tst.enable_subtree_counts()
+                self.assertEqual(self.tst.root.size, len(self.words))
+            for i, word in enumerate(self.words):
+                self.assertEqual(self.tst.rank(word), i)
+                self.assertEqual(self.tst.select(i), word)
+            self.assertEqual(self.tst.rank("combo"), self.words.index("combines") + 1)
+            self.assertEqual(self.tst.rank("zebra"), len(self.words))
+            self.assertEqual(self.tst.select(-1), "therefor")
+            with self.assertRaises(IndexError):
+                self.tst.select(len(self.words))
+
+    # Test that subtree counts stay correct through inserts, deletes and rebalancing.
+    def test_subtree_counts_are_maintained(self):
+        self.tst.enable_subtree_counts()
+        self.tst.insert("combinator")
+        self.tst["zebra"] = 1
+        for word in ["combine", "a", "therefor", "font"]:
+            self.tst.delete(word)
+        self.tst.rebalance()
+        words = sorted(set(self.words) - {"combine", "a", "therefor", "font"} | {"combinator", "zebra"})
+        self.assertEqual(self.tst.root.size, len(words))
+        self.assertEqual([self.tst.select(i) for i in range(len(words))], words)
+        self.assertEqual([self.tst.rank(word) for word in words], list(range(len(words))))
+
+
+class TestTernarySearchTreeSetAlgebra(unittest.TestCase):
+
+    def setUp(self):
+        self.old = {"combine": 1, "combined": 2, "duck": 3, "ducks": 4, "far": 5, "font": 6, "a": 7}
+        self.new = {"combine": 10, "combines": 20, "duck": 30, "fontain": 40, "font": 50, "zebra": 60}
+        self.first, self.second = TernarySearchTree(), TernarySearchTree()
+        for tst, words in ((self.first, self.old), (self.second, self.new)):
+            for word, value in words.items():
+                tst.insert(word, weight=value)
+                tst[word] = value
+
+    def assertTreeEqual(self, tst, expected):
+        self.assertEqual(tst.all_strings(), sorted(expected))
+        self.assertEqual(len(tst), len(expected))
+        self.assertEqual({word: tst[word] for word in tst}, expected)
+        self.assertEqual({word: tst.get_weight(word) for word in tst}, expected)
+
+    # Test union, intersection and difference against dict operations, values and weights included.
+    def test_operations(self):
+        self.assertTreeEqual(self.first.union(self.second), {**self.old, **self.new})
+        self.assertTreeEqual(self.first.intersection(self.second), {w: v for w, v in self.old.items() if w in self.new})
+        self.assertTreeEqual(self.first.difference(self.second), {w: v for w, v in self.old.items() if w not in self.new})
+        self.assertTreeEqual(self.second.difference(self.first), {w: v for w, v in self.new.items() if w not in self.old})
+        self.assertTreeEqual(self.first.union(TernarySearchTree()), self.old)
+        self.assertTreeEqual(TernarySearchTree().intersection(self.first), {})
+        self.assertEqual(self.first.union(self.second).top_k("f", 2), [("font", 50), ("fontain", 40)])
+
+    # Test that the results don't share nodes with their inputs.
+    def test_results_are_independent(self):
+        union = self.first.union(self.second)
+        self.second.insert("zebras")
+        self.second.delete("fontain")
+        union.insert("ducked")
+        self.assertNotIn("zebras", union)
+        self.assertIn("fontain", union)
+        self.assertNotIn("ducked", self.first)
+
+    # Test that merge_from adds the other tree's words in place and returns the number of new words.
+    def test_merge_from(self):
+        self.assertEqual(self.first.merge_from(self.second), 3)
+        self.assertTreeEqual(self.first, {**self.old, **self.new})
+        self.assertEqual(self.first.merge_from(TernarySearchTree()), 0)
+        self.second.insert("zebras")
+        self.assertNotIn("zebras", self.first)
+        with self.assertRaises(TypeError):
+            self.first.merge_from(["duck"])
+
+
+class TestTernarySearchTreeMapping(unittest.TestCase):
+
+    def setUp(self):
+        self.tst = TernarySearchTree()
+        self.tst["duck"] = 1
+        self.tst["ducks"] = [2]
+        self.tst["far"] = None
+
+    # Test item access, get and membership.
+    def test_getitem_and_get(self):
+        self.assertEqual(self.tst["duck"], 1)
+        self.assertEqual(self.tst["ducks"], [2])
+        self.assertIsNone(self.tst["far"])
+        self.assertEqual(self.tst.get("duc", "missing"), "missing")
+        self.assertIsNone(self.tst.get(None))
+        with self.assertRaises(KeyError):
+            self.tst["du"]
+
+        self.assertIn("far", self.tst)
+        self.assertNotIn("fa", self.tst)
+        self.assertNotIn(3, self.tst)
+
+    # Test that overwriting a value doesn't change the word count and insert keeps the value.
+    def test_setitem_overwrite(self):
+        self.tst["duck"] = 10
+        self.tst.insert("duck")
+        self.tst.insert("font")
+
+        self.assertEqual(len(self.tst), 4)
+        self.assertEqual(self.tst["duck"], 10)
+        self.assertIsNone(self.tst["font"])
+
+    # Test invalid keys.
+    def test_setitem_invalid_key(self):
+        with self.assertRaises(TypeError):
+            self.tst[1] = "one"
+        with self.assertRaises(ValueError):
+            self.tst[""] = "empty"
+
+    # Test keys, items and values come out in sorted order.
+    def test_items_and_values(self):
+        self.assertEqual(list(self.tst), ["duck", "ducks", "far"])
+        self.assertEqual(list(self.tst.keys()), ["duck", "ducks", "far"])
+        self.assertEqual(list(self.tst.items()), [("duck", 1), ("ducks", [2]), ("far", None)])
+        self.assertEqual(list(self.tst.values()), [1, [2], None])
+
+    # Test that update with a mapping sets the values.
+    def test_update_with_mapping(self):
+        self.assertEqual(self.tst.update({"duck": 5, "font": 6}), 1)
+        self.assertEqual(list(self.tst.items()), [("duck", 5), ("ducks", [2]), ("far", None), ("font", 6)])
+
+    # Test that rebalance keeps values and weights.
+    def test_rebalance_keeps_values(self):
+        self.tst.insert("ducked", 4)
+        self.tst.rebalance()
+
+        self.assertEqual(list(self.tst.items()), [("duck", 1), ("ducked", None), ("ducks", [2]), ("far", None)])
+        self.assertEqual(self.tst.get_weight("ducked"), 4)
+
+
+# Test cases for the binary file format and memory-mapped loading.
+class TestTernarySearchTreeSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.tst = TernarySearchTree()
+        self.words = WORDS + ["naïve", "日本"]
+        for word in self.words:
+            self.tst.insert(word)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "words.tst")
+        self.tst.save(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Test that a memory-mapped tree answers the same queries as the original.
+    def test_load_mmap(self):
+        with TernarySearchTree.load(self.path) as frozen:
+            self.assertIsInstance(frozen, FrozenTernarySearchTree)
+            self.assertEqual(len(frozen), len(self.tst))
+            self.assertEqual(frozen.all_strings(), self.tst.all_strings())
+            self.assertEqual(str(frozen), str(self.tst))
+            for word in self.words + ["futures", "comb", "日", "x"]:
+                self.assertEqual(frozen.search(word, exact=True), self.tst.search(word, exact=True))
+                self.assertEqual(frozen.search(word), self.tst.search(word))
+            self.assertEqual(list(frozen.keys_with_prefix("fut")), ["futile", "futility", "future"])
+            self.assertIn("naïve", frozen)
+            self.assertFalse(hasattr(frozen, "insert"))
+
+    # Test loading without mmap rebuilds a regular, modifiable tree.
+    def test_load_without_mmap(self):
+        tst = TernarySearchTree.load(self.path, mmap=False)
+        self.assertIsInstance(tst, TernarySearchTree)
+        self.assertEqual(str(tst), str(self.tst))
+        tst.insert("futures")
+        self.assertEqual(len(tst), len(self.tst) + 1)
+
+    # Test that the compact tree reads and writes the same format.
+    def test_compact_round_trip(self):
+        compact = CompactTernarySearchTree.load(self.path)
+        self.assertEqual(compact.all_strings(), self.tst.all_strings())
+        self.assertEqual(compact.to_bytes(), self.tst.to_bytes())
+        compact.delete("bomb")
+        self.assertEqual(TernarySearchTree.from_bytes(compact.to_bytes()).all_strings(),
+                         sorted(set(self.words) - {"bomb"}))
+
+    # Test empty trees and invalid input.
+    def test_empty_and_invalid(self):
+        self.assertTrue(TernarySearchTree.from_bytes(TernarySearchTree().to_bytes()).is_empty())
+        self.assertTrue(FrozenTernarySearchTree(TernarySearchTree().to_bytes()).is_empty())
+        with self.assertRaises(ValueError):
+            TernarySearchTree.from_bytes(b"not a tree file at all!!")
+        with self.assertRaises(ValueError):
+            FrozenTernarySearchTree(self.tst.to_bytes()[:-1])
+
+    # Test that values and weights are never dropped silently, only with words_only=True.
+    def test_values_and_weights_need_words_only(self):
+        weighted = TernarySearchTree.build(self.words)
+        weighted.insert("duck", weight=3)
+        mapped = TernarySearchTree()
+        mapped["duck"] = 1
+        for tst in (weighted, mapped):
+            for save in (tst.to_bytes, tst.freeze, lambda: tst.save(self.path)):
+                with self.assertRaises(ValueError):
+                    save()
+            self.assertIn("duck", tst.freeze(words_only=True))
+        versioned = VersionedTernarySearchTree(weighted)
+        versioned.insert("bomb", weight=2)
+        self.assertIn("bomb", versioned.publish())
+
+
+# Test cases for frozen snapshots and the single-writer/many-readers wrapper.
+class TestVersionedTernarySearchTree(unittest.TestCase):
+
+    def setUp(self):
+        self.words = ["combine", "combined", "duck", "ducks", "far", "font", "the", "there"]
+        self.versioned = VersionedTernarySearchTree(TernarySearchTree.build(self.words))
+
+    # Test that a frozen snapshot doesn't see later changes to the tree.
+    def test_freeze_is_a_copy(self):
+        tst = TernarySearchTree.build(self.words)
+        frozen = tst.freeze()
+        tst.insert("bomb")
+        tst.delete("duck")
+
+        self.assertIsInstance(frozen, FrozenTernarySearchTree)
+        self.assertEqual(frozen.all_strings(), sorted(self.words))
+        self.assertIs(frozen.freeze(), frozen)
+        self.assertEqual(CompactTernarySearchTree.build(self.words).freeze().all_strings(), sorted(self.words))
+
+    # Test that writes become visible only when published, and old snapshots stay unchanged.
+    def test_publish(self):
+        old = self.versioned.snapshot
+        self.versioned.insert("bomb")
+        self.assertTrue(self.versioned.delete("duck"))
+        self.assertFalse(self.versioned.search("bomb"))
+        self.assertIn("duck", self.versioned)
+
+        self.versioned.publish()
+        self.assertEqual(self.versioned.version, 1)
+        self.assertTrue(self.versioned.search("bomb", exact=True))
+        self.assertNotIn("duck", self.versioned)
+        self.assertEqual(len(self.versioned), len(self.words))
+        self.assertEqual(old.all_strings(), sorted(self.words))
+        self.assertEqual(list(self.versioned.keys_with_prefix("d")), ["ducks"])
+
+    # Test that publishing to a path replaces the file that other processes map.
+    def test_publish_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.tst")
+            self.versioned.publish(path)
+            with TernarySearchTree.load(path) as first:
+                self.versioned.insert("bomb")
+                self.versioned.publish(path)
+                with TernarySearchTree.load(path) as second:
+                    self.assertNotIn("bomb", first)
+                    self.assertIn("bomb", second)
+            self.assertEqual(os.listdir(directory), ["words.tst"])
+
+    # Test that the tree passed in is shared, not changed, by the writes.
+    def test_writes_leave_the_initial_tree_alone(self):
+        tst = TernarySearchTree.build(self.words)
+        versioned = VersionedTernarySearchTree(tst)
+        versioned.insert("bomb")
+        versioned.delete("duck")
+        versioned.publish()
+        self.assertEqual(tst.all_strings(), sorted(self.words))
+        self.assertEqual(versioned.snapshot.all_strings(), sorted(set(self.words) - {"duck"} | {"bomb"}))
+
+    # Test that sealed versions keep their words while later writes copy the nodes they change.
+    def test_copy_on_write(self):
+        random.seed(7)
+        words = ["".join(random.choice("abcd") for _ in range(random.randint(1, 5))) for _ in range(300)]
+        writer = ternary_search_tree._CopyOnWriteTree()
+        expected, versions = set(), []
+        for step in range(20):
+            for word in random.sample(words, 20):
+                if word in expected and random.random() < 0.5:
+                    self.assertTrue(writer.delete(word))
+                    expected.discard(word)
+                else:
+                    writer.insert(word, weight=random.randint(0, 9))
+                    expected.add(word)
+            self.assertFalse(writer.delete("e"))
+            versions.append((writer.seal(), sorted(expected)))
+            self.assertEqual(writer.all_strings(), sorted(expected))
+        for version, words_then in versions:
+            self.assertEqual(version.all_strings(), words_then)
+            self.assertEqual(len(version), len(words_then))
+
+    # Test that readers running next to a writer always see complete versions.
+    def test_concurrent_readers(self):
+        errors = []
+
+        def read():
+            for _ in range(200):
+                snapshot = self.versioned.snapshot
+                if not all(snapshot.search(word, exact=True) for word in self.words):
+                    errors.append("missing word")
+                if snapshot.all_strings() != sorted(snapshot.all_strings()):
+                    errors.append("unsorted")
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for number in range(50):
+            self.versioned.insert(f"word{number:03d}")
+            self.versioned.publish()
+        for reader in readers:
+            reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.versioned), len(self.words) + 50)
+
+
+# Test cases for the range-partitioned tree.
+class TestShardedTernarySearchTree(unittest.TestCase):
+
+    def setUp(self):
+        self.words = sorted(set(WORDS))
+        self.tst = ShardedTernarySearchTree.build(self.words, num_shards=4, workers=1)
+
+    # Test that the words are split over the shards by range and come back in order.
+    def test_build(self):
+        self.assertEqual(len(self.tst.shards), 4)
+        self.assertEqual(len(self.tst.boundaries), 3)
+        self.assertEqual(len(self.tst), len(self.words))
+        self.assertEqual(self.tst.all_strings(), self.words)
+        for word in self.words:
+            self.assertTrue(self.tst.shard_for(word).search(word, exact=True))
+
+    # Test that building in worker processes gives the same tree, also as frozen shards.
+    def test_parallel_build(self):
+        for frozen in (False, True):
+            tst = ShardedTernarySearchTree.build(self.words, num_shards=3, workers=2, frozen=frozen)
+            self.assertEqual(tst.all_strings(), self.words)
+            self.assertTrue(tst.search("future", exact=True))
+
+    # Test that prefix and range queries crossing shard boundaries are merged in order.
+    def test_queries_across_shards(self):
+        for prefix in ["", "c", "comb", "f", "fu", "the", "x"]:
+            self.assertEqual(list(self.tst.keys_with_prefix(prefix)), [w for w in self.words if w.startswith(prefix)])
+            self.assertEqual(self.tst.search(prefix), any(w.startswith(prefix) for w in self.words) and prefix != "")
+        self.assertEqual(list(self.tst.keys_with_prefix("f", limit=2)), ["far", "font"])
+        self.assertEqual(list(self.tst.range("bomb", "fu")), [w for w in self.words if "bomb" <= w < "fu"])
+        self.assertEqual(list(self.tst.range()), self.words)
+        self.assertEqual(list(self.tst.range("duck")), [w for w in self.words if w >= "duck"])
+        self.assertEqual(list(self.tst.range(hi="duck")), [w for w in self.words if w < "duck"])
+        self.assertEqual(list(self.tst.range(None, "fu")), [w for w in self.words if w < "fu"])
+
+    # Test that updates go to the owning shard.
+    def test_insert_and_delete(self):
+        self.tst.insert("zebra")
+        self.tst.insert("")
+        self.assertTrue(self.tst.delete("a"))
+        self.assertFalse(self.tst.delete("a"))
+        self.assertIn("zebra", self.tst.shards[-1])
+        self.assertEqual(self.tst.all_strings(), self.words[1:] + ["zebra"])
+
+    # Test an empty sharded tree.
+    def test_empty(self):
+        tst = ShardedTernarySearchTree.build([], workers=1)
+        self.assertTrue(tst.is_empty())
+        self.assertEqual(tst.all_strings(), [])
+        self.assertFalse(tst.search("a"))
+
+
+class TestHybridTernarySearchTree(unittest.TestCase):
+
+    def setUp(self):
+        self.words = sorted(set(WORDS) | {"at"})
+
+    # Test that both table depths hold the same words as a plain tree, short words included.
+    def test_same_words_as_plain_tree(self):
+        for depth in (1, 2):
+            tst = HybridTernarySearchTree.build(self.words, table_depth=depth)
+            self.assertEqual(len(tst), len(self.words))
+            self.assertEqual(tst.all_strings(), self.words)
+            for word in self.words:
+                self.assertIn(word, tst)
+            for word in ["", "c", "combin", "dux", "th", "zebra"]:
+                self.assertNotIn(word, tst)
+
+    # Test prefix search and autocomplete for prefixes shorter than, equal to and longer than the table depth.
+    def test_prefixes(self):
+        for depth in (1, 2):
+            tst = HybridTernarySearchTree.build(self.words, table_depth=depth)
+            for prefix in ["", "a", "c", "co", "comb", "f", "fu", "th", "the", "x", "zz"]:
+                self.assertEqual(list(tst.keys_with_prefix(prefix)), [w for w in self.words if w.startswith(prefix)])
+                self.assertEqual(tst.search(prefix), any(w.startswith(prefix) for w in self.words) and prefix != "")
+            self.assertEqual(list(tst.keys_with_prefix("f", limit=2)), ["far", "font"])
+
+    # Test that inserting updates the count once per new word and ignores invalid input.
+    def test_insert(self):
+        tst = HybridTernarySearchTree(table_depth=2)
+        for word in ["ab", "a", "abc", "ab", "", None, "b"]:
+            tst.insert(word)
+        self.assertEqual(len(tst), 4)
+        self.assertEqual(tst.all_strings(), ["a", "ab", "abc", "b"])
+        tst.clear()
+        self.assertTrue(tst.is_empty())
+        with self.assertRaises(ValueError):
+            HybridTernarySearchTree(table_depth=3)
+
+
+class TestRadixTernarySearchTree(unittest.TestCase):
+
+    def setUp(self):
+        self.words = WORDS + ["combine"]
+        self.tst = RadixTernarySearchTree()
+        for word in self.words:
+            self.tst.insert(word)
+
+    # Test that insert, search, all_strings and len behave like the plain tree.
+    def test_same_behaviour_as_plain_tree(self):
+        plain = TernarySearchTree()
+        for word in self.words:
+            plain.insert(word)
+        self.assertEqual(len(self.tst), len(plain))
+        self.assertEqual(self.tst.all_strings(), plain.all_strings())
+        for word in set(self.words):
+            for end in range(1, len(word) + 2):
+                query = word[:end] if end <= len(word) else word + "x"
+                self.assertEqual(self.tst.search(query), plain.search(query), query)
+                self.assertEqual(self.tst.search(query, exact=True), plain.search(query, exact=True), query)
+        for prefix in ["", "comb", "combinat", "du", "th", "x"]:
+            self.assertEqual(list(self.tst.keys_with_prefix(prefix)), list(plain.keys_with_prefix(prefix)))
+
+    # Test that a long shared prefix is stored in one node and split when words diverge inside it.
+    def test_path_compression(self):
+        tst = RadixTernarySearchTree()
+        tst.insert("commonprefix")
+        self.assertEqual(tst.node_count(), 1)
+        self.assertEqual(tst.root.segment, "commonprefix")
+        tst.insert("commonplace")
+        self.assertEqual(tst.root.segment, "commonp")
+        self.assertEqual(tst.node_count(), 3)
+        tst.insert("common")
+        self.assertEqual(tst.root.segment, "common")
+        self.assertTrue(tst.root.end_of_word)
+        self.assertEqual(tst.all_strings(), ["common", "commonplace", "commonprefix"])
+        self.assertFalse(tst.search("commo", exact=True))
+        self.assertTrue(tst.search("commo"))
+
+    # Test that empty strings and invalid types are ignored.
+    def test_invalid_input(self):
+        tst = RadixTernarySearchTree()
+        tst.insert("")
+        tst.insert(None)
+        self.assertTrue(tst.is_empty())
+        self.assertFalse(tst.search(""))
+        self.assertFalse(tst.search(5))
+
+
+# Test cases for key codecs and normalization.
+class TestEncodedTernarySearchTree(unittest.TestCase):
+
+    def setUp(self):
+        self.words = ["combine", "combined", "duck", "ducks", "far", "font", "naïve", "naïvety", "日本", "日本語",
+                      "Ωmega", "😀smile"]
+
+    # Test that every codec, on both storages, stores and finds the same words as a plain tree.
+    def test_codecs(self):
+        reference = TernarySearchTree.build(self.words)
+        for codec in ["codepoint", "utf-8", "alphabet"]:
+            for storage in [TernarySearchTree, CompactTernarySearchTree]:
+                for tst in [EncodedTernarySearchTree.build(self.words, codec, storage=storage),
+                            EncodedTernarySearchTree(codec, storage=storage)]:
+                    tst.update(self.words)
+                    self.assertEqual(len(tst), len(reference))
+                    self.assertEqual(sorted(tst), reference.all_strings())
+                    for word in self.words + ["naï", "日", "nai", "Ω", "x", "combines"]:
+                        self.assertEqual(tst.search(word, exact=True), reference.search(word, exact=True))
+                        self.assertEqual(tst.search(word), reference.search(word))
+                        self.assertEqual(sorted(tst.keys_with_prefix(word)), list(reference.keys_with_prefix(word)))
+                    self.assertEqual(tst.search_many(["duck", "duc", "日本語", None, ""]),
+                                     [True, False, True, False, False])
+
+    # Test that code point and UTF-8 keys keep words in sorted order.
+    def test_order_preserving_codecs(self):
+        for codec in ["codepoint", "utf-8"]:
+            tst = EncodedTernarySearchTree.build(self.words, codec)
+            self.assertEqual(tst.all_strings(), sorted(self.words))
+            self.assertEqual(list(tst.keys_with_prefix("naï", limit=1)), ["naïve"])
+
+    # Test that UTF-8 keys use one node per byte and alphabet keys one small code per character.
+    def test_key_sizes(self):
+        utf8 = EncodedTernarySearchTree.build(["日本"], "utf-8")
+        self.assertEqual(utf8.node_count(), 6)
+        self.assertEqual(EncodedTernarySearchTree.build(["日本"], "utf-8", storage=TernarySearchTree).node_count(), 6)
+        self.assertTrue(all(code < 256 for code in utf8.tree._chars))
+        alphabet = EncodedTernarySearchTree.build(self.words, "alphabet")
+        self.assertLess(max(alphabet.tree._chars), len(alphabet.codec))
+        self.assertEqual(len(alphabet.codec), len(set("".join(self.words))))
+
+    # Test that the alphabet codec ranks characters by frequency and grows on insert only.
+    def test_alphabet_codec(self):
+        codec = AlphabetCodec.from_words(["banana", "band"])
+        self.assertEqual(codec.alphabet[:3], ["a", "n", "b"])
+        self.assertEqual(codec.decode(codec.encode("banana")), "banana")
+
+        tst = EncodedTernarySearchTree(codec)
+        tst.insert("band")
+        self.assertFalse(tst.search("bandé"))
+        self.assertEqual(len(codec), 4)
+        tst.insert("bandé")
+        self.assertEqual(len(codec), 5)
+        self.assertTrue(tst.search("bandé", exact=True))
+
+    # Test that normalization merges case and composition variants at insert and query time.
+    def test_normalization(self):
+        tst = EncodedTernarySearchTree(normalize=["NFC", "casefold"])
+        for word in ["Café", "café", "cafe\u0301", "CAFÉ", "Straße"]:
+            tst.insert(word)
+        self.assertEqual(tst.all_strings(), ["café", "strasse"])
+        self.assertTrue(tst.search("CAFE\u0301", exact=True))
+        self.assertTrue(tst.search("STRASSE", exact=True))
+        self.assertEqual(list(tst.keys_with_prefix("CA")), ["café"])
+        self.assertTrue(tst.delete("Café"))
+        self.assertFalse("café" in tst)
+
+        self.assertEqual(EncodedTernarySearchTree.build(["A", "a"], normalize=str.lower).all_strings(), ["a"])
+        with self.assertRaises(ValueError):
+            EncodedTernarySearchTree(normalize="upper-ish")
+        with self.assertRaises(ValueError):
+            EncodedTernarySearchTree(codec="utf-16")
+
+
+# Test cases for the suffix-based substring index.
+class TestSubstringIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.words = ["combine", "combined", "combines", "binary", "cabin", "robin", "bin", "duck", "naïve",
+                      "combine", "", None]
+        self.unique = ["combine", "combined", "combines", "binary", "cabin", "robin", "bin", "duck", "naïve"]
+
+    # Test that contains_substring finds every word containing the query, each once.
+    def test_contains_substring(self):
+        for min_suffix in [1, 2, 4]:
+            for index in [SubstringIndex.build(self.words, min_suffix), SubstringIndex(min_suffix)]:
+                index.update(self.words)
+                self.assertEqual(len(index), len(self.unique))
+                for query in ["bin", "b", "in", "ombine", "combines", "ïv", "x", "binaryx", ""]:
+                    found = list(index.contains_substring(query))
+                    self.assertEqual(len(found), len(set(found)))
+                    self.assertEqual(sorted(found), sorted(word for word in self.unique if query in word))
+
+    # Test that results are produced lazily and map back to word IDs.
+    def test_lazy_ids(self):
+        index = SubstringIndex.build(self.words)
+        results = index.contains_substring("bin")
+        self.assertIn(next(results), ["combine", "combined", "combines", "binary", "cabin", "robin", "bin"])
+        self.assertEqual(sorted(index.substring_ids("duck")), [index.ids["duck"]])
+        self.assertEqual(index.words[index.ids["robin"]], "robin")
+        self.assertEqual(index.add("robin"), index.ids["robin"])
+        self.assertIsNone(index.add(None))
+        self.assertEqual(list(index.contains_substring(None)), [])
+
+    # Test that the space-bounded variant stores only suffixes of at least min_suffix characters.
+    def test_min_suffix(self):
+        full = SubstringIndex.build(self.words)
+        bounded = SubstringIndex.build(self.words, min_suffix=3)
+        self.assertLess(len(bounded.tree), len(full.tree))
+        self.assertTrue(all(len(suffix) >= 3 for suffix in bounded.tree))
+        self.assertNotIn("n", bounded.tree)
+        with self.assertRaises(ValueError):
+            SubstringIndex(min_suffix=0)
+
+
+# Runs the same test cases against the array-backed storage.
+class TestCompactTernarySearchTree(TestTernarySearchTree):
+    tree_class = CompactTernarySearchTree
+
+    # Test that the compact tree prints and enumerates exactly like the node-based one.
+    def test_same_layout_as_node_tree(self):
+        reference = TernarySearchTree()
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+            reference.insert(word)
+
+        self.assertEqual(str(self.tst), str(reference))
+        self.assertEqual(self.tst.all_strings(), reference.all_strings())
+
+    # Test that clear resets the arrays.
+    def test_clear(self):
+        for word in self.words_to_insert:
+            self.tst.insert(word)
+        self.tst.clear()
+
+        self.assertTrue(self.tst.is_empty())
+        self.assertEqual(len(self.tst), 0)
+        self.assertEqual(self.tst.node_count(), 0)
+        self.assertFalse(self.tst.search("combine"))
+
+    # Test that deletion frees exactly the nodes of prefixes no longer in use, and compact reclaims them.
+    def test_delete_free_list_and_compact(self):
+        words = ["combine", "combined", "combines", "duck", "ducks", "far", "font"]
+        for word in words:
+            self.tst.insert(word)
+        nodes = self.tst.node_count()
+
+        self.tst.delete("combines")
+        self.tst.delete("font")
+        self.assertEqual(self.tst.node_count(), nodes - 4)  # "combines" and "font", "fon", "fo"
+
+        self.tst.insert("duckling")  # reuses freed slots
+        self.assertEqual(len(self.tst._chars), nodes + 1)
+
+        self.tst.delete("duckling")
+        self.tst.compact()
+        self.assertEqual(len(self.tst._chars), self.tst.node_count() + 1)
+        self.assertEqual(self.tst.all_strings(), ["combine", "combined", "duck", "ducks", "far"])
+        self.assertTrue(self.tst.search("combined", exact=True))
+        self.tst.insert("font")
+        self.assertEqual(self.tst.all_strings(), ["combine", "combined", "duck", "ducks", "far", "font"])
+
+
+# Compact tree that always takes the pure-Python lookups, even when the compiled kernel is built.
+class PythonCompactTernarySearchTree(CompactTernarySearchTree):
+    _kernel = None
+
+
+# Runs the compact tree test cases again on the pure-Python fallback, so both backends are covered.
+class TestCompactTernarySearchTreePython(TestCompactTernarySearchTree):
+    tree_class = PythonCompactTernarySearchTree
+
+
+# Test cases comparing the compiled kernel (_tst_kernel.c) with the pure-Python lookups.
+@unittest.skipIf(ternary_search_tree._tst_kernel is None, "compiled kernel not built")
+class TestNativeKernel(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        alphabet = "abcdeé日😀"
+        self.words = ["".join(rng.choices(alphabet, k=rng.randint(1, 6))) for _ in range(300)]
+        self.probes = self.words + ["".join(rng.choices(alphabet, k=rng.randint(1, 5))) for _ in range(300)]
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Answers of every lookup on tree with the kernel and without it.
+    def lookups(self, tree):
+        results = []
+        for kernel in [ternary_search_tree._tst_kernel, None]:
+            tree._kernel = kernel
+            results.append(([tree.search(word) for word in self.probes],
+                             [tree.search(word, exact=True) for word in self.probes],
+                             tree.search_many(self.probes), tree.search_many(self.probes, exact=False),
+                             [list(tree.keys_with_prefix(word[:2], limit=3)) for word in self.probes]))
+        return results
+
+    # Test that the kernel is selected by default.
+    def test_selected_when_built(self):
+        self.assertIs(CompactTernarySearchTree()._kernel, ternary_search_tree._tst_kernel)
+        self.assertIsNone(PythonCompactTernarySearchTree()._kernel)
+
+    # Test that both backends agree on a compact tree, also after deletions.
+    def test_compact_tree(self):
+        tst = CompactTernarySearchTree.build(self.words)
+        for word in self.words[:50]:
+            tst.delete(word)
+        with_kernel, without_kernel = self.lookups(tst)
+        self.assertEqual(with_kernel, without_kernel)
+
+    # Test that both backends treat the empty string like the node tree: never inserted, never found.
+    def test_empty_string(self):
+        for kernel in [ternary_search_tree._tst_kernel, None]:
+            tst = CompactTernarySearchTree.build(["abc", "aqt"])
+            tst._kernel = kernel
+            tst.insert("")
+            self.assertEqual(len(tst), 2)
+            self.assertFalse(tst.search(""))
+            self.assertFalse(tst.search("", exact=True))
+            self.assertEqual(tst.search_many(["", "abc"]), [False, True])
+            self.assertEqual(list(tst.keys_with_prefix("", limit=1)), ["abc"])
+        self.assertEqual(ternary_search_tree._tst_kernel.find(tst._chars, tst._flags, tst._ls, tst._eq, tst._gt,
+                                                              tst.root, "", 0), 0)
+
+    # Test that both backends agree on a memory-mapped tree, whose buffers are read-only.
+    def test_memory_mapped_tree(self):
+        path = os.path.join(self.directory.name, "words.tst")
+        TernarySearchTree.build(self.words).save(path)
+        with TernarySearchTree.load(path) as frozen:
+            with_kernel, without_kernel = self.lookups(frozen)
+        self.assertEqual(with_kernel, without_kernel)
+
+    # Test that a node index outside the arrays raises instead of reading out of bounds.
+    def test_corrupt_links(self):
+        data = bytearray(TernarySearchTree.build(["b", "a", "c"]).to_bytes())
+        slots = (len(data) - ternary_search_tree._HEADER.size) // 17
+        offset = ternary_search_tree._HEADER.size + 4 * slots + 4  # ls of the root, node 1
+        data[offset:offset + 4] = struct.pack("<i", 1000)
+        frozen = FrozenTernarySearchTree(bytes(data))
+        with self.assertRaises(ValueError):
+            frozen.search("a")
+        with self.assertRaises(ValueError):
+            list(frozen.keys_with_prefix("", limit=5))